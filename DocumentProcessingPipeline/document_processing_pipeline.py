@@ -1,56 +1,462 @@
+import asyncio
+import hashlib
+import math
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pdfplumber
+from langchain_core.documents import Document
 from langchain_community.vectorstores import Chroma
 from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from GraphWorkflow.graph_workflow import GraphWorkflow
+from langchain_community.document_loaders.parsers.pdf import PDFPlumberParser
+
+from utility.admission import find_rejection
+from utility.answer_cache import normalize_question
+from utility.chunking import CHARACTER, Chunker, pdf_page_metadata
+from utility.db_utility import clear_index_fingerprints, get_chunk_fingerprints, get_indexed_chunking, get_indexed_file_hash, store_index_fingerprints
+from utility.hybrid_retriever import HYBRID, VECTOR, HybridRetriever
+from utility.lexical_index import LexicalIndex
+from utility.singleflight import FlightCancelled
+from utility.sse import format_sse
+from utility.telemetry import logger
+
+# Chroma rejects very large single upserts, so write in slices
+_UPSERT_BATCH = 1000
+# New chunks are embedded in batches of this size while the rest of the PDF is still being split
+_STREAM_BATCH = 64
+
+# Settings of indexes built before chunking was configurable
+LEGACY_CHUNKING = Chunker(CHARACTER, 500, 0).config_json()
+
+# Index modes: one Chroma directory per PDF, or every PDF in one collection filtered by `pdf_name`
+INDEX_PER_DOCUMENT = "per_document"
+INDEX_SHARED = "shared"
+SHARED_COLLECTION_NAME = "documents"
+
+class IndexMissing(Exception):
+    """Raised when a PDF's index is needed but the store holds none of its chunks."""
+
+
+# Process pools used for page-sharded parsing, keyed by worker count and shared across pipelines
+_parse_pools = {}
+_parse_pools_lock = threading.Lock()
+
+
+def _get_parse_pool(num_workers):
+    """Returns the shared process pool with `num_workers` workers, creating it on first use."""
+    with _parse_pools_lock:
+        if num_workers not in _parse_pools:
+            # Spawn rather than fork: the server process runs threads (uvicorn, torch).
+            _parse_pools[num_workers] = ProcessPoolExecutor(
+                max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pools[num_workers]
+
+
+# The shared collection is opened once per directory and reused by every pipeline
+_shared_vectorstores = {}
+_shared_vectorstores_lock = threading.Lock()
+
+
+def get_shared_vectorstore(path, embedding_model):
+    """
+    Returns the shared collection persisted at `path`, opening it on first use.
+
+    Args:
+        path (str): The shared collection's persist directory.
+        embedding_model (Embeddings): The embedding model of the collection.
+
+    Returns:
+        Chroma: The shared collection.
+    """
+    with _shared_vectorstores_lock:
+        if path not in _shared_vectorstores:
+            _shared_vectorstores[path] = Chroma(
+                collection_name=SHARED_COLLECTION_NAME,
+                persist_directory=path,
+                embedding_function=embedding_model
+            )
+        return _shared_vectorstores[path]
+
+
+def pdf_name_filter(pdf_names):
+    """Builds the Chroma metadata filter restricting a search to the given PDFs."""
+    pdf_names = list(pdf_names)
+    if len(pdf_names) == 1:
+        return {"pdf_name": pdf_names[0]}
+    return {"pdf_name": {"$in": pdf_names}}
+
+
+def shared_retriever(vectorstore, pdf_names=None, k=4):
+    """
+    Builds a retriever searching the shared collection once across several PDFs.
+
+    Args:
+        vectorstore (Chroma): The shared collection.
+        pdf_names (list, optional): The PDFs to search; None searches every document.
+        k (int): Number of chunks retrieved per question.
+
+    Returns:
+        BaseRetriever: The filtered retriever.
+    """
+    search_kwargs = {"k": k}
+    if pdf_names:
+        search_kwargs["filter"] = pdf_name_filter(pdf_names)
+    return vectorstore.as_retriever(search_kwargs=search_kwargs)
+
+
+async def stream_answer(workflow, query, retriever, on_final=None, trace=None, **budgets):
+    """
+    Runs the graph for a question and frames its events as Server-Sent Events.
+
+    Args:
+        workflow (GraphWorkflow): The compiled workflow.
+        query (str): The user's question.
+        retriever (BaseRetriever): The retriever to answer from.
+        on_final (callable, optional): Called with the data of the "final" event.
+        trace (RequestTrace, optional): Trace of the request; closed when the stream ends.
+        **budgets: max_generations, max_rewrites and deadline_seconds for this question.
+
+    Yields:
+        str: Server-Sent Events: "attempt", "token", "final" (and "error" on failure).
+    """
+    try:
+        async for event, data in workflow.stream_events(query, retriever, trace=trace, **budgets):
+            yield format_sse(event, data)
+            if event == "final" and on_final is not None:
+                on_final(data)
+    except Exception as e:
+        if trace is not None:
+            trace.finish("error")
+        # The response has already started streaming; report the failure in-band
+        error = {"error": str(e)}
+        rejection = find_rejection(e)
+        if rejection is not None:
+            error = {"error": str(rejection), "retry_after": rejection.retry_after}
+        yield format_sse("error", error)
+    finally:
+        # Still open only if the client went away before the final event
+        if trace is not None:
+            trace.finish("cancelled")
+
+
+async def coalesced_answer(single_flight, scope, query, produce, trace=None, **budgets):
+    """
+    Streams the answer to a question, sharing one graph run among identical concurrent questions.
+
+    A question matching one already being answered for the same scope (normalized text and
+    budgets) attaches to that run and receives its events from the start, so concurrent
+    duplicates cost a single set of LLM calls.
+
+    Args:
+        single_flight (SingleFlight): The in-flight runs.
+        scope: The documents the question is asked about.
+        query (str): The user's question.
+        produce (callable): Starts the run's event stream when none is in flight.
+        trace (RequestTrace, optional): Trace of the request; the run it joins is traced by
+            the request that started it.
+        **budgets: max_generations, max_rewrites and deadline_seconds for this question.
+
+    Yields:
+        str: Server-Sent Events of the shared run.
+    """
+    key = (scope, normalize_question(query), tuple(sorted(budgets.items())))
+    coalesced = single_flight.in_flight(key)
+    try:
+        async for sse in single_flight.stream(key, produce):
+            yield sse
+    except FlightCancelled as e:
+        # The run reports its own failures as "error" events; this one never got to
+        yield format_sse("error", {"error": str(e)})
+    finally:
+        if coalesced and trace is not None:
+            trace.finish("coalesced")
+
+
+def compute_file_hash(path, block_size=1024 * 1024):
+    """
+    Computes the SHA-256 fingerprint of a file.
+
+    Args:
+        path (str): The path to the file.
+        block_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def assign_chunk_ids(pdf_name, chunks, seen=None):
+    """
+    Gives every chunk a content-derived id, stored in `metadata["chunk_id"]`.
+
+    The id hashes the PDF name and text, so an unchanged chunk keeps its id across
+    re-uploads even when pages are inserted or removed before it; repeated identical
+    chunks are told apart by their occurrence count. The page stays plain metadata.
+
+    Args:
+        pdf_name (str): Name of the PDF the chunks belong to.
+        chunks (list): The split documents.
+        seen (dict, optional): Occurrence counts carried across calls, when chunks arrive in batches.
+
+    Returns:
+        list: The chunk ids, in chunk order.
+    """
+    seen = {} if seen is None else seen
+    ids = []
+    for chunk in chunks:
+        base = f"{pdf_name}\0{chunk.page_content}"
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        chunk_id = hashlib.sha256(f"{base}\0{occurrence}".encode("utf-8")).hexdigest()
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return ids
+
+
+def parse_pdf_pages(pdf_path, start, stop):
+    """
+    Parses pages [start, stop) of a PDF exactly like `PDFPlumberLoader` does.
+
+    Runs in a worker process, so it only takes picklable arguments.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        start (int): Index of the first page to parse.
+        stop (int): Index one past the last page to parse.
+
+    Returns:
+        list: One Document per page, with the loader's page metadata.
+    """
+    parser = PDFPlumberParser()
+    with pdfplumber.open(pdf_path) as doc:
+        return [
+            Document(
+                page_content=parser._process_page_content(page) + "\n" + parser._extract_images_from_page(page),
+                metadata=pdf_page_metadata(pdf_path, doc, page),
+            )
+            for page in doc.pages[start:stop]
+        ]
+
 
 class DocumentProcessingPipeline:
-    def __init__(self, pdf_path, embedding_model, chat_model, reasoner_model, vectorstore_base_path="./vectorstores"):
+    def __init__(self, pdf_path, embedding_model, workflow=None, vectorstore_base_path="./vectorstores", load_vectorstore=True, parse_workers=1, answer_cache=None, document_version=None, single_flight=None, retrieval_mode=VECTOR, retrieval_k=4, index_mode=INDEX_PER_DOCUMENT, shared_vectorstore_path=None, chunker=None):
         """
         Initializes the DocumentProcessingWorkflow with either pre-initialized or new components.
 
         Args:
             pdf_path (str): The path to the PDF file.
             embedding_model (str): The model name for embeddings.
-            chat_model (str): The model name for chat.
-            reasoner_model (str): The model name for reasoner.
+            workflow (GraphWorkflow): The compiled workflow shared by all documents.
             vectorstore_base_path (str): The base directory to store the vectorstore for each PDF.
+            load_vectorstore (bool): Whether to open (or build) the vectorstore right away. The
+                ingestion worker passes False and calls `create_or_load_vectorstore` itself.
+            parse_workers (int): Number of processes used to parse pages; 1 parses sequentially.
+                Layout chunking always parses sequentially.
+            answer_cache (SemanticAnswerCache, optional): Cache of final answers consulted before the graph runs.
+            document_version (str, optional): Fingerprint of the indexed file, scoping cached answers.
+            single_flight (SingleFlight, optional): Shares one graph run among identical
+                questions asked at the same time.
+            retrieval_mode (str): "vector" for dense search only, "hybrid" to fuse it with BM25 keyword search.
+            retrieval_k (int): Number of chunks retrieved per question; raised when a reranker
+                cuts the candidates down afterwards.
+            index_mode (str): "per_document" keeps the PDF in its own vectorstore; "shared" puts
+                it in the shared collection at `shared_vectorstore_path`, tagged with its name.
+            shared_vectorstore_path (str, optional): Persist directory of the shared collection.
+            chunker (Chunker, optional): The chunking stage; defaults to 500-character chunks.
         """
         self.pdf_path = pdf_path
+        self.pdf_name = os.path.basename(pdf_path)
         self.embedding_model = embedding_model
-        self.chat_model = chat_model
-        self.reasoner_model = reasoner_model
+        self.workflow = workflow
+        self.parse_workers = parse_workers
+        self.answer_cache = answer_cache
+        self.document_version = document_version
+        self.single_flight = single_flight
+        self.retrieval_mode = retrieval_mode
+        self.retrieval_k = retrieval_k
+        self.index_mode = index_mode
+        self.shared_vectorstore_path = shared_vectorstore_path
+        self.chunker = chunker or Chunker()
 
         self.loader = PDFPlumberLoader(self.pdf_path)
 
         # Generate a unique vectorstore path based on the PDF name
         pdf_name_without_extension = os.path.basename(pdf_path).replace(".pdf", "")
         self.vectorstore_path = os.path.join(vectorstore_base_path, pdf_name_without_extension)
+        self.lexical_index_path = self.vectorstore_path
+        if index_mode == INDEX_SHARED:
+            self.vectorstore_path = shared_vectorstore_path
+            self.lexical_index_path = os.path.join(shared_vectorstore_path, "lexical", pdf_name_without_extension)
 
-        # If vectorstore and retriever are provided, use them; otherwise, initialize them
-        self.vectorstore = self.create_or_load_vectorstore()
-        self.retriever = self.vectorstore.as_retriever()
-        self.workflow = self.create_workflow(self.retriever)
+        self.vectorstore = None
+        self.retriever = None
+        if load_vectorstore:
+            self.vectorstore = self.create_or_load_vectorstore()
+            self.retriever = self.build_retriever()
 
-    def load_and_split_documents(self, chunk_size=100, chunk_overlap=50):
+    def load_index(self):
         """
-        Loads and splits the documents from the PDF.
+        Opens the existing index for answering questions, without ever building it.
 
-        Args:
-            chunk_size (int): The size of the chunks for splitting the documents.
-            chunk_overlap (int): The overlap between chunks.
+        Indexing belongs to the ingestion queue; a missing index (e.g. after switching
+        INDEX_MODE without `/migrate`) is reported instead of being built inside a request.
+
+        Raises:
+            IndexMissing: The store holds none of this PDF's chunks.
+        """
+        if not self.is_indexed():
+            raise IndexMissing(f"{self.pdf_name} is not in the {self.index_mode} index.")
+        self.vectorstore = self.open_vectorstore()
+        self.retriever = self.build_retriever()
+
+    def build_retriever(self):
+        """
+        Builds the retriever for the pipeline's retrieval mode.
+
+        Returns:
+            BaseRetriever: The dense retriever, or a hybrid one fusing it with the lexical index.
+        """
+        search_kwargs = {}
+        if self.index_mode == INDEX_SHARED:
+            search_kwargs["filter"] = pdf_name_filter([self.pdf_name])
+        if self.retrieval_mode != HYBRID:
+            return self.vectorstore.as_retriever(search_kwargs=dict(search_kwargs, k=self.retrieval_k))
+        return HybridRetriever(
+            vectorstore=self.vectorstore,
+            search_kwargs=search_kwargs,
+            lexical_index=self.load_lexical_index(),
+            k=self.retrieval_k,
+            fetch_k=max(20, self.retrieval_k),
+        )
+
+    def load_lexical_index(self):
+        """
+        Loads the persisted lexical index, building it from the vectorstore if it is missing.
+
+        Returns:
+            LexicalIndex: The BM25 index over the document's chunks.
+        """
+        lexical_index = LexicalIndex.load(self.lexical_index_path)
+        if lexical_index is None:
+            # Indexed before lexical indexes existed
+            logger.debug("[DocumentProcessingWorkflow] Building the lexical index of %s from its vectorstore", self.pdf_name)
+            lexical_index = LexicalIndex.from_vectorstore(self.vectorstore, where=self._where())
+            lexical_index.save(self.lexical_index_path)
+        return lexical_index
+
+    def _where(self):
+        """Chroma `where` clause selecting this PDF's chunks, or None in a per-document store."""
+        return pdf_name_filter([self.pdf_name]) if self.index_mode == INDEX_SHARED else None
+
+    def open_vectorstore(self):
+        """
+        Opens the vectorstore this PDF is indexed in.
+
+        Returns:
+            Chroma: The PDF's own vectorstore, or the shared collection.
+        """
+        if self.index_mode == INDEX_SHARED:
+            return get_shared_vectorstore(self.shared_vectorstore_path, self.embedding_model)
+        return Chroma(
+            persist_directory=self.vectorstore_path,
+            embedding_function=self.embedding_model
+        )
+
+    def iter_pages(self):
+        """
+        Yields one Document per PDF page, in page order.
+
+        With one parse worker pages are parsed lazily, one at a time. With more, the page
+        range is sharded across a process pool; the output is identical to
+        `PDFPlumberLoader.load()`.
+
+        Yields:
+            Document: The next page.
+        """
+        if self.parse_workers <= 1:
+            yield from self.loader.lazy_load()
+            return
+
+        with pdfplumber.open(self.pdf_path) as doc:
+            total_pages = len(doc.pages)
+        if total_pages == 0:
+            return
+
+        # A few shards per worker keeps the pool busy when page costs are uneven
+        shard_size = max(1, math.ceil(total_pages / (self.parse_workers * 4)))
+        starts = list(range(0, total_pages, shard_size))
+        stops = [min(start + shard_size, total_pages) for start in starts]
+
+        pool = _get_parse_pool(self.parse_workers)
+        for pages in pool.map(parse_pdf_pages, repeat(self.pdf_path), starts, stops):
+            yield from pages
+
+    def load_documents(self):
+        """
+        Loads every page of the PDF.
+
+        Returns:
+            list: One Document per page.
+        """
+        return list(self.iter_pages())
+
+    def iter_chunks(self):
+        """
+        Yields the PDF's chunks as the chunking stage produces them, page by page.
+
+        Layout chunking reads the PDF itself, sequentially; `parse_workers` only speeds up
+        the other strategies.
+
+        Yields:
+            Document: The next chunk.
+        """
+        if self.chunker.reads_pdf:
+            yield from self.chunker.iter_pdf_chunks(self.pdf_path)
+        else:
+            yield from self.chunker.iter_chunks(self.iter_pages())
+
+    def load_and_split_documents(self):
+        """
+        Loads and splits the documents from the PDF.
 
         Returns:
             list: A list of split documents.
         """
-        docs = self.loader.load()
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
+        return list(self.iter_chunks())
+
+    def is_indexed(self):
+        """Returns True if the vectorstore directory exists and is non-empty."""
+        if self.index_mode == INDEX_SHARED:
+            # The shared directory exists as soon as any PDF is indexed; look for this PDF's chunks
+            return bool(self.open_vectorstore().get(where=self._where(), limit=1, include=[])["ids"])
+        return (
+            os.path.exists(self.vectorstore_path)
+            and os.path.isdir(self.vectorstore_path)
+            and bool(os.listdir(self.vectorstore_path))
         )
-        return text_splitter.split_documents(docs)
 
-    def create_or_load_vectorstore(self, documents=None):
+    def split_documents(self, docs):
+        """
+        Splits page documents into the chunks that get embedded.
+
+        Args:
+            docs (list): One Document per page.
+
+        Returns:
+            list: The chunks.
+        """
+        return list(self.chunker.iter_chunks(docs))
+
+    def create_or_load_vectorstore(self, documents=None, on_status=None):
         """
         If the vectorstore directory exists and is non-empty, 
         load the existing store. Otherwise, read PDF, chunk it, 
@@ -58,65 +464,254 @@ class DocumentProcessingPipeline:
 
         Args:
             documents (optional): If provided, it is used to create a new vectorstore.
+            on_status (callable, optional): Called with "parsing" and "embedding" as indexing progresses.
 
         Returns:
             Chroma: The initialized or loaded vectorstore.
         """
         # Check if vectorstore exists and is non-empty
-        if (
-            os.path.exists(self.vectorstore_path)
-            and os.path.isdir(self.vectorstore_path)
-            and os.listdir(self.vectorstore_path)
-        ):
-            print(f"[DocumentProcessingWorkflow] Loading existing vectorstore from: {self.vectorstore_path}")
-            return Chroma(
-                persist_directory=self.vectorstore_path,
-                embedding_function=self.embedding_model
-            )
+        if self.is_indexed():
+            logger.debug("[DocumentProcessingWorkflow] Loading existing vectorstore from: %s", self.vectorstore_path)
+            return self.open_vectorstore()
         
         # If no existing index, read PDF and create/persist a new index
-        print(f"[DocumentProcessingWorkflow] No existing vectorstore found; creating a new one at: {self.vectorstore_path}")
-        
+        logger.debug("[DocumentProcessingWorkflow] No existing vectorstore found; creating a new one at: %s", self.vectorstore_path)
+        return self.index_documents(documents=documents, on_status=on_status)
+
+    def index_documents(self, documents=None, on_status=None, file_hash=None):
+        """
+        Brings the vectorstore in line with the current PDF, re-embedding only what changed.
+
+        Chunks are identified by content fingerprints. Chunks that are new in this version
+        of the PDF are upserted, chunks that disappeared are deleted, and the rest keep
+        their embeddings; only their metadata is refreshed where it changed (a chunk that
+        moved to another page, a new page count). An unchanged file chunked with unchanged
+        settings is skipped entirely. Chunks are embedded in batches as the chunking stage
+        yields them.
+
+        Args:
+            documents (optional): Pre-split chunks to index instead of parsing the PDF.
+            on_status (callable, optional): Called with "parsing" and "embedding" as indexing progresses.
+            file_hash (str, optional): Fingerprint of the PDF, if the caller already computed it.
+
+        Returns:
+            Chroma: The up-to-date vectorstore.
+        """
+        file_hash = file_hash or compute_file_hash(self.pdf_path)
+        indexed = self.is_indexed()
+        vectorstore = self.open_vectorstore()
+        if (
+            indexed
+            and documents is None
+            and get_indexed_file_hash(self.pdf_name) == file_hash
+            and (get_indexed_chunking(self.pdf_name) or LEGACY_CHUNKING) == self.chunker.config_json()
+        ):
+            logger.debug("[DocumentProcessingWorkflow] %s is unchanged; keeping the existing vectorstore", self.pdf_name)
+            if LexicalIndex.load(self.lexical_index_path) is None:
+                LexicalIndex.from_vectorstore(vectorstore, where=self._where()).save(self.lexical_index_path)
+            return vectorstore
+
         if not documents:
-            # If documents aren't provided, load them from the PDF
-            docs = self.loader.load()
-            splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-            documents = splitter.split_documents(docs)
-        
-        # Create and persist the new vectorstore
-        vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embedding_model,
-            persist_directory=self.vectorstore_path
+            # If documents aren't provided, stream them from the PDF through the chunking stage
+            if on_status:
+                on_status("parsing")
+            documents = self.iter_chunks()
+
+        if indexed:
+            previous_ids = get_chunk_fingerprints(self.pdf_name)
+        else:
+            # The store holds none of this PDF's chunks (its directory was removed, or the index
+            # moved), so recorded fingerprints describe nothing; embed every chunk
+            previous_ids = set()
+            clear_index_fingerprints(self.pdf_name)
+        if indexed and not previous_ids:
+            # Built before fingerprints were recorded: its ids are random, so replace everything
+            previous_ids = set(vectorstore.get(where=self._where(), include=[])["ids"])
+
+        # Embed new chunks batch by batch while the rest of the PDF is still being split
+        all_chunks = []
+        current_ids = set()
+        pending = {}
+        kept = {}
+        embedded = 0
+        page_count = None
+        seen = {}
+        for chunk in documents:
+            chunk_id = assign_chunk_ids(self.pdf_name, [chunk], seen=seen)[0]
+            # Lets a shared collection be searched per document
+            chunk.metadata["pdf_name"] = self.pdf_name
+            all_chunks.append(chunk)
+            current_ids.add(chunk_id)
+            page_count = chunk.metadata.get("total_pages", page_count)
+            if chunk_id in previous_ids:
+                kept.setdefault(chunk_id, chunk)
+            else:
+                pending.setdefault(chunk_id, chunk)
+            if len(pending) >= _STREAM_BATCH:
+                if on_status and not embedded:
+                    on_status("embedding")
+                vectorstore.add_documents(list(pending.values()), ids=list(pending))
+                embedded += len(pending)
+                pending = {}
+        if on_status:
+            on_status("embedding")
+        if pending:
+            vectorstore.add_documents(list(pending.values()), ids=list(pending))
+            embedded += len(pending)
+
+        removed_ids = list(previous_ids - current_ids)
+        for i in range(0, len(removed_ids), _UPSERT_BATCH):
+            vectorstore.delete(ids=removed_ids[i:i + _UPSERT_BATCH])
+        refreshed = self._refresh_metadata(vectorstore, kept)
+
+        logger.info(
+            "[DocumentProcessingWorkflow] Indexed %s (%s chunking): %d new, %d removed, %d unchanged chunks "
+            "(%d with refreshed metadata)",
+            self.pdf_name, self.chunker.strategy, embedded, len(removed_ids), len(current_ids) - embedded, refreshed,
+        )
+
+        # The keyword index is cheap to build, so it is rebuilt from the current chunks
+        LexicalIndex.from_documents(all_chunks).save(self.lexical_index_path)
+
+        store_index_fingerprints(
+            self.pdf_name, file_hash, current_ids, chunking=self.chunker.config_json(), page_count=page_count
         )
-        
         return vectorstore
 
-    def create_workflow(self, retriever):
+    @staticmethod
+    def _refresh_metadata(vectorstore, chunks):
         """
-        Creates the workflow for the entire process.
+        Rewrites the stored metadata of already-indexed chunks where it changed, leaving
+        their embeddings alone.
 
         Args:
-            retriever (ChromaRetriever): The retriever for document retrieval.
+            vectorstore (Chroma): The vectorstore holding the chunks.
+            chunks (dict): The current chunks, by chunk id.
 
         Returns:
-            GraphWorkflow: The initialized workflow.
+            int: Number of chunks whose metadata was rewritten.
         """
-        return GraphWorkflow(
-            llm_chat=self.chat_model, 
-            llm_resoner=self.reasoner_model, 
-            retriever=retriever
-        )
+        def comparable(metadata):
+            return {key: value for key, value in (metadata or {}).items() if value is not None}
+
+        ids = list(chunks)
+        refreshed = 0
+        for i in range(0, len(ids), _UPSERT_BATCH):
+            stored = vectorstore.get(ids=ids[i:i + _UPSERT_BATCH], include=["metadatas"])
+            changed = [
+                chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+                if comparable(metadata) != comparable(chunks[chunk_id].metadata)
+            ]
+            if changed:
+                vectorstore._collection.update(
+                    ids=changed, metadatas=[comparable(chunks[chunk_id].metadata) for chunk_id in changed]
+                )
+                refreshed += len(changed)
+        return refreshed
+
+    def estimated_memory_bytes(self):
+        """
+        Estimates the resident size of this pipeline from its persisted vectorstore.
 
-    async def run_workflow(self, query):
+        A shared collection is opened once for all pipelines, so only the PDF's own lexical
+        index counts towards it.
+
+        Returns:
+            int: The total size in bytes of the files under the vectorstore directory.
+        """
+        total = 0
+        path = self.lexical_index_path if self.index_mode == INDEX_SHARED else self.vectorstore_path
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    async def run_workflow(self, query, max_generations=None, max_rewrites=None, deadline_seconds=None, trace=None):
         """
         Runs the workflow asynchronously.
 
+        Answers to questions already asked about this version of the document (or close
+        paraphrases of them) are served from the answer cache without running the graph,
+        framed exactly like a live run. Identical questions asked while one is being answered
+        share its run (see `coalesced_answer`).
+
         Args:
             query (str): The user's question.
+            max_generations (int, optional): Cap on generations for this question.
+            max_rewrites (int, optional): Cap on query rewrites for this question.
+            deadline_seconds (float, optional): Wall-clock budget for this question.
+            trace (RequestTrace, optional): Trace of the request.
 
         Yields:
-            str: Chunks of the generated answer from the workflow.
+            str: Server-Sent Events: "attempt", "token", "final" (and "error" on failure).
         """
-        async for i in self.workflow.stream_chunks(query):
-            yield i
\ No newline at end of file
+        scope = (self.pdf_name, self.document_version)
+        question_embedding = None
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get_exact(scope, query)
+            if cached is None:
+                # Embedding the question is blocking model inference
+                question_embedding = await asyncio.to_thread(self.answer_cache.embed, query)
+                cached = self.answer_cache.get_similar(scope, question_embedding)
+            if cached is not None:
+                yield format_sse("attempt", {"attempt": 1})
+                yield format_sse("token", {"attempt": 1, "text": cached})
+                yield format_sse("final", {"answer": cached, "attempt": 1, "grade": "useful", "reason": "cached",
+                                           "generations": 0, "rewrites": 0, "timings": {}})
+                if trace is not None:
+                    trace.finish("cached")
+                return
+
+        def cache_answer(data):
+            # Only answers the graders accepted are worth reusing
+            if data["reason"] == "useful" and self.answer_cache is not None:
+                self.answer_cache.put(scope, query, data["answer"], question_embedding)
+
+        budgets = {"max_generations": max_generations, "max_rewrites": max_rewrites, "deadline_seconds": deadline_seconds}
+
+        def produce():
+            return stream_answer(self.workflow, query, self.retriever, on_final=cache_answer, trace=trace, **budgets)
+
+        if self.single_flight is None:
+            stream = produce()
+        else:
+            stream = coalesced_answer(self.single_flight, scope, query, produce, trace=trace, **budgets)
+        async for sse in stream:
+            yield sse
+
+    def migrate_to_shared_collection(self, shared_vectorstore_path):
+        """
+        Copies this PDF's per-document vectorstore into the shared collection.
+
+        The stored embeddings are copied as they are, so nothing is re-embedded. The
+        per-document directory is left in place.
+
+        Args:
+            shared_vectorstore_path (str): Persist directory of the shared collection.
+
+        Returns:
+            int: Number of chunks copied.
+        """
+        if not self.is_indexed():
+            return 0
+        source = self.open_vectorstore()
+        shared = get_shared_vectorstore(shared_vectorstore_path, self.embedding_model)
+        stored = source.get(include=["documents", "metadatas", "embeddings"])
+        ids = stored["ids"]
+        for i in range(0, len(ids), _UPSERT_BATCH):
+            shared._collection.upsert(
+                ids=ids[i:i + _UPSERT_BATCH],
+                embeddings=[[float(x) for x in vector] for vector in stored["embeddings"][i:i + _UPSERT_BATCH]],
+                documents=stored["documents"][i:i + _UPSERT_BATCH],
+                metadatas=[dict(metadata or {}, pdf_name=self.pdf_name) for metadata in stored["metadatas"][i:i + _UPSERT_BATCH]],
+            )
+
+        lexical_index = LexicalIndex.load(self.lexical_index_path)
+        if lexical_index is not None:
+            stem = os.path.basename(self.lexical_index_path)
+            lexical_index.save(os.path.join(shared_vectorstore_path, "lexical", stem))
+        logger.info("[DocumentProcessingWorkflow] Migrated %d chunks of %s to the shared collection", len(ids), self.pdf_name)
+        return len(ids)
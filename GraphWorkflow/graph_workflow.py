@@ -1,12 +1,35 @@
+import threading
+import time
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, START, END
-from typing import List, Dict
-from utility.answer_grader import grade_answer
-from utility.document_grader import grade_document_relevance
-from utility.generate import run_rag_chain
-from utility.grade_hallucinations import grade_hallucination
-from utility.rewrite_questions import rewrite_question
+from typing import Annotated, List, Dict
+from utility.admission import GENERATE, llm_priority
+from utility.document_grader import PER_DOCUMENT, agrade_document_relevance, grade_document_relevance, relevant_documents
+from utility.generate import arun_rag_chain, format_docs, run_rag_chain
+from utility.generation_grader import SEQUENTIAL, agrade_generation, grade_generation
+from utility.rewrite_questions import arewrite_question, rewrite_question
+from utility.telemetry import logger
 from typing_extensions import TypedDict
 
+def add_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    """Reducer that accumulates per-stage wall time across loop iterations."""
+    merged = dict(left or {})
+    for stage, seconds in (right or {}).items():
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    return merged
+
+# Verdicts of the generation grader, from worst to best. An unverified generation was
+# judged not useful but its grounding check returned no score, so it may be ungrounded
+# and never displaces a generation known to be grounded.
+NOT_SUPPORTED = "not supported"
+UNVERIFIED = "unverified"
+NOT_USEFUL = "not useful"
+USEFUL = "useful"
+GRADE_RANK = {NOT_SUPPORTED: 0, UNVERIFIED: 1, NOT_USEFUL: 2, USEFUL: 3}
+
+# Conditional edges, timed alongside the nodes in request traces
+ROUTING_EDGES = ("decide_to_generate", "route_generation")
+
 class GraphState(TypedDict):
     """
     Represents the state of our graph.
@@ -15,22 +38,100 @@ class GraphState(TypedDict):
         question: question
         generation: LLM generation
         documents: list of documents
+        context: documents as packed into the latest generation prompt
+        timings: seconds spent per stage
+        generation_count: number of generations so far
+        rewrite_count: number of query rewrites so far
+        generation_grade: verdict on the latest generation
+        best_generation: best-graded generation so far
+        best_grade: verdict on best_generation
+        best_attempt: generation number of best_generation
+        max_generations: generation budget of the run
+        max_rewrites: rewrite budget of the run
+        deadline: time.monotonic() after which the run wraps up
     """
 
     question: str
     generation: str
     documents: List[str]
+    context: str
+    timings: Annotated[Dict[str, float], add_timings]
+    generation_count: int
+    rewrite_count: int
+    generation_grade: str
+    best_generation: str
+    best_grade: str
+    best_attempt: int
+    max_generations: int
+    max_rewrites: int
+    deadline: float
 
 class GraphWorkflow:
     """
     Class to encapsulate the graph workflow for document retrieval, generation, and grading.
+
+    The graph is compiled once and shared by every document; the retriever for a run is
+    supplied through the run config (``config["configurable"]["retriever"]``).
+
+    Every node has a native async implementation (``a``-prefixed) used by `astream_events`,
+    and a sync counterpart used by `invoke`/`stream`.
     """
-    def __init__(self, retriever, llm_chat, llm_resoner):
-        self.retriever = retriever
+    def __init__(self, llm_chat, llm_resoner, grading_mode=PER_DOCUMENT, grading_concurrency=4,
+                 max_generations=3, max_rewrites=2, deadline_seconds=120.0,
+                 generation_grading_mode=SEQUENTIAL, reranker=None, context_packer=None):
+        """
+        Args:
+            llm_chat: The chat model used for grading.
+            llm_resoner: The reasoning model used for generation and query rewriting.
+            grading_mode (str): "per_document" or "single_call" document relevance grading.
+            grading_concurrency (int): Maximum concurrent grading calls in per-document mode.
+            max_generations (int): Default cap on generations per question.
+            max_rewrites (int): Default cap on query rewrites per question.
+            deadline_seconds (float): Default wall-clock budget per question.
+            generation_grading_mode (str): "sequential", "parallel" or "combined" grading of
+                each generation for grounding and usefulness.
+            reranker (Reranker, optional): Local cross-encoder used instead of LLM relevance
+                grading; without it documents are graded by the LLM.
+            context_packer (ContextPacker, optional): Deduplicates and packs the documents
+                into each model's token budget; without it every document is sent as is.
+        """
         self.llm_chat = llm_chat
         self.llm_resoner = llm_resoner
+        self.grading_mode = grading_mode
+        self.grading_concurrency = grading_concurrency
+        self.max_generations = max_generations
+        self.max_rewrites = max_rewrites
+        self.deadline_seconds = deadline_seconds
+        self.generation_grading_mode = generation_grading_mode
+        self.reranker = reranker
+        self.context_packer = context_packer
+
+        self._stats_lock = threading.Lock()
+        self.generations_graded = 0
+        self.generation_grading_seconds = 0.0
+        self.generation_grading_saved_seconds = 0.0
+        self.contexts_packed = 0
+        self.context_input_tokens = 0
+        self.context_tokens = 0
+
         self.workflow = self.build_graph_workflow()
 
+    @staticmethod
+    def get_retriever(config: RunnableConfig):
+        """
+        Resolves the retriever for the current run.
+
+        Args:
+            config (RunnableConfig): The run config passed to the node.
+
+        Returns:
+            BaseRetriever: The retriever of the document being queried.
+        """
+        retriever = (config or {}).get("configurable", {}).get("retriever")
+        if retriever is None:
+            raise ValueError("No retriever supplied in config['configurable']['retriever'].")
+        return retriever
+
     def build_graph_workflow(self):
         """
         Builds the graph workflow.
@@ -40,11 +141,19 @@ class GraphWorkflow:
         """
         workflow = StateGraph(GraphState)
 
-        # Define nodes
-        workflow.add_node("retrieve", self.retrieve)
-        workflow.add_node("grade_documents", self.grade_documents)
-        workflow.add_node("generate", self.generate)
-        workflow.add_node("transform_query", self.transform_query)
+        # Define nodes; async runs use the native coroutine, sync runs the blocking variant
+        workflow.add_node("retrieve", RunnableLambda(self.retrieve, afunc=self.aretrieve, name="retrieve"))
+        workflow.add_node("grade_documents", RunnableLambda(self.grade_documents, afunc=self.agrade_documents, name="grade_documents"))
+        workflow.add_node("generate", RunnableLambda(self.generate, afunc=self.agenerate, name="generate"))
+        workflow.add_node("transform_query", RunnableLambda(self.transform_query, afunc=self.atransform_query, name="transform_query"))
+        workflow.add_node(
+            "grade_generation",
+            RunnableLambda(
+                self.grade_generation_v_documents_and_question,
+                afunc=self.agrade_generation_v_documents_and_question,
+                name="grade_generation",
+            ),
+        )
 
         # Define edges
         workflow.add_edge(START, "retrieve")
@@ -55,52 +164,102 @@ class GraphWorkflow:
             {
                 "transform_query": "transform_query",
                 "generate": "generate",
+                "end": END,
             },
         )
         workflow.add_edge("transform_query", "retrieve")
+        workflow.add_edge("generate", "grade_generation")
         workflow.add_conditional_edges(
-            "generate",
-            self.grade_generation_v_documents_and_question,
+            "grade_generation",
+            self.route_generation,
             {
-                "not supported": "generate",
-                "useful": END,
-                "not useful": "transform_query",
+                NOT_SUPPORTED: "generate",
+                USEFUL: END,
+                NOT_USEFUL: "transform_query",
+                UNVERIFIED: "transform_query",
+                "end": END,
             },
         )
 
         return workflow.compile()
 
-    def retrieve(self, state: GraphState):
+    def retrieve(self, state: GraphState, config: RunnableConfig):
         """
         Retrieves relevant documents.
 
         Args:
             state (GraphState): The current graph state.
+            config (RunnableConfig): The run config carrying the retriever.
 
         Returns:
             GraphState: Updated state with retrieved documents.
         """
-        print("---RETRIEVE---")
+        logger.debug("---RETRIEVE---")
+        question = state["question"]
+        documents = self.get_retriever(config).get_relevant_documents(question)
+        return {"documents": documents, "question": question}
+
+    async def aretrieve(self, state: GraphState, config: RunnableConfig):
+        """Async variant of `retrieve`."""
+        logger.debug("---RETRIEVE---")
         question = state["question"]
-        documents = self.retriever.get_relevant_documents(question)
+        documents = await self.get_retriever(config).ainvoke(question)
         return {"documents": documents, "question": question}
 
-    def grade_documents(self, state: GraphState):
+    def grade_documents(self, state: GraphState, config: RunnableConfig):
         """
         Grades the relevance of documents to the question.
 
+        With a reranker configured the documents are scored by the local cross-encoder
+        and cut down to its top results; otherwise each one is graded by the LLM.
+
         Args:
             state (GraphState): The current graph state.
+            config (RunnableConfig): The run config.
 
         Returns:
             GraphState: Updated state with filtered relevant documents.
         """
-        print("---GRADE DOCUMENTS---")
-        question = state["question"]
-        documents = state["documents"]
-        graded_results = grade_document_relevance(self.llm_chat, self.retriever, question)
-        filtered_docs = [doc for doc in documents if doc.page_content in [res["document"] for res in graded_results if res["relevance_score"] == "yes"]]
-        return {"documents": filtered_docs, "question": question}
+        if self.reranker is not None:
+            logger.debug("---RERANK DOCUMENTS---")
+            start = time.perf_counter()
+            filtered_docs = self.reranker.rerank(state["question"], state["documents"])
+            return self._reranked_documents(state, filtered_docs, time.perf_counter() - start)
+
+        logger.debug("---GRADE DOCUMENTS---")
+        start = time.perf_counter()
+        # Grade the documents `retrieve` already put in the state; no second vector search
+        graded_results = grade_document_relevance(self.llm_chat, state["documents"], state["question"])
+        return self._graded_documents(state, graded_results, time.perf_counter() - start)
+
+    async def agrade_documents(self, state: GraphState, config: RunnableConfig):
+        """Async variant of `grade_documents`; grades the documents concurrently."""
+        if self.reranker is not None:
+            logger.debug("---RERANK DOCUMENTS---")
+            start = time.perf_counter()
+            filtered_docs = await self.reranker.arerank(state["question"], state["documents"])
+            return self._reranked_documents(state, filtered_docs, time.perf_counter() - start)
+
+        logger.debug("---GRADE DOCUMENTS---")
+        start = time.perf_counter()
+        graded_results = await agrade_document_relevance(
+            self.llm_chat,
+            state["documents"],
+            state["question"],
+            mode=self.grading_mode,
+            max_concurrency=self.grading_concurrency,
+        )
+        return self._graded_documents(state, graded_results, time.perf_counter() - start)
+
+    @staticmethod
+    def _reranked_documents(state: GraphState, filtered_docs, elapsed):
+        logger.debug("---RERANK DOCUMENTS: kept %d of %d in %.2fs---", len(filtered_docs), len(state["documents"]), elapsed)
+        return {"documents": filtered_docs, "question": state["question"], "timings": {"rerank": elapsed}}
+
+    def _graded_documents(self, state: GraphState, graded_results, elapsed):
+        logger.debug("---GRADE DOCUMENTS: %d graded in %.2fs---", len(graded_results), elapsed)
+        filtered_docs = relevant_documents(state["documents"], graded_results)
+        return {"documents": filtered_docs, "question": state["question"], "timings": {"grade_documents": elapsed}}
 
     def generate(self, state: GraphState):
         """
@@ -112,13 +271,55 @@ class GraphWorkflow:
         Returns:
             GraphState: Updated state with generated answer.
         """
-        print("---GENERATE---")
-        question = state["question"]
-        documents = state["documents"]
-
-        generation = run_rag_chain(self.llm_resoner, documents, question)
-
-        return {"documents": documents, "question": question, "generation": generation}
+        logger.debug("---GENERATE---")
+        context = self._pack_context(state["documents"], self.llm_resoner)
+        generation = run_rag_chain(self.llm_resoner, context, state["question"])
+        return self._generated(state, generation, context)
+
+    async def agenerate(self, state: GraphState):
+        """Async variant of `generate`."""
+        logger.debug("---GENERATE---")
+        context = self._pack_context(state["documents"], self.llm_resoner)
+        # The answer is what the client is waiting on; it goes ahead of queued grading calls
+        with llm_priority(GENERATE):
+            generation = await arun_rag_chain(self.llm_resoner, context, state["question"])
+        return self._generated(state, generation, context)
+
+    @staticmethod
+    def _generated(state: GraphState, generation, context):
+        return {
+            "documents": state["documents"],
+            "question": state["question"],
+            "generation": generation,
+            "context": context,
+            "generation_count": state.get("generation_count", 0) + 1,
+        }
+
+    def _pack_context(self, documents, llm):
+        """Packs the documents into the context string sent to `llm`."""
+        if self.context_packer is None:
+            return format_docs(documents)
+        packed = self.context_packer.pack(documents, self.context_packer.budget_for(llm))
+        logger.debug("---PACK CONTEXT: %d chunks into %d, ~%d of ~%d tokens---",
+                     len(documents), len(packed.documents), packed.tokens, packed.input_tokens)
+        with self._stats_lock:
+            self.contexts_packed += 1
+            self.context_input_tokens += packed.input_tokens
+            self.context_tokens += packed.tokens
+        return packed.text
+
+    def _grading_facts(self, state: GraphState):
+        """
+        Returns the facts the generation is graded against: the context it was generated
+        from, re-packed only when the grading model has the smaller budget.
+        """
+        if self.context_packer is None or not state.get("context"):
+            return state["documents"]
+        chat_budget = self.context_packer.budget_for(self.llm_chat)
+        resoner_budget = self.context_packer.budget_for(self.llm_resoner)
+        if chat_budget is not None and (resoner_budget is None or chat_budget < resoner_budget):
+            return self._pack_context(state["documents"], self.llm_chat)
+        return state["context"]
 
     def transform_query(self, state: GraphState):
         """
@@ -130,27 +331,54 @@ class GraphWorkflow:
         Returns:
             GraphState: Updated state with transformed question.
         """
-        print("---TRANSFORM QUERY---")
-        question = state["question"]
-        better_question = rewrite_question(self.llm_resoner, question)
-        return {"documents": state["documents"], "question": better_question}
+        logger.debug("---TRANSFORM QUERY---")
+        better_question = rewrite_question(self.llm_resoner, state["question"])
+        return self._rewritten(state, better_question)
+
+    async def atransform_query(self, state: GraphState):
+        """Async variant of `transform_query`."""
+        logger.debug("---TRANSFORM QUERY---")
+        better_question = await arewrite_question(self.llm_resoner, state["question"])
+        return self._rewritten(state, better_question)
+
+    @staticmethod
+    def _rewritten(state: GraphState, better_question):
+        return {
+            "documents": state["documents"],
+            "question": better_question,
+            "rewrite_count": state.get("rewrite_count", 0) + 1,
+        }
+
+    @staticmethod
+    def deadline_passed(state: GraphState):
+        """Returns True once the run's wall-clock budget is spent."""
+        return time.monotonic() >= state.get("deadline", float("inf"))
 
     def decide_to_generate(self, state: GraphState):
         """
         Decides whether to generate an answer or transform the query.
 
+        Once the rewrite budget or the deadline is spent, the run ends at its best answer so
+        far instead of rewriting again; with no answer yet it generates from what it has.
+
         Args:
             state (GraphState): The current graph state.
 
         Returns:
             str: Decision for next node.
         """
-        print("---DECIDE TO GENERATE---")
-        if not state["documents"]:
-            print("---TRANSFORM QUERY---")
+        logger.debug("---DECIDE TO GENERATE---")
+        if self.deadline_passed(state):
+            logger.debug("---DEADLINE REACHED---")
+            return "end"
+        if state["documents"]:
+            logger.debug("---GENERATE---")
+            return "generate"
+        if state.get("rewrite_count", 0) < state.get("max_rewrites", self.max_rewrites):
+            logger.debug("---TRANSFORM QUERY---")
             return "transform_query"
-        print("---GENERATE---")
-        return "generate"
+        logger.debug("---REWRITE BUDGET EXHAUSTED---")
+        return "end" if state.get("best_generation") else "generate"
 
     def grade_generation_v_documents_and_question(self, state: GraphState):
         """
@@ -160,33 +388,178 @@ class GraphWorkflow:
             state (GraphState): The current graph state.
 
         Returns:
-            str: Decision for next node.
+            GraphState: Updated state with the verdict and the best generation so far.
         """
-        print("---GRADE GENERATION---")
-        documents = state["documents"]
-        generation = state["generation"]
-
-        hallucination_grade = grade_hallucination(self.llm_chat, documents, generation)
-        if hallucination_grade["hallucination_grade"] == "yes":
-            answer_grade = grade_answer(self.llm_chat, state["question"], generation)
-            if answer_grade["answer_grade"] == "yes":
-                return "useful"
-            else:
-                return "not useful"
+        logger.debug("---GRADE GENERATION---")
+        grades = grade_generation(
+            self.llm_chat,
+            self._grading_facts(state),
+            state["question"],
+            state["generation"],
+            mode=self.generation_grading_mode,
+        )
+        return self._generation_graded(state, grades)
+
+    async def agrade_generation_v_documents_and_question(self, state: GraphState):
+        """Async variant of `grade_generation_v_documents_and_question`; can grade speculatively in parallel."""
+        logger.debug("---GRADE GENERATION---")
+        grades = await agrade_generation(
+            self.llm_chat,
+            self._grading_facts(state),
+            state["question"],
+            state["generation"],
+            mode=self.generation_grading_mode,
+        )
+        return self._generation_graded(state, grades)
+
+    def _generation_graded(self, state: GraphState, grades):
+        """Records the verdict and keeps the best-graded generation so far."""
+        if grades["hallucination_grade"] == "no":
+            grade = NOT_SUPPORTED
+        elif grades["answer_grade"] == "yes":
+            grade = USEFUL
+        elif grades["hallucination_grade"] is None:
+            grade = UNVERIFIED
         else:
-            return "not supported"
-        
-    async def stream_chunks(self, question: str):
+            grade = NOT_USEFUL
+        logger.debug("---GRADE GENERATION: %s in %.2fs---", grade, grades["seconds"])
+
+        with self._stats_lock:
+            self.generations_graded += 1
+            self.generation_grading_seconds += grades["seconds"]
+            self.generation_grading_saved_seconds += grades["latency_saved"]
+
+        update = {
+            "generation_grade": grade,
+            "timings": {"grade_generation": grades["seconds"], "grade_generation_saved": grades["latency_saved"]},
+        }
+        if not state.get("best_generation") or GRADE_RANK[grade] >= GRADE_RANK[state.get("best_grade", NOT_SUPPORTED)]:
+            update.update({
+                "best_generation": state["generation"],
+                "best_grade": grade,
+                "best_attempt": state.get("generation_count", 1),
+            })
+        return update
+
+    def route_generation(self, state: GraphState):
         """
-        Streams chunks of the generated answer.
+        Routes on the generation verdict, ending early when the run's budget is spent.
+
+        Any rejected generation ends the run once the generation budget is spent; one that
+        is not useful (or unverified) also ends it once the rewrite budget is spent.
+
+        Args:
+            state (GraphState): The current graph state.
+
+        Returns:
+            str: Decision for next node.
+        """
+        grade = state["generation_grade"]
+        if grade == USEFUL:
+            return USEFUL
+        if self.deadline_passed(state):
+            logger.debug("---DEADLINE REACHED---")
+            return "end"
+        # Both retry paths generate again, so the generation budget caps rewrites as well
+        if state.get("generation_count", 0) >= state.get("max_generations", self.max_generations):
+            logger.debug("---GENERATION BUDGET EXHAUSTED---")
+            return "end"
+        if grade in (NOT_USEFUL, UNVERIFIED) and state.get("rewrite_count", 0) >= state.get("max_rewrites", self.max_rewrites):
+            logger.debug("---REWRITE BUDGET EXHAUSTED---")
+            return "end"
+        return grade
+
+    def stats(self):
+        """
+        Returns the generation grading and context packing counters.
+
+        Returns:
+            dict: Grading mode, generations graded, grading seconds, seconds saved by
+                speculative parallel grading, and the estimated tokens of the documents
+                before and after packing.
+        """
+        with self._stats_lock:
+            return {
+                "generation_grading_mode": self.generation_grading_mode,
+                "generations_graded": self.generations_graded,
+                "grading_seconds": self.generation_grading_seconds,
+                "latency_saved_seconds": self.generation_grading_saved_seconds,
+                "avg_grading_seconds": (
+                    self.generation_grading_seconds / self.generations_graded if self.generations_graded else 0.0
+                ),
+                "contexts_packed": self.contexts_packed,
+                "context_input_tokens": self.context_input_tokens,
+                "context_tokens": self.context_tokens,
+            }
+
+    async def stream_events(self, question: str, retriever, max_generations=None, max_rewrites=None, deadline_seconds=None,
+                            trace=None):
+        """
+        Streams the run as a sequence of events.
+
+        Every generation is a new attempt: an ("attempt", ...) event opens it and ("token", ...)
+        events carry its text. Attempts can be superseded by a later one, so clients should
+        drop the previous draft on each "attempt". The ("final", ...) event carries the
+        accepted answer (the best-graded one if the run ran out of budget).
 
         Args:
             question (str): The question to generate an answer for.
+            retriever (BaseRetriever): The retriever of the document being queried.
+            max_generations (int, optional): Cap on generations; defaults to the workflow's.
+            max_rewrites (int, optional): Cap on query rewrites; defaults to the workflow's.
+            deadline_seconds (float, optional): Wall-clock budget; defaults to the workflow's.
+            trace (RequestTrace, optional): Records node timings, LLM usage and the outcome of the run.
 
         Yields:
-            str: Chunks of the generated answer.
+            tuple: (event name, data dict).
         """
-        async for event in self.workflow.astream_events({"question": question}, version="v2"):
-            if event["event"] == "on_chat_model_stream" and event['metadata'].get('langgraph_node', '') == "generate":
-                data = event["data"]
-                yield data["chunk"].content
+        max_generations = self.max_generations if max_generations is None else max_generations
+        max_rewrites = self.max_rewrites if max_rewrites is None else max_rewrites
+        deadline_seconds = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        inputs = {
+            "question": question,
+            "max_generations": max_generations,
+            "max_rewrites": max_rewrites,
+            "deadline": time.monotonic() + deadline_seconds,
+        }
+        config = {
+            "configurable": {"retriever": retriever},
+            # retrieve + grade, 2 steps per generation, 3 per rewrite, plus slack
+            "recursion_limit": 2 + 2 * max_generations + 3 * max_rewrites + 10,
+        }
+        if trace is not None:
+            config["callbacks"] = trace.callbacks(edges=ROUTING_EDGES)
+
+        attempt = 0
+        async for event in self.workflow.astream_events(inputs, config=config, version="v2"):
+            kind = event["event"]
+            node = event["metadata"].get("langgraph_node", "")
+            # Node runs are direct children of the root run; the runnables nested inside
+            # the node inherit its langgraph_node metadata and must not open an attempt
+            if kind == "on_chain_start" and node == "generate" and len(event.get("parent_ids", [])) == 1:
+                attempt += 1
+                yield "attempt", {"attempt": attempt}
+            elif kind == "on_chat_model_stream" and node == "generate":
+                content = event["data"]["chunk"].content
+                if content:
+                    yield "token", {"attempt": attempt, "text": content}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # The root run ending carries the final state
+                state = event["data"]["output"] or {}
+                if state.get("generation_grade") == USEFUL:
+                    reason = "useful"
+                elif self.deadline_passed(state):
+                    reason = "deadline"
+                else:
+                    reason = "budget_exhausted"
+                if trace is not None:
+                    trace.finish(reason, state.get("generation_count", 0), state.get("rewrite_count", 0))
+                yield "final", {
+                    "answer": state.get("best_generation", ""),
+                    "attempt": state.get("best_attempt", 0),
+                    "grade": state.get("best_grade"),
+                    "reason": reason,
+                    "generations": state.get("generation_count", 0),
+                    "rewrites": state.get("rewrite_count", 0),
+                    "timings": state.get("timings", {}),
+                }
@@ -3,6 +3,8 @@ import requests
 import uuid
 import base64
 import gc
+import json
+import time
 
 # Reset chat session
 def reset_chat():
@@ -24,6 +26,26 @@ if "messages" not in st.session_state:
 # Backend API URL
 BASE_URL = "http://127.0.0.1:8000"  # Replace with your FastAPI backend URL
 
+def wait_until_indexed(pdf_name, poll_interval=1.0):
+    """Poll the backend until the uploaded PDF has been indexed; returns the final job status."""
+    while True:
+        job = requests.get(f"{BASE_URL}/status/{pdf_name}").json()
+        if job.get("status") in ("ready", "failed") or "error" in job:
+            return job
+        time.sleep(poll_interval)
+
+def iter_sse(response):
+    """Parse a Server-Sent Events response into (event, data) pairs."""
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
+
 def display_pdf(file):
     """Display a PDF file within the Streamlit app."""
     base64_pdf = base64.b64encode(file.read()).decode("utf-8")
@@ -36,6 +58,10 @@ with st.sidebar:
 
     # File uploader
     uploaded_file = st.file_uploader("Choose your `.pdf` file", type="pdf")
+    retrieval_mode = st.radio(
+        "Retrieval", ["vector", "hybrid"], horizontal=True,
+        help="Hybrid adds keyword search, which helps with part numbers, clause ids and other exact terms.",
+    )
 
     if uploaded_file:
         # Check if a new file is uploaded
@@ -43,15 +69,24 @@ with st.sidebar:
             try:
                 # Send file to backend for processing
                 response = requests.post(
-                    f"{BASE_URL}/upload", files={"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
+                    f"{BASE_URL}/upload",
+                    files={"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")},
+                    data={"retrieval_mode": retrieval_mode},
                 )
 
-                if response.status_code == 200:
-                    # Successfully uploaded and processed
-                    st.success(f"{uploaded_file.name} uploaded and processed successfully!")
-                    st.session_state.uploaded_file_name = uploaded_file.name
-                    st.session_state.pipeline_ready = True
-                    display_pdf(uploaded_file)
+                if response.status_code == 200 and "error" not in response.json():
+                    # Uploaded; indexing runs in the background on the server
+                    with st.spinner(f"Indexing {uploaded_file.name}..."):
+                        job = wait_until_indexed(uploaded_file.name)
+
+                    if job.get("status") == "ready":
+                        st.success(f"{uploaded_file.name} uploaded and processed successfully!")
+                        st.session_state.uploaded_file_name = uploaded_file.name
+                        st.session_state.pipeline_ready = True
+                        display_pdf(uploaded_file)
+                    else:
+                        st.error(f"Error: {job.get('error') or 'Indexing failed.'}")
+                        st.session_state.pipeline_ready = False
                 else:
                     # Error during processing
                     error_message = response.json().get("error", "Unknown error occurred during processing.")
@@ -105,11 +140,19 @@ if prompt := st.chat_input("Ask a question about the document:"):
                 )
 
                 if response.status_code == 200:
-                    def response_generator():
-                        for chunk in response.iter_content(chunk_size=None):
-                            yield chunk.decode("utf-8")
-
-                    full_response = st.write_stream(response_generator())
+                    placeholder = st.empty()
+                    full_response = ""
+                    for event, data in iter_sse(response):
+                        if event == "attempt":
+                            # A new draft supersedes the previous one
+                            full_response = ""
+                        elif event == "token":
+                            full_response += data["text"]
+                        elif event == "final":
+                            full_response = data["answer"]
+                        elif event == "error":
+                            full_response = f"Error: {data['error']}"
+                        placeholder.markdown(full_response)
                 else:
                     # Error during response generation
                     error_message = response.json().get("error", "Unknown error")
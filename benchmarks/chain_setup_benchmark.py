@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of per-call chain setup.
+
+Compares rebuilding each chain on every call (prompt template, structured-output binding
+and runnable composition, as the helpers used to do) with fetching the prebuilt chain from
+the registry. No LLM is called; only setup cost is measured. Pass --hub to also time the
+`hub.pull("rlm/rag-prompt")` network fetch the RAG chain used to make per generation
+(requires the `langchain` package and network access).
+
+    python benchmarks/chain_setup_benchmark.py --iterations 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_deepseek import ChatDeepSeek
+
+from utility.answer_grader import build_answer_grader
+from utility.chains import cached_chain, clear_chains
+from utility.document_grader import build_batch_retrieval_grader, build_retrieval_grader
+from utility.generate import build_rag_chain
+from utility.generation_grader import build_generation_grader
+from utility.grade_hallucinations import build_hallucination_grader
+from utility.rewrite_questions import build_question_rewriter
+
+
+def per_call_seconds(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chain setup overhead per call, rebuilt vs prebuilt.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--hub", action="store_true", help="Also time hub.pull of the RAG prompt.")
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    # Building chains never contacts the API, so a placeholder key is enough
+    llm_chat = ChatDeepSeek(model="deepseek-chat", temperature=0, api_key="benchmark")
+    llm_resoner = ChatDeepSeek(model="deepseek-reasoner", temperature=0, api_key="benchmark")
+
+    chains = [
+        ("answer_grader", llm_chat, build_answer_grader),
+        ("hallucination_grader", llm_chat, build_hallucination_grader),
+        ("retrieval_grader", llm_chat, build_retrieval_grader),
+        ("batch_retrieval_grader", llm_chat, build_batch_retrieval_grader),
+        ("generation_grader", llm_chat, build_generation_grader),
+        ("question_rewriter", llm_resoner, build_question_rewriter),
+        ("rag_chain", llm_resoner, build_rag_chain),
+    ]
+
+    clear_chains()
+    results = []
+    print(f"{'chain':<24} {'rebuilt us':>12} {'prebuilt us':>12} {'speedup':>9}")
+    for name, llm, builder in chains:
+        rebuilt = per_call_seconds(lambda: builder(llm), args.iterations)
+        cached_chain(name, llm, builder)
+        prebuilt = per_call_seconds(lambda: cached_chain(name, llm, builder), args.iterations)
+        results.append({"chain": name, "rebuilt_seconds": rebuilt, "prebuilt_seconds": prebuilt})
+        print(f"{name:<24} {rebuilt * 1e6:>12.1f} {prebuilt * 1e6:>12.2f} {rebuilt / prebuilt:>8.0f}x")
+
+    if args.hub:
+        from langchain import hub
+        pulled = per_call_seconds(lambda: hub.pull("rlm/rag-prompt"), min(args.iterations, 5))
+        results.append({"chain": "hub.pull(rlm/rag-prompt)", "rebuilt_seconds": pulled, "prebuilt_seconds": 0.0})
+        print(f"{'hub.pull rag-prompt':<24} {pulled * 1e6:>12.1f} {'-':>12} {'-':>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"iterations": args.iterations, "chains": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Offline end-to-end benchmark of the API.
+
+Starts the local DeepSeek stand-in (`mock_deepseek.py`) and an API server pointed at it
+in a scratch directory, uploads synthetic PDFs of the given page counts, then asks
+questions at each concurrency level. Reports ingestion throughput, time to first token,
+p50/p95/p99 end-to-end latency and graph loop counts; nothing is sent to DeepSeek and
+the server's own database and vectorstores are left alone.
+
+    python benchmarks/e2e_benchmark.py --pages 10 50 --concurrency 1 4 16 --output run.json
+    python benchmarks/e2e_benchmark.py --pages 10 50 --concurrency 1 4 16 --baseline run.json
+
+Mock options (--latency, --tokens-per-second, --verdict ...) shape the simulated model;
+e.g. --verdict GradeHallucinations.binary_score=0.5 makes half the answers regenerate.
+The embedding model is loaded from ./saved_model, which the scratch server links to.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_deepseek import add_arguments, settings_from_args, start_in_thread
+from synthetic_pdf import write_synthetic_pdf
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list, or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def start_api_server(workdir, port, mock_url, extra_env):
+    """
+    Starts `uvicorn main:app` in `workdir` against the mock, and waits until it is ready.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    saved_model = os.path.join(REPO_ROOT, "saved_model")
+    if os.path.isdir(saved_model):
+        os.symlink(saved_model, os.path.join(workdir, "saved_model"))
+    env = dict(
+        os.environ,
+        DEEPSEEK_API_BASE=mock_url,
+        DEEPSEEK_API_KEY="mock",
+        # Every question runs the full graph unless the caller asks otherwise
+        ANSWER_CACHE_MAX_ENTRIES="0",
+    )
+    env.update(extra_env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", REPO_ROOT, "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+    )
+    api_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The API server exited with code {process.returncode}.")
+        # /readyz turns 200 once the models are loaded and warm; before that /ask answers 503
+        try:
+            response = requests.get(f"{api_url}/readyz", timeout=2)
+            if response.ok:
+                return process
+            if response.json().get("warmup", {}).get("failed"):
+                process.terminate()
+                raise RuntimeError(f"The API server failed to warm up: {response.json()['warmup']}")
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("The API server did not start within 10 minutes.")
+
+
+def ingest(api_url, pdf_path, timeout):
+    """
+    Uploads a PDF and waits for its index to be ready.
+
+    Returns:
+        dict: Upload and indexing time, throughput and index stats.
+    """
+    pdf_name = os.path.basename(pdf_path)
+    start = time.perf_counter()
+    with open(pdf_path, "rb") as f:
+        response = requests.post(f"{api_url}/upload", files={"file": (pdf_name, f, "application/pdf")}, timeout=timeout)
+    response.raise_for_status()
+    uploaded = time.perf_counter() - start
+
+    status = {}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = requests.get(f"{api_url}/status/{pdf_name}", timeout=10).json()
+        if status.get("status") in ("ready", "failed"):
+            break
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+    index = status.get("index") or {}
+    pages = index.get("page_count")
+    return {
+        "pdf_name": pdf_name,
+        "bytes": os.path.getsize(pdf_path),
+        "status": status.get("status"),
+        "error": status.get("error"),
+        "upload_seconds": uploaded,
+        "ready_seconds": elapsed,
+        "pages": pages,
+        "chunks": index.get("chunk_count"),
+        "pages_per_second": pages / elapsed if pages and elapsed else None,
+    }
+
+
+def ask(api_url, pdf_name, question, timeout):
+    """
+    Sends one question and reads the event stream to the end.
+
+    Returns:
+        dict: Latency, time to the first answer token and the final event's data.
+    """
+    start = time.perf_counter()
+    first_token = None
+    final = None
+    event = None
+    with requests.post(f"{api_url}/ask", json={"question": question, "pdf_name": pdf_name}, stream=True,
+                       timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+            elif line.startswith("data:") and event in ("final", "error"):
+                final = dict(json.loads(line[len("data:"):]), event=event)
+    return {"latency": time.perf_counter() - start, "first_token": first_token, "final": final or {}}
+
+
+def run_level(api_url, pdf_name, question, clients, requests_per_client, timeout):
+    """
+    Runs `clients` concurrent clients, each asking `requests_per_client` questions in turn.
+
+    Returns:
+        dict: Throughput, latency percentiles and loop counts for this concurrency level.
+    """
+    def client(_):
+        results = []
+        for _ in range(requests_per_client):
+            try:
+                results.append(ask(api_url, pdf_name, f"{question} [{uuid.uuid4().hex[:8]}]", timeout))
+            except requests.RequestException as e:
+                results.append({"error": str(e)})
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = [result for batch in executor.map(client, range(clients)) for result in batch]
+    elapsed = time.perf_counter() - start
+
+    ok = [result for result in results if "error" not in result and result["final"].get("event") == "final"]
+    latencies = [result["latency"] for result in ok]
+    first_tokens = [result["first_token"] for result in ok if result["first_token"] is not None]
+    generations = [result["final"].get("generations", 0) for result in ok]
+    rewrites = [result["final"].get("rewrites", 0) for result in ok]
+    reasons = {}
+    for result in ok:
+        reason = result["final"].get("reason")
+        reasons[reason] = reasons.get(reason, 0) + 1
+    return {
+        "clients": clients,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "first_token_p50": percentile(first_tokens, 50),
+        "first_token_p95": percentile(first_tokens, 95),
+        "first_token_p99": percentile(first_tokens, 99),
+        "generations_mean": statistics.mean(generations) if generations else None,
+        "rewrites_mean": statistics.mean(rewrites) if rewrites else None,
+        "loops_max": max((g - 1 + r for g, r in zip(generations, rewrites)), default=None),
+        "reasons": reasons,
+    }
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def _delta(current, previous):
+    if current is None or not previous:
+        return "-"
+    return f"{100 * (current - previous) / previous:+.0f}%"
+
+
+def compare(results, baseline):
+    """Prints the change of the headline numbers against a previous run."""
+    print(f"\nAgainst {baseline['_path']}:")
+    previous_ingestion = {run["pdf_name"]: run for run in baseline.get("ingestion", [])}
+    for run in results["ingestion"]:
+        previous = previous_ingestion.get(run["pdf_name"])
+        if previous:
+            print(f"  ingest {run['pdf_name']}: ready {_delta(run['ready_seconds'], previous['ready_seconds'])}")
+    previous_levels = {level["clients"]: level for level in baseline.get("levels", [])}
+    for level in results["levels"]:
+        previous = previous_levels.get(level["clients"])
+        if previous:
+            print(
+                f"  {level['clients']} clients: req/s {_delta(level['throughput_rps'], previous['throughput_rps'])}, "
+                f"p50 {_delta(level['latency_p50'], previous['latency_p50'])}, "
+                f"p95 {_delta(level['latency_p95'], previous['latency_p95'])}, "
+                f"p99 {_delta(level['latency_p99'], previous['latency_p99'])}, "
+                f"first token p50 {_delta(level['first_token_p50'], previous['first_token_p50'])}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and /ask end to end against a local DeepSeek stand-in.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50], help="Page counts of the synthetic PDFs.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--question", default="What does the document say about warranty clauses?")
+    parser.add_argument("--api-url", help="Use a running server (already pointed at the mock) instead of starting one.")
+    parser.add_argument("--api-port", type=int, default=8010)
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--server-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment of the started server, e.g. RETRIEVAL_MODE=hybrid.")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    parser.add_argument("--baseline", help="A previous --output file to compare against.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory.")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    settings = settings_from_args(args)
+    mock_url = start_in_thread(settings, port=args.mock_port)
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    server = None
+    try:
+        api_url = args.api_url
+        if api_url is None:
+            extra_env = dict(spec.split("=", 1) for spec in args.server_env)
+            server = start_api_server(workdir, args.api_port, mock_url, extra_env)
+            api_url = f"http://127.0.0.1:{args.api_port}"
+
+        ingestion = []
+        print(f"{'pdf':>24} {'pages':>6} {'chunks':>7} {'upload s':>9} {'ready s':>8} {'pages/s':>8}")
+        for pages in args.pages:
+            pdf_path = write_synthetic_pdf(os.path.join(workdir, f"synthetic_{pages}p.pdf"), pages, seed=pages)
+            run = ingest(api_url, pdf_path, args.timeout)
+            ingestion.append(run)
+            print(
+                f"{run['pdf_name']:>24} {pages:>6} {run['chunks'] or '-':>7} {_fmt(run['upload_seconds']):>9} "
+                f"{_fmt(run['ready_seconds']):>8} {_fmt(run['pages_per_second']):>8}"
+            )
+            if run["status"] != "ready":
+                raise RuntimeError(f"Indexing {run['pdf_name']} did not finish: {run['status']} {run['error'] or ''}")
+
+        # Questions go to the largest document
+        pdf_name = ingestion[-1]["pdf_name"]
+        levels = []
+        print(f"\n{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+              f"{'ttft p50':>9} {'gens':>5} {'rewrites':>9}")
+        for clients in args.concurrency:
+            level = run_level(api_url, pdf_name, args.question, clients, args.requests_per_client, args.timeout)
+            levels.append(level)
+            print(
+                f"{level['clients']:>8} {level['requests']:>9} {level['errors']:>7} {level['throughput_rps']:>7.2f} "
+                f"{_fmt(level['latency_p50']):>7} {_fmt(level['latency_p95']):>7} {_fmt(level['latency_p99']):>7} "
+                f"{_fmt(level['first_token_p50']):>9} {_fmt(level['generations_mean']):>5} {_fmt(level['rewrites_mean']):>9}"
+            )
+
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                "pages": args.pages,
+                "concurrency": args.concurrency,
+                "requests_per_client": args.requests_per_client,
+                "server_env": args.server_env,
+                "mock": {"latency": settings.latency, "tokens_per_second": settings.tokens_per_second,
+                         "answer_tokens": settings.answer_tokens, "verdicts": settings.verdicts,
+                         "max_concurrent": settings.max_concurrent},
+            },
+            "ingestion": ingestion,
+            "levels": levels,
+            "llm_calls": dict(settings.calls),
+            "rate_limited_calls": settings.rate_limited,
+        }
+        if args.baseline:
+            with open(args.baseline) as f:
+                compare(results, dict(json.load(f), _path=args.baseline))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
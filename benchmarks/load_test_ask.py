@@ -0,0 +1,127 @@
+"""
+Load test for the /ask endpoint.
+
+Fires the same number of questions per client at increasing client counts and reports
+throughput and latency for each level. With native-async graph nodes, throughput should
+keep growing with the client count until the LLM provider becomes the limit, instead of
+flattening at the size of the server's thread pool.
+
+Start the server with the answer cache disabled so every question runs the full graph:
+
+    ANSWER_CACHE_MAX_ENTRIES=0 uvicorn main:app
+
+then upload a PDF and wait for it to be indexed before running:
+
+    python benchmarks/load_test_ask.py --pdf-name example.pdf --concurrency 1 2 4 8 16
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def ask(api_url, pdf_name, question, timeout):
+    """
+    Sends one question and reads the event stream to the end.
+
+    Returns:
+        dict: Total latency, time to the first event and whether a final event arrived.
+    """
+    start = time.perf_counter()
+    first_event = None
+    completed = False
+    with requests.post(
+        f"{api_url}/ask",
+        json={"question": question, "pdf_name": pdf_name},
+        stream=True,
+        timeout=timeout,
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("event:"):
+                continue
+            if first_event is None:
+                first_event = time.perf_counter() - start
+            if line == "event: final":
+                completed = True
+    return {"latency": time.perf_counter() - start, "first_event": first_event, "completed": completed}
+
+
+def run_level(api_url, pdf_name, question, clients, requests_per_client, timeout):
+    """
+    Runs `clients` concurrent clients, each asking `requests_per_client` questions in turn.
+
+    Returns:
+        dict: Throughput and latency summary for this concurrency level.
+    """
+    def client(_):
+        results = []
+        for _ in range(requests_per_client):
+            # A unique suffix keeps any cache layer from short-circuiting the graph
+            try:
+                results.append(ask(api_url, pdf_name, f"{question} [{uuid.uuid4().hex[:8]}]", timeout))
+            except requests.RequestException as e:
+                results.append({"error": str(e)})
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = [result for batch in executor.map(client, range(clients)) for result in batch]
+    elapsed = time.perf_counter() - start
+
+    ok = [result for result in results if "error" not in result]
+    latencies = sorted(result["latency"] for result in ok)
+    first_events = [result["first_event"] for result in ok if result["first_event"] is not None]
+    return {
+        "clients": clients,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "completed": sum(1 for result in ok if result["completed"]),
+        "wall_seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_p50": statistics.median(latencies) if latencies else None,
+        "latency_p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        "first_event_p50": statistics.median(first_events) if first_events else None,
+    }
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /ask throughput as the number of concurrent clients grows.")
+    parser.add_argument("--api-url", default="http://localhost:8000")
+    parser.add_argument("--pdf-name", required=True, help="An uploaded and indexed PDF.")
+    parser.add_argument("--question", default="What is this document about?")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    levels = []
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'first p50 s':>12}")
+    for clients in args.concurrency:
+        level = run_level(args.api_url, args.pdf_name, args.question, clients, args.requests_per_client, args.timeout)
+        levels.append(level)
+        print(
+            f"{level['clients']:>8} {level['requests']:>9} {level['errors']:>7} {level['throughput_rps']:>8.2f} "
+            f"{_fmt(level['latency_p50']):>8} {_fmt(level['latency_p95']):>8} {_fmt(level['first_event_p50']):>12}"
+        )
+
+    if len(levels) > 1 and levels[0]["throughput_rps"]:
+        scaling = levels[-1]["throughput_rps"] / levels[0]["throughput_rps"]
+        print(f"Throughput at {levels[-1]['clients']} clients is {scaling:.1f}x the {levels[0]['clients']}-client rate.")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"pdf_name": args.pdf_name, "levels": levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
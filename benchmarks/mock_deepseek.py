@@ -0,0 +1,268 @@
+"""
+Local stand-in for the DeepSeek chat completions API.
+
+Serves the OpenAI-compatible `/chat/completions` endpoint that `ChatDeepSeek` calls, with
+configurable latency, token streaming rate and scripted grader verdicts, so the service
+can be benchmarked without paying for live calls. Structured-output calls (the graders)
+are answered with a tool call filling every field of the requested schema; other calls
+stream a canned answer, or echo the question back for the query re-writer.
+
+Point the API at it with DEEPSEEK_API_BASE:
+
+    python benchmarks/mock_deepseek.py --port 8100 --latency 0.3 --tokens-per-second 60 \\
+        --verdict GradeHallucinations.binary_score=0.8
+    DEEPSEEK_API_BASE=http://127.0.0.1:8100 DEEPSEEK_API_KEY=mock uvicorn main:app
+
+A verdict is "yes", "no", or the probability of "yes". Fields without a verdict are "yes".
+With --max-concurrent, calls beyond that many in flight get HTTP 429, like a rate-limited account.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER_WORDS = (
+    "The document states that the figures reported for the period were reviewed and approved, "
+    "with the main changes described in the summary section."
+).split()
+
+
+class MockSettings:
+    """Behaviour of the mock server."""
+    def __init__(self, latency=0.2, tokens_per_second=50.0, answer_tokens=60, verdicts=None, seed=0, max_concurrent=0):
+        """
+        Args:
+            latency (float): Seconds before the first token of every response.
+            tokens_per_second (float): Streaming rate of generated text; 0 sends it at once.
+            answer_tokens (int): Length of generated answers, in tokens.
+            verdicts (dict, optional): "Schema.field" → "yes", "no" or the probability of "yes".
+            seed (int): Seed of the verdict draws.
+            max_concurrent (int): Calls served at once before answering 429; 0 for no limit.
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.verdicts = dict(verdicts or {})
+        self.random = random.Random(seed)
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.calls = {}
+        self.rate_limited = 0
+
+    def verdict(self, schema, field):
+        value = self.verdicts.get(f"{schema}.{field}", self.verdicts.get(field, "yes"))
+        if value in ("yes", "no"):
+            return value
+        return "yes" if self.random.random() < float(value) else "no"
+
+
+def parse_verdicts(specs):
+    """Parses "Schema.field=value" command-line verdicts into a dict."""
+    verdicts = {}
+    for spec in specs or []:
+        key, _, value = spec.partition("=")
+        verdicts[key.strip()] = value.strip()
+    return verdicts
+
+
+def _count_tokens(messages):
+    # Roughly four characters per token, like the DeepSeek tokenizer on English text
+    return max(1, sum(len(str(message.get("content") or "")) for message in messages) // 4)
+
+
+def _arguments(settings, tool, messages):
+    """Fills every property of the tool's schema with a scripted verdict."""
+    name = tool["function"]["name"]
+    arguments = {}
+    for field, spec in tool["function"].get("parameters", {}).get("properties", {}).items():
+        if spec.get("type") == "array":
+            # Batch grading: one verdict per numbered document
+            count = sum(len(re.findall(r"Document \d+:", str(m.get("content") or ""))) for m in messages) or 1
+            arguments[field] = [settings.verdict(name, field) for _ in range(count)]
+        else:
+            arguments[field] = settings.verdict(name, field)
+    return arguments
+
+
+def _text(settings, messages):
+    prompt = " ".join(str(message.get("content") or "") for message in messages)
+    if "question re-writer" in prompt:
+        match = re.search(r"initial question: \s*(.*?)\s*Formulate", prompt, re.S)
+        return match.group(1) if match else "What does the document say?"
+    return " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(settings.answer_tokens))
+
+
+def create_app(settings):
+    """
+    Builds the mock server.
+
+    Args:
+        settings (MockSettings): Latency, streaming rate and verdicts.
+
+    Returns:
+        FastAPI: The app.
+    """
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "deepseek-chat")
+        messages = body.get("messages", [])
+        if settings.max_concurrent and settings.in_flight >= settings.max_concurrent:
+            settings.rate_limited += 1
+            return JSONResponse(status_code=429, headers={"Retry-After": "1"},
+                                content={"error": {"message": "Rate limit reached.", "type": "rate_limit_error"}})
+        settings.calls[model] = settings.calls.get(model, 0) + 1
+        settings.in_flight += 1
+        try:
+            return await complete(body, model, messages)
+        finally:
+            # A streamed response is still being sent; it counts until the stream ends
+            if not body.get("stream"):
+                settings.in_flight -= 1
+
+    async def complete(body, model, messages):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        prompt_tokens = _count_tokens(messages)
+
+        tool = None
+        if body.get("tools"):
+            wanted = (body.get("tool_choice") or {}).get("function", {}).get("name") if isinstance(body.get("tool_choice"), dict) else None
+            tool = next((t for t in body["tools"] if t["function"]["name"] == wanted), body["tools"][0])
+
+        if tool is not None:
+            arguments = json.dumps(_arguments(settings, tool, messages))
+            pieces = [arguments]
+            completion_tokens = max(1, len(arguments) // 4)
+        else:
+            text = _text(settings, messages)
+            words = text.split(" ")
+            pieces = [word if i == 0 else " " + word for i, word in enumerate(words)]
+            completion_tokens = len(pieces)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        call_id = f"call_{uuid.uuid4().hex[:12]}"
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            if chunk_usage is not None:
+                data["choices"] = []
+                data["usage"] = chunk_usage
+            return f"data: {json.dumps(data)}\n\n"
+
+        if body.get("stream"):
+            async def stream():
+                await asyncio.sleep(settings.latency)
+                if tool is not None:
+                    yield chunk({"role": "assistant", "content": None, "tool_calls": [
+                        {"index": 0, "id": call_id, "type": "function",
+                         "function": {"name": tool["function"]["name"], "arguments": pieces[0]}}
+                    ]})
+                    finish_reason = "tool_calls"
+                else:
+                    yield chunk({"role": "assistant", "content": ""})
+                    for piece in pieces:
+                        yield chunk({"content": piece})
+                        if settings.tokens_per_second:
+                            await asyncio.sleep(1.0 / settings.tokens_per_second)
+                    finish_reason = "stop"
+                yield chunk({}, finish_reason=finish_reason)
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    yield chunk({}, chunk_usage=usage)
+                yield "data: [DONE]\n\n"
+
+            async def counted():
+                try:
+                    async for event in stream():
+                        yield event
+                finally:
+                    settings.in_flight -= 1
+
+            return StreamingResponse(counted(), media_type="text/event-stream")
+
+        delay = settings.latency
+        if tool is None and settings.tokens_per_second:
+            delay += completion_tokens / settings.tokens_per_second
+        await asyncio.sleep(delay)
+        if tool is not None:
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                {"id": call_id, "type": "function", "function": {"name": tool["function"]["name"], "arguments": pieces[0]}}
+            ]}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": "".join(pieces)}
+            finish_reason = "stop"
+        return {"id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}], "usage": usage}
+
+    @app.get("/calls")
+    async def calls():
+        """Number of completions served per model, and of calls answered 429."""
+        return dict(settings.calls, rate_limited=settings.rate_limited)
+
+    return app
+
+
+def start_in_thread(settings, host="127.0.0.1", port=8100):
+    """
+    Runs the mock server on a background thread until the process exits.
+
+    Returns:
+        str: The base URL to use as DEEPSEEK_API_BASE.
+    """
+    server = uvicorn.Server(uvicorn.Config(create_app(settings), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-deepseek", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"The mock DeepSeek server failed to start on {host}:{port}.")
+        time.sleep(0.05)
+    return f"http://{host}:{port}"
+
+
+def add_arguments(parser):
+    """Adds the mock server's options to an argument parser."""
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token of each response.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Streaming rate of generated text.")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Length of generated answers.")
+    parser.add_argument("--verdict", action="append", default=[], metavar="SCHEMA.FIELD=VALUE",
+                        help='Grader verdict: "yes", "no" or the probability of "yes", e.g. GradeAnswer.binary_score=0.7.')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="Calls served at once before answering 429, like a rate-limited account; 0 for no limit.")
+
+
+def settings_from_args(args):
+    return MockSettings(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        verdicts=parse_verdicts(args.verdict),
+        seed=args.seed,
+        max_concurrent=args.max_concurrent,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible stand-in for DeepSeek.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares vector and hybrid retrieval on a query log.
+
+Indexes one PDF, then runs every question of the log through the full graph once per
+retrieval mode and reports end-to-end latency and graph loops (extra generations plus
+query rewrites) per question. Requires DEEPSEEK_API_KEY; the index and its metadata live
+in a scratch directory, so the server's database is left alone.
+
+The query log holds one question per line, or JSON lines with a "question" field:
+
+    python benchmarks/retrieval_benchmark.py --pdf uploads/example.pdf --queries queries.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from langchain_deepseek import ChatDeepSeek
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from DocumentProcessingPipeline.document_processing_pipeline import DocumentProcessingPipeline
+from GraphWorkflow.graph_workflow import GraphWorkflow
+from utility import db_utility
+from utility.hybrid_retriever import RETRIEVAL_MODES
+
+
+def load_queries(path):
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return queries
+
+
+async def run_question(workflow, retriever, question):
+    start = time.perf_counter()
+    final = {}
+    async for event, data in workflow.stream_events(question, retriever):
+        if event == "final":
+            final = data
+    return {
+        "question": question,
+        "seconds": time.perf_counter() - start,
+        "loops": max(0, final.get("generations", 1) - 1) + final.get("rewrites", 0),
+        "reason": final.get("reason"),
+    }
+
+
+def summarize(mode, results):
+    seconds = sorted(result["seconds"] for result in results)
+    return {
+        "mode": mode,
+        "questions": len(results),
+        "latency_p50": statistics.median(seconds),
+        "latency_mean": statistics.mean(seconds),
+        "loops_mean": statistics.mean(result["loops"] for result in results),
+        "useful": sum(1 for result in results if result["reason"] == "useful"),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare vector and hybrid retrieval end to end on a query log.")
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--queries", required=True, help="Query log: one question per line, or JSON lines.")
+    parser.add_argument("--modes", nargs="+", default=list(RETRIEVAL_MODES), choices=RETRIEVAL_MODES)
+    parser.add_argument("--output", help="Write per-question results and summaries as JSON to this path.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    llm_chat = ChatDeepSeek(model="deepseek-chat", temperature=0, api_key=api_key, api_base="https://api.deepseek.com")
+    llm_resoner = ChatDeepSeek(model="deepseek-reasoner", temperature=0, api_key=api_key, api_base="https://api.deepseek.com")
+    embeddings = HuggingFaceEmbeddings(model_name="nomic-ai/modernbert-embed-base", cache_folder="./saved_model")
+    workflow = GraphWorkflow(llm_chat=llm_chat, llm_resoner=llm_resoner)
+    queries = load_queries(args.queries)
+
+    scratch = tempfile.mkdtemp(prefix="retrieval_benchmark_")
+    db_utility.DB_PATH = os.path.join(scratch, "pipelines.db")
+    db_utility.init_db()
+
+    summaries, results = [], {}
+    for mode in args.modes:
+        pipeline = DocumentProcessingPipeline(
+            pdf_path=args.pdf,
+            embedding_model=embeddings,
+            workflow=workflow,
+            vectorstore_base_path=scratch,
+            retrieval_mode=mode,
+        )
+        results[mode] = [await run_question(workflow, pipeline.retriever, question) for question in queries]
+        summaries.append(summarize(mode, results[mode]))
+
+    print(f"{'mode':<8} {'questions':>9} {'p50 s':>8} {'mean s':>8} {'loops/q':>8} {'useful':>7}")
+    for summary in summaries:
+        print(
+            f"{summary['mode']:<8} {summary['questions']:>9} {summary['latency_p50']:>8.2f} "
+            f"{summary['latency_mean']:>8.2f} {summary['loops_mean']:>8.2f} {summary['useful']:>7}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summaries": summaries, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Generates synthetic PDFs for benchmarks.
+
+Pages are filled with seeded, paragraph-shaped text plus a few identifiers (part numbers,
+clause ids) so both dense and keyword retrieval have something to find. The PDF is
+written directly, with no dependency beyond the standard library.
+
+    python benchmarks/synthetic_pdf.py --pages 50 --output synthetic_50.pdf
+"""
+import argparse
+import random
+
+WORDS = (
+    "revenue margin contract supplier delivery warranty clause schedule invoice payment quarter "
+    "report policy safety maintenance inspection component assembly tolerance customer service "
+    "liability renewal termination notice audit compliance forecast budget inventory shipment"
+).split()
+
+LINES_PER_PAGE = 46
+WORDS_PER_LINE = 12
+
+
+def page_lines(rng, page_number):
+    """Returns the text lines of one page."""
+    lines = [f"Section {page_number}. Part AB-{rng.randint(1000, 9999)} under clause {page_number}.{rng.randint(1, 9)}"]
+    while len(lines) < LINES_PER_PAGE:
+        words = [rng.choice(WORDS) for _ in range(WORDS_PER_LINE)]
+        words[0] = words[0].capitalize()
+        # End a sentence every few lines so sentence chunking has boundaries
+        lines.append(" ".join(words) + ("." if rng.random() < 0.4 else ""))
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_synthetic_pdf(path, pages, seed=0):
+    """
+    Writes a text PDF with `pages` pages.
+
+    Args:
+        path (str): Where to write the PDF.
+        pages (int): Number of pages.
+        seed (int): Seed of the generated text; the same seed gives the same file.
+
+    Returns:
+        str: `path`.
+    """
+    rng = random.Random(seed)
+    # Objects: 1 catalog, 2 page tree, 3 font, then one page and one content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(pages):
+        text = " ".join(f"({_escape(line)}) '" for line in page_lines(rng, i + 1))
+        stream = f"BT /F1 10 Tf 50 760 Td 15 TL {text} ET".encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic text PDF.")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    write_synthetic_pdf(args.output, args.pages, args.seed)
+
+
+if __name__ == "__main__":
+    main()
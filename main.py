@@ -1,20 +1,113 @@
-from fastapi import FastAPI, UploadFile, File, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from typing import List, Optional
+import atexit
+import json
+import logging
 import os
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_deepseek import ChatDeepSeek
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from DocumentProcessingPipeline.document_processing_pipeline import DocumentProcessingPipeline
-from utility.db_utility import init_db, get_pipeline_metadata, store_pipeline_metadata
+# Models, LangChain/LangGraph and Chroma are imported by the warm-up thread (see load_models)
+# and inside the handlers that need them, so uvicorn accepts connections right away
+from utility.admission import AdmissionController, admitted_model_class
+from utility.answer_cache import SemanticAnswerCache
+from utility.chains import warm_chains
+from utility.context_packing import ContextPacker
+from utility.db_utility import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_READY,
+    init_db,
+    flush_asks,
+    get_chunking,
+    get_index_stats,
+    get_indexed_file_hash,
+    get_ingestion_job,
+    get_pipeline_metadata,
+    get_retrieval_mode,
+    get_upload_hash,
+    list_frequent_pipelines,
+    list_pipelines,
+    record_ask,
+    start_ask_flusher,
+    store_pipeline_metadata,
+)
+from utility.ingestion import IngestionQueue
+from utility.pipeline_cache import PipelineCache
+from utility.reranker import RERANK, Reranker
+from utility.singleflight import SingleFlight
+from utility.telemetry import Telemetry
+from utility.uploads import (
+    FileLocks, InvalidUpload, UploadLimitMiddleware, UploadTooLarge, receive_upload, safe_filename,
+)
+from utility.warmup import Warmup
 
 load_dotenv()
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")  # DEBUG prints the workflow's stage lines
+TRACE_LOG = os.getenv("TRACE_LOG", "false").lower() in ("1", "true", "yes")  # one JSON line per /ask
+logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
+if TRACE_LOG:
+    logging.getLogger("rag.trace").setLevel(logging.INFO)
+
 # Create FastAPI app
 app = FastAPI()
 
+UPLOAD_FOLDER = "./uploads"
+VECTORSTORE_BASE_PATH = "./vectorstores"  # Base folder for all vectorstore data
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+INDEX_MODE = os.getenv("INDEX_MODE", "per_document")  # or "shared": one collection filtered by pdf_name
+SHARED_VECTORSTORE_PATH = os.path.join(VECTORSTORE_BASE_PATH, "_shared")
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")  # e.g. benchmarks/mock_deepseek.py
+PIPELINE_CACHE_MAX_ENTRIES = int(os.getenv("PIPELINE_CACHE_MAX_ENTRIES", "32"))
+PIPELINE_CACHE_MAX_MEMORY_MB = int(os.getenv("PIPELINE_CACHE_MAX_MEMORY_MB", "2048"))
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "1"))
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "character")  # or "token" / "sentence" / "layout"
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "0")) or None  # None uses the strategy's default
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP")) if os.getenv("CHUNK_OVERLAP") else None
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embeddings_cache.db")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))  # 0 disables the cache
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+GRADING_MODE = os.getenv("GRADING_MODE", "per_document")  # or "single_call"
+GRADING_CONCURRENCY = int(os.getenv("GRADING_CONCURRENCY", "4"))
+GENERATION_GRADING_MODE = os.getenv("GENERATION_GRADING_MODE", "sequential")  # or "parallel" / "combined"
+MAX_GENERATIONS = int(os.getenv("MAX_GENERATIONS", "3"))
+MAX_REWRITES = int(os.getenv("MAX_REWRITES", "2"))
+ASK_DEADLINE_SECONDS = float(os.getenv("ASK_DEADLINE_SECONDS", "120"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")  # or "hybrid"; default for uploads that don't choose
+RELEVANCE_MODE = os.getenv("RELEVANCE_MODE", "llm")  # or "rerank" for the local cross-encoder
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "4"))
+RERANK_THRESHOLD = float(os.getenv("RERANK_THRESHOLD", "0.1"))
+CONTEXT_BUDGET_REASONER_TOKENS = int(os.getenv("CONTEXT_BUDGET_REASONER_TOKENS", "4000"))  # 0 for no limit
+CONTEXT_BUDGET_CHAT_TOKENS = int(os.getenv("CONTEXT_BUDGET_CHAT_TOKENS", "4000"))
+CONTEXT_DEDUP_SIMILARITY = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", "0.9"))
+LLM_CONCURRENCY_CHAT = int(os.getenv("LLM_CONCURRENCY_CHAT", "16"))  # concurrent deepseek-chat calls
+LLM_CONCURRENCY_REASONER = int(os.getenv("LLM_CONCURRENCY_REASONER", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))  # waiting calls per model before /ask answers 503
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+COALESCE_QUESTIONS = os.getenv("COALESCE_QUESTIONS", "true").lower() in ("1", "true", "yes")
+PREOPEN_PIPELINES = int(os.getenv("PREOPEN_PIPELINES", "8"))  # most-asked documents opened at startup
+ASK_COUNT_FLUSH_SECONDS = float(os.getenv("ASK_COUNT_FLUSH_SECONDS", "30"))  # how often question counts are written
+
+# Cap upload bodies as they arrive, before the multipart form is parsed; the slack covers the form fields
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=MAX_UPLOAD_BYTES + 64 * 1024,
+    error=f"PDFs are limited to {MAX_UPLOAD_MB} MB.",
+)
+
 # Add CORS middleware to your FastAPI app
 app.add_middleware(
     CORSMiddleware,
@@ -23,70 +116,510 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
 )
-
-UPLOAD_FOLDER = "./uploads"
-VECTORSTORE_BASE_PATH = "./vectorstores"  # Base folder for all vectorstore data
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(VECTORSTORE_BASE_PATH, exist_ok=True)  # Ensure the vectorstore directory exists
 
-# Pre-initialize components (embeddings, vectorstore, retriever)
-embeddings = HuggingFaceEmbeddings(model_name="nomic-ai/modernbert-embed-base", cache_folder="./saved_model")
-llm_chat = ChatDeepSeek(model="deepseek-chat", temperature=0, api_key=DEEPSEEK_API_KEY, api_base='https://api.deepseek.com')
-llm_resoner = ChatDeepSeek(model="deepseek-reasoner", temperature=0, api_key=DEEPSEEK_API_KEY, api_base='https://api.deepseek.com')
+# Heavy components, built on the warm-up thread by load_models; /readyz reports when they are
+embeddings = None
+llm_chat = None
+llm_resoner = None
+reranker = None
+graph_workflow = None
+answer_cache = None
+
+def load_models():
+    """Imports and builds the embedding model, DeepSeek clients, reranker and compiled workflow."""
+    global embeddings, llm_chat, llm_resoner, reranker, graph_workflow, answer_cache
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_deepseek import ChatDeepSeek
+    from GraphWorkflow.graph_workflow import GraphWorkflow
+    from utility.embedding_engine import CachedEmbeddings
+
+    embeddings = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name="nomic-ai/modernbert-embed-base", cache_folder="./saved_model"),
+        cache_path=EMBEDDING_CACHE_PATH,
+        batch_size=EMBEDDING_BATCH_SIZE,
+    )
+    # stream_usage reports token counts for streamed calls too. Async calls go through the
+    # admission gates, and every call (sync ones too) has its rate limits retried by the
+    # admitted model, so the client's own retries are off
+    ChatModel = admitted_model_class(ChatDeepSeek)
+    llm_chat = ChatModel(model="deepseek-chat", temperature=0, api_key=DEEPSEEK_API_KEY, api_base=DEEPSEEK_API_BASE,
+                         stream_usage=True, max_retries=0, admission=admission)
+    llm_resoner = ChatModel(model="deepseek-reasoner", temperature=0, api_key=DEEPSEEK_API_KEY, api_base=DEEPSEEK_API_BASE,
+                            stream_usage=True, max_retries=0, admission=admission)
+
+    # The cross-encoder is loaded once and shared, like the embedding model
+    if RELEVANCE_MODE == RERANK:
+        import torch
+        from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+        # Raw logits; the reranker applies the sigmoid itself, so RERANK_THRESHOLD is a probability
+        reranker = Reranker(
+            HuggingFaceCrossEncoder(
+                model_name=RERANK_MODEL,
+                model_kwargs={"cache_folder": "./saved_model", "activation_fn": torch.nn.Identity()},
+            ),
+            threshold=RERANK_THRESHOLD,
+            top_n=RERANK_TOP_N,
+        )
+
+    # Prompts, structured-output bindings and chains are built once per model, not per call
+    warm_chains(llm_chat, llm_resoner)
+
+    # The LangGraph workflow is compiled once and shared by every document
+    graph_workflow = GraphWorkflow(
+        llm_chat=llm_chat,
+        llm_resoner=llm_resoner,
+        grading_mode=GRADING_MODE,
+        grading_concurrency=GRADING_CONCURRENCY,
+        max_generations=MAX_GENERATIONS,
+        max_rewrites=MAX_REWRITES,
+        deadline_seconds=ASK_DEADLINE_SECONDS,
+        generation_grading_mode=GENERATION_GRADING_MODE,
+        reranker=reranker,
+        # Retrieved chunks are deduplicated and packed by relevance into each model's budget
+        context_packer=ContextPacker(
+            budgets={"deepseek-reasoner": CONTEXT_BUDGET_REASONER_TOKENS, "deepseek-chat": CONTEXT_BUDGET_CHAT_TOKENS},
+            similarity_threshold=CONTEXT_DEDUP_SIMILARITY,
+        ),
+    )
+
+    # Final answers reused for repeated and paraphrased questions about the same document version
+    if ANSWER_CACHE_MAX_ENTRIES > 0:
+        answer_cache = SemanticAnswerCache(
+            embedding_model=embeddings,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        )
+
+def warm_models():
+    """Runs a dummy batch through the embedding model (and cross-encoder) so the first request isn't slow."""
+    texts = ["Warm-up passage for the embedding model."] * EMBEDDING_BATCH_SIZE
+    # Straight to the model, so the dummy vectors stay out of the embedding cache
+    embeddings.embeddings.embed_documents(texts)
+    embeddings.embeddings.embed_query("Warm-up question?")
+    if reranker is not None:
+        reranker.cross_encoder.score([("Warm-up question?", text) for text in texts[:4]])
+
+# Per-request traces folded into the /metrics counters
+telemetry = Telemetry(json_log=TRACE_LOG)
+
+# Concurrency limits and wait queues of the DeepSeek models; generation is admitted before grading
+admission = AdmissionController(
+    limits={"deepseek-chat": LLM_CONCURRENCY_CHAT, "deepseek-reasoner": LLM_CONCURRENCY_REASONER},
+    max_queue=LLM_MAX_QUEUE,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=LLM_BACKOFF_MAX_SECONDS,
+)
+telemetry.register(*admission.metrics())
+
+# Identical questions asked at the same time share one graph run
+single_flight = SingleFlight() if COALESCE_QUESTIONS else None
+
+# Opened pipelines (vectorstore, retriever) reused across requests
+pipeline_cache = PipelineCache(
+    max_entries=PIPELINE_CACHE_MAX_ENTRIES,
+    max_memory_bytes=PIPELINE_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+    sizeof=lambda pipeline: pipeline.estimated_memory_bytes(),
+)
+
+# Serializes the final rename and registration of concurrent uploads of the same file
+upload_locks = FileLocks()
 
 # Pydantic model
 class AskQuestionRequest(BaseModel):
     question: str = Field(..., description="Question about the PDF.")
-    pdf_name: str = Field(..., description="Name of the uploaded PDF.")
+    pdf_name: Optional[str] = Field(None, description="Name of the uploaded PDF.")
+    pdf_names: Optional[List[str]] = Field(None, description="Names of uploaded PDFs to search together (shared index mode).")
+    all_documents: bool = Field(False, description="Search every uploaded PDF (shared index mode).")
+    max_generations: Optional[int] = Field(None, ge=1, le=10, description="Cap on answer generations for this question.")
+    max_rewrites: Optional[int] = Field(None, ge=0, le=10, description="Cap on query rewrites for this question.")
+    deadline_seconds: Optional[float] = Field(None, gt=0, le=600, description="Wall-clock budget for this question.")
 
 # Initialize the DB
 init_db()
 
-@app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
+# Question counts are kept in memory and written in batches, so /ask does not write to SQLite
+start_ask_flusher(ASK_COUNT_FLUSH_SECONDS)
+atexit.register(flush_asks)
+
+def chunker_for(pdf_name):
+    """Returns the chunker chosen for a PDF at upload, or the server default."""
+    from utility.chunking import Chunker
+
+    chunking = get_chunking(pdf_name)
+    return Chunker.from_config(json.loads(chunking)) if chunking else Chunker(CHUNKING_STRATEGY, CHUNK_SIZE, CHUNK_OVERLAP)
+
+def index_pdf(pdf_name, set_status):
+    """Builds the vectorstore of an uploaded PDF; runs on an ingestion worker thread."""
+    from DocumentProcessingPipeline.document_processing_pipeline import DocumentProcessingPipeline
+
+    metadata = get_pipeline_metadata(pdf_name)
+    if not metadata:
+        raise ValueError(f"No pipeline found for {pdf_name}.")
+
+    pdf_path, vectorstore_path = metadata
+    pipeline = DocumentProcessingPipeline(
+        pdf_path=pdf_path,
+        embedding_model=embeddings,
+        vectorstore_base_path=vectorstore_path,
+        load_vectorstore=False,
+        chunker=chunker_for(pdf_name),
+        parse_workers=PDF_PARSE_WORKERS,
+        index_mode=INDEX_MODE,
+        shared_vectorstore_path=SHARED_VECTORSTORE_PATH
+    )
+    # The checksum taken while the upload streamed to disk saves re-reading the file
+    pipeline.index_documents(on_status=set_status, file_hash=get_upload_hash(pdf_name))
+
+# Index uploads in the background; a finished job drops any stale cached pipeline
+ingestion_queue = IngestionQueue(index_fn=index_pdf, num_workers=INGESTION_WORKERS, on_ready=pipeline_cache.invalidate)
+
+def open_pipeline(pdf_name, pdf_path, vectorstore_path):
+    """Opens the pipeline of an indexed PDF for answering questions; raises IndexMissing if it has no index."""
+    from DocumentProcessingPipeline.document_processing_pipeline import DocumentProcessingPipeline
+
+    pipeline = DocumentProcessingPipeline(
+        pdf_path=pdf_path,
+        embedding_model=embeddings,
+        workflow=graph_workflow,
+        vectorstore_base_path=vectorstore_path,
+        load_vectorstore=False,
+        # The index is only current if it was built with the PDF's chunking settings
+        chunker=chunker_for(pdf_name),
+        answer_cache=answer_cache,
+        document_version=get_indexed_file_hash(pdf_name),
+        single_flight=single_flight,
+        retrieval_mode=get_retrieval_mode(pdf_name) or RETRIEVAL_MODE,
+        # The reranker cuts an over-fetched candidate set down to its top chunks
+        retrieval_k=RERANK_FETCH_K if reranker is not None else 4,
+        index_mode=INDEX_MODE,
+        shared_vectorstore_path=SHARED_VECTORSTORE_PATH
+    )
+    pipeline.load_index()
+    return pipeline
+
+def get_pipeline(pdf_name, pdf_path, vectorstore_path):
+    """Returns the cached pipeline of a PDF, opening it on a miss, and counts the question."""
+    record_ask(pdf_name)
+    return pipeline_cache.get_or_create(pdf_name, lambda: open_pipeline(pdf_name, pdf_path, vectorstore_path))
+
+def preopen_pipelines():
+    """Opens the pipelines of the most-asked documents, so their first questions hit the cache."""
+    from DocumentProcessingPipeline.document_processing_pipeline import INDEX_SHARED, IndexMissing, get_shared_vectorstore
+
+    if INDEX_MODE == INDEX_SHARED:
+        get_shared_vectorstore(SHARED_VECTORSTORE_PATH, embeddings)
+    for pdf_name, pdf_path, vectorstore_path in list_frequent_pipelines(min(PREOPEN_PIPELINES, PIPELINE_CACHE_MAX_ENTRIES)):
+        try:
+            pipeline_cache.get_or_create(pdf_name, lambda: open_pipeline(pdf_name, pdf_path, vectorstore_path))
+        except IndexMissing:
+            ingestion_queue.submit(pdf_name)
+
+# Load and warm the models, start indexing and pre-open pipelines without holding up the server
+warmup = Warmup()
+warmup.add_step("load_models", load_models)
+warmup.add_step("warm_models", warm_models)
+warmup.add_step("ingestion_workers", ingestion_queue.start)
+warmup.add_step("preopen_pipelines", preopen_pipelines, required=False)
+warmup.start()
+
+def warming_up():
+    """The 503 returned by endpoints that need the models while the process is not ready."""
+    if warmup.failed:
+        error = "The server failed to start; see the warmup steps."
+    else:
+        error = "The server is still warming up. Try again shortly."
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "5"},
+        content={"error": error, "warmup": warmup.status()},
+    )
+
+def overloaded(retry_after):
+    """The 503 returned by /ask while a model's wait queue is full."""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+        content={"error": "The models are at capacity. Try again shortly.", "retry_after": retry_after},
+    )
+
+# The form is parsed by hand from the request stream, so it is described to OpenAPI here
+UPLOAD_FORM_SCHEMA = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object",
+    "required": ["file"],
+    "properties": {
+        "file": {"type": "string", "format": "binary"},
+        "retrieval_mode": {"type": "string"},
+        "chunking_strategy": {"type": "string"},
+        "chunk_size": {"type": "integer"},
+        "chunk_overlap": {"type": "integer"},
+    },
+}}}}}
+
+@app.post("/upload", openapi_extra=UPLOAD_FORM_SCHEMA)
+async def upload_pdf(request: Request):
+    from utility.chunking import Chunker
+    from utility.hybrid_retriever import RETRIEVAL_MODES
+
+    # Stream the body straight into a temporary file in the uploads folder; it replaces any
+    # previous version atomically once the form has been checked
     try:
-        if not file.filename.endswith(".pdf"):
-            return {"error": "Only PDF files are supported."}
+        upload = await receive_upload(
+            request.stream(), request.headers.get("content-type", ""), UPLOAD_FOLDER, max_bytes=MAX_UPLOAD_BYTES,
+        )
+    except UploadTooLarge:
+        return JSONResponse(status_code=413, content={"error": f"PDFs are limited to {MAX_UPLOAD_MB} MB."})
+    except InvalidUpload as e:
+        return {"error": str(e)}
 
-        # Save the file in the uploads folder
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        with open(file_path, "wb") as buffer:
-            buffer.write(file.file.read())
+    try:
+        filename = safe_filename(upload.filename)
+        if not filename.endswith(".pdf"):
+            upload.discard()
+            return {"error": "Only PDF files are supported."}
+        retrieval_mode = upload.fields.get("retrieval_mode")
+        chunking_strategy = upload.fields.get("chunking_strategy")
+        if retrieval_mode is not None and retrieval_mode not in RETRIEVAL_MODES:
+            upload.discard()
+            return {"error": f"retrieval_mode must be one of {', '.join(RETRIEVAL_MODES)}."}
+        sizes = {}
+        for name in ("chunk_size", "chunk_overlap"):
+            value = upload.fields.get(name)
+            if value is not None and not value.strip().isdigit():
+                upload.discard()
+                return {"error": f"{name} must be a whole number."}
+            sizes[name] = int(value) if value is not None else None
+        chunking = None
+        if chunking_strategy is not None or any(value is not None for value in sizes.values()):
+            try:
+                chunker = Chunker(
+                    chunking_strategy or CHUNKING_STRATEGY,
+                    sizes["chunk_size"],
+                    sizes["chunk_overlap"],
+                )
+            except ValueError as e:
+                upload.discard()
+                return {"error": str(e)}
+            chunking = chunker.config_json()
 
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
         # Generate a unique vectorstore path outside the uploads folder, in the vectorstore base path
-        vectorstore_path = os.path.join(VECTORSTORE_BASE_PATH, file.filename.replace(".pdf", ""))
+        vectorstore_path = os.path.join(VECTORSTORE_BASE_PATH, filename.replace(".pdf", ""))
 
-        # Store metadata in SQLite
-        store_pipeline_metadata(file.filename, file_path, vectorstore_path)
+        def register(size, upload_hash):
+            # Store metadata in SQLite
+            store_pipeline_metadata(filename, file_path, vectorstore_path, retrieval_mode, chunking, upload_hash)
+            # Drop any pipeline opened on a previous version of this PDF and index the new one
+            pipeline_cache.invalidate(filename)
+            if answer_cache is not None:
+                answer_cache.invalidate(filename)
+            ingestion_queue.submit(filename)
 
-        return {"message": "File uploaded successfully.", "pdf_path": file_path, "vectorstore_path": vectorstore_path}
+        # Registered under the same per-file lock as the rename, so the stored checksum matches the file;
+        # `register` writes to SQLite, so it runs off the event loop
+        size, upload_hash = await upload.save(file_path, lock=upload_locks.hold(filename), on_saved=register)
+
+        return {"message": "File uploaded successfully.", "pdf_path": file_path, "vectorstore_path": vectorstore_path,
+                "retrieval_mode": retrieval_mode or RETRIEVAL_MODE, "size": size, "sha256": upload_hash,
+                "status": "queued"}
     except Exception as e:
+        upload.discard()
         return {"error": f"Error uploading file: {str(e)}"}
 
 
 @app.post("/ask")
 async def ask_question(request: Request, params: AskQuestionRequest):
+    if not warmup.ready:
+        return warming_up()
+    retry_after = admission.saturated()
+    if retry_after is not None:
+        return overloaded(retry_after)
     try:
-        # Read and print the raw body as a string
-        body = await request.body()  # This reads the request body
-        print(body.decode('utf-8'))  # Decode bytes to string
-        
-        # Rest of the logic
-        metadata = get_pipeline_metadata(params.pdf_name)
+        if params.pdf_names or params.all_documents:
+            return await ask_across_documents(params)
+        if not params.pdf_name:
+            return {"error": "Provide pdf_name, pdf_names or all_documents."}
+
+        # SQLite lookups are blocking, so they run off the event loop too
+        metadata = await run_in_threadpool(get_pipeline_metadata, params.pdf_name)
         if not metadata:
             return {"error": "No pipeline found for the provided PDF name."}
 
+        # Indexing happens in the background; answer right away if it hasn't finished
+        job = await run_in_threadpool(get_ingestion_job, params.pdf_name)
+        if job is None:
+            # Uploaded before background indexing existed
+            await run_in_threadpool(ingestion_queue.submit, params.pdf_name)
+            job = await run_in_threadpool(get_ingestion_job, params.pdf_name)
+        if job["status"] != JOB_READY:
+            if job["status"] == JOB_FAILED:
+                error = f"Indexing {params.pdf_name} failed: {job['error']}"
+            else:
+                error = f"{params.pdf_name} is still being indexed ({job['status']}). Try again shortly."
+            return JSONResponse(status_code=409, content={"error": error, "status": job["status"]})
+
         pdf_path, vectorstore_path = metadata
 
-        doc_rag = DocumentProcessingPipeline(
-            pdf_path=pdf_path,
-            embedding_model=embeddings,
-            chat_model=llm_chat,
-            reasoner_model=llm_resoner,
-            vectorstore_base_path=vectorstore_path
-        )
+        # Opening the vectorstore is blocking, so do it off the event loop
+        from DocumentProcessingPipeline.document_processing_pipeline import IndexMissing
+        try:
+            doc_rag = await run_in_threadpool(get_pipeline, params.pdf_name, pdf_path, vectorstore_path)
+        except IndexMissing:
+            # E.g. INDEX_MODE changed without /migrate; index it in the background like an upload
+            await run_in_threadpool(ingestion_queue.submit, params.pdf_name)
+            error = f"{params.pdf_name} is not in the current index yet and has been queued for indexing. Try again shortly."
+            return JSONResponse(status_code=409, content={"error": error, "status": JOB_QUEUED})
 
-        return StreamingResponse(doc_rag.run_workflow(params.question), media_type="text/event-stream")
+        trace = telemetry.start_trace(pdf_name=params.pdf_name)
+        return StreamingResponse(
+            doc_rag.run_workflow(
+                params.question,
+                max_generations=params.max_generations,
+                max_rewrites=params.max_rewrites,
+                deadline_seconds=params.deadline_seconds,
+                trace=trace,
+            ),
+            media_type="text/event-stream",
+            headers={"X-Request-ID": trace.request_id},
+        )
     except Exception as e:
         raise e
+
+
+async def ask_across_documents(params: AskQuestionRequest):
+    """Answers a question from several PDFs (or all of them) with one filtered search of the shared collection."""
+    from DocumentProcessingPipeline.document_processing_pipeline import (
+        INDEX_SHARED,
+        coalesced_answer,
+        get_shared_vectorstore,
+        shared_retriever,
+        stream_answer,
+    )
+
+    if INDEX_MODE != INDEX_SHARED:
+        return {"error": "Questions across several PDFs need INDEX_MODE=shared."}
+
+    pdf_names = None
+    if not params.all_documents:
+        pdf_names = list(dict.fromkeys(params.pdf_names))
+
+        def check_documents():
+            unknown = [pdf_name for pdf_name in pdf_names if not get_pipeline_metadata(pdf_name)]
+            not_ready = {}
+            for pdf_name in pdf_names:
+                job = get_ingestion_job(pdf_name)
+                if job is None or job["status"] != JOB_READY:
+                    not_ready[pdf_name] = job["status"] if job else None
+            return unknown, not_ready
+
+        # The SQLite lookups are blocking, so they run off the event loop
+        unknown, not_ready = await run_in_threadpool(check_documents)
+        if unknown:
+            return {"error": f"No pipeline found for: {', '.join(unknown)}."}
+        if not_ready:
+            error = f"Not every PDF is indexed yet: {', '.join(not_ready)}. Try again shortly."
+            return JSONResponse(status_code=409, content={"error": error, "status": not_ready})
+
+    # Opening the shared collection is blocking; it only happens once per process
+    vectorstore = await run_in_threadpool(get_shared_vectorstore, SHARED_VECTORSTORE_PATH, embeddings)
+    retriever = shared_retriever(vectorstore, pdf_names, k=RERANK_FETCH_K if reranker is not None else 4)
+    trace = telemetry.start_trace(pdf_names=pdf_names or "all")
+    budgets = {
+        "max_generations": params.max_generations,
+        "max_rewrites": params.max_rewrites,
+        "deadline_seconds": params.deadline_seconds,
+    }
+
+    def produce():
+        return stream_answer(graph_workflow, params.question, retriever, trace=trace, **budgets)
+
+    if single_flight is None:
+        stream = produce()
+    else:
+        scope = tuple(sorted(pdf_names)) if pdf_names else "all"
+        stream = coalesced_answer(single_flight, scope, params.question, produce, trace=trace, **budgets)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"X-Request-ID": trace.request_id},
+    )
+
+
+@app.post("/migrate")
+async def migrate_to_shared_collection():
+    """Copies every per-document vectorstore into the shared collection without re-embedding."""
+    if not warmup.ready:
+        return warming_up()
+    from DocumentProcessingPipeline.document_processing_pipeline import DocumentProcessingPipeline
+
+    def migrate():
+        migrated, errors = {}, {}
+        for pdf_name, pdf_path, vectorstore_path in list_pipelines():
+            try:
+                pipeline = DocumentProcessingPipeline(
+                    pdf_path=pdf_path,
+                    embedding_model=embeddings,
+                    vectorstore_base_path=vectorstore_path,
+                    load_vectorstore=False
+                )
+                migrated[pdf_name] = pipeline.migrate_to_shared_collection(SHARED_VECTORSTORE_PATH)
+            except Exception as e:
+                errors[pdf_name] = str(e)
+        return migrated, errors
+
+    migrated, errors = await run_in_threadpool(migrate)
+    # Pipelines opened before the migration still point at the per-document stores
+    pipeline_cache.clear()
+    return {"migrated": migrated, "chunks": sum(migrated.values()), "errors": errors, "index_mode": INDEX_MODE}
+
+
+@app.get("/status/{pdf_name}")
+async def get_status(pdf_name: str):
+    def status():
+        job = get_ingestion_job(pdf_name)
+        return None if job is None else dict(job, index=get_index_stats(pdf_name))
+
+    # The SQLite lookups are blocking, so they run off the event loop
+    job = await run_in_threadpool(status)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "No pipeline found for the provided PDF name."})
+    return job
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Per-request latency, loop and token metrics in the Prometheus text format."""
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "pipeline_cache": pipeline_cache.stats(),
+        "ingestion_queue": {"queued": ingestion_queue.qsize()},
+        "embeddings": embeddings.stats() if embeddings is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "generation_grading": graph_workflow.stats() if graph_workflow is not None else None,
+        "coalescing": single_flight.stats() if single_flight is not None else None,
+        "admission": admission.stats(),
+        "warmup": warmup.status(),
+    }
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process serves requests; fails only if warm-up failed and it never will be ready."""
+    if warmup.failed:
+        return JSONResponse(status_code=503, content={"status": "failed", "warmup": warmup.status()})
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: models are loaded and warm, so questions can be routed here."""
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": warmup.status()})
+    return {"status": "ready", "warmup": warmup.status()}
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utility.admission import (
+    GENERATE, GRADE, AdmissionController, AdmissionRejected, ModelGate, admitted_model_class, llm_priority,
+)
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def main():
+        gate = ModelGate("model", max_concurrent=1, max_queue=10)
+        admitted = []
+
+        async def call(name, priority):
+            await gate.acquire(priority)
+            admitted.append(name)
+
+        await gate.acquire()
+        waiters = [asyncio.ensure_future(call(name, priority)) for name, priority in
+                   [("grade-1", GRADE), ("grade-2", GRADE), ("generate", GENERATE)]]
+        await asyncio.sleep(0)
+        assert gate.queue_depth == 3
+        for _ in range(3):
+            gate.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        return admitted, gate.active
+
+    admitted, active = run(main())
+    assert admitted == ["generate", "grade-1", "grade-2"]
+    # The last admitted call still holds its slot
+    assert active == 1
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def main():
+        gate = ModelGate("model", max_concurrent=1, max_queue=1)
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.full
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        waiter.cancel()
+        return rejected.value
+
+    rejection = run(main())
+    assert rejection.model == "model"
+    assert rejection.retry_after >= 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        gate = ModelGate("model", max_concurrent=1, max_queue=10)
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert gate.queue_depth == 0
+        gate.release()
+        return gate.active
+
+    assert run(main()) == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def main():
+        gate = ModelGate("model", max_concurrent=1, max_queue=10)
+        await gate.acquire()
+        first = asyncio.ensure_future(gate.acquire())
+        second = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        # The slot goes to `first` just as it gives up
+        gate.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await second
+        return gate.active, gate.queue_depth
+
+    assert run(main()) == (1, 0)
+
+
+def test_controller_slot_uses_the_context_priority_and_counts_rejections():
+    async def main():
+        controller = AdmissionController(limits={"model": 1}, max_queue=0)
+        async with controller.slot("model"):
+            assert controller.stats() == {"model": {"limit": 1, "in_flight": 1, "queued": 0}}
+            assert controller.saturated() is not None
+            with llm_priority(GENERATE), pytest.raises(AdmissionRejected):
+                async with controller.slot("model"):
+                    pass
+        return controller.stats(), controller.saturated()
+
+    stats, saturated = run(main())
+    assert stats == {"model": {"limit": 1, "in_flight": 0, "queued": 0}}
+    assert saturated is None
+
+
+class RateLimited(Exception):
+    status_code = 429
+    response = None
+
+
+def test_only_rate_limits_are_retried_within_budget():
+    controller = AdmissionController(max_retries=2, backoff_base=0.1, backoff_max=1.0)
+    assert controller.retry_delay("model", ValueError("bad request"), 0) is None
+    assert 0 <= controller.retry_delay("model", RateLimited(), 0) <= 0.1
+    assert controller.retry_delay("model", RateLimited(), 2) is None
+    assert controller.backoff(0, retry_after="0.5") >= 0.5
+
+
+class FlakyChatModel(BaseChatModel):
+    """Chat model whose first call is rate limited."""
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "flaky"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RateLimited()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RateLimited()
+        yield ChatGenerationChunk(message=AIMessageChunk(content="o"))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="k"))
+
+
+def admitted_flaky_model():
+    controller = AdmissionController(max_retries=2, backoff_base=0.01, backoff_max=0.01)
+    return admitted_model_class(FlakyChatModel)(admission=controller), controller
+
+
+def test_sync_call_is_retried_after_a_rate_limit():
+    model, controller = admitted_flaky_model()
+    assert model.invoke("hello").content == "ok"
+    assert model.calls == 2
+    assert controller.stats() == {}  # sync calls are not gated
+
+
+def test_sync_stream_is_retried_after_a_rate_limit():
+    model, _ = admitted_flaky_model()
+    assert "".join(chunk.content for chunk in model.stream("hello")) == "ok"
+    assert model.calls == 2
+
+
+def test_async_call_is_gated_and_retried_after_a_rate_limit():
+    model, controller = admitted_flaky_model()
+    assert run(model.ainvoke("hello")).content == "ok"
+    assert model.calls == 2
+    assert controller.stats() == {"flaky": {"limit": 8, "in_flight": 0, "queued": 0}}
@@ -0,0 +1,83 @@
+from langchain_core.embeddings import Embeddings
+
+from utility import answer_cache
+from utility.answer_cache import SemanticAnswerCache
+
+A = ("a.pdf", "v1")
+B = ("b.pdf", "v1")
+
+
+class TableEmbeddings(Embeddings):
+    """Embeds questions with a fixed table of vectors."""
+    vectors = {
+        "what is the price": [1.0, 0.0],
+        "how much does it cost": [0.96, 0.28],  # cosine 0.96 with "what is the price"
+        "who signed it": [0.0, 1.0],
+    }
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def cached(cache, scope, question, answer):
+    cache.put(scope, question, answer, cache.embed(question))
+
+
+def test_near_duplicate_hits_only_above_the_threshold():
+    strict = SemanticAnswerCache(TableEmbeddings(), similarity_threshold=0.99)
+    loose = SemanticAnswerCache(TableEmbeddings(), similarity_threshold=0.95)
+    for cache in (strict, loose):
+        cached(cache, A, "what is the price", "Ten euros.")
+
+    question = strict.embed("how much does it cost")
+    assert strict.get_similar(A, question) is None
+    assert loose.get_similar(A, question) == "Ten euros."
+    assert loose.get_similar(A, loose.embed("who signed it")) is None
+    # Other documents' answers are never served
+    assert loose.get_similar(B, question) is None
+    assert loose.get_exact(A, "  What is the PRICE? ") == "Ten euros."
+
+
+def test_answers_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(TableEmbeddings(), ttl_seconds=60)
+    cached(cache, A, "what is the price", "Ten euros.")
+
+    now[0] += 59
+    assert cache.get_exact(A, "what is the price") == "Ten euros."
+    now[0] += 2
+    assert cache.get_exact(A, "what is the price") is None
+    assert cache.get_similar(A, cache.embed("what is the price")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_answer_is_evicted_at_capacity():
+    cache = SemanticAnswerCache(TableEmbeddings(), max_entries=2)
+    cached(cache, A, "what is the price", "Ten euros.")
+    cached(cache, A, "who signed it", "Alice.")
+    # Reading the first answer makes the second the least recently used
+    assert cache.get_exact(A, "what is the price") == "Ten euros."
+    cached(cache, B, "who signed it", "Bob.")
+
+    assert cache.get_exact(A, "who signed it") is None
+    assert cache.get_exact(A, "what is the price") == "Ten euros."
+    assert cache.get_exact(B, "who signed it") == "Bob."
+    assert cache.stats()["evictions"] == 1
+
+
+def test_reindexed_document_loses_its_answers():
+    cache = SemanticAnswerCache(TableEmbeddings())
+    cached(cache, A, "what is the price", "Ten euros.")
+    cached(cache, ("a.pdf", "v0"), "who signed it", "Alice.")
+    cached(cache, B, "what is the price", "Five euros.")
+
+    cache.invalidate("a.pdf")
+
+    assert cache.get_exact(A, "what is the price") is None
+    assert cache.get_similar(("a.pdf", "v0"), cache.embed("who signed it")) is None
+    assert cache.get_exact(B, "what is the price") == "Five euros."
+    assert cache.stats()["entries"] == 1
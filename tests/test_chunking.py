@@ -0,0 +1,50 @@
+from utility.chunking import LAYOUT, Chunker, pack_sentences, split_sentences
+
+
+def test_pack_sentences_repeats_trailing_sentences_within_overlap():
+    sentences = ["Alpha one.", "Bravo two.", "Charlie three.", "Delta four."]
+    chunks = pack_sentences(sentences, chunk_size=30, chunk_overlap=15)
+    assert chunks == [
+        "Alpha one. Bravo two.",
+        "Bravo two. Charlie three.",
+        "Charlie three. Delta four.",
+    ]
+    assert all(len(chunk) <= 30 for chunk in chunks)
+
+
+def test_pack_sentences_without_overlap_and_with_oversized_sentence():
+    long_sentence = "X" * 50 + "."
+    chunks = pack_sentences(["Short one.", long_sentence, "Short two."], chunk_size=30, chunk_overlap=0)
+    assert chunks == ["Short one.", long_sentence, "Short two."]
+
+
+def test_split_sentences_keeps_abbreviated_numbers_together():
+    assert split_sentences("It costs 3.5 dollars. Buy it now!\n\nNew paragraph") == [
+        "It costs 3.5 dollars.", "Buy it now!", "New paragraph",
+    ]
+
+
+def test_split_table_repeats_header_in_every_piece():
+    rows = [["Part", "Price"], ["bolt", "1"], ["nut", "2"], [None, None], ["washer", "3"], ["screw", "4"]]
+    pieces = Chunker(LAYOUT, chunk_size=30, chunk_overlap=0)._split_table(rows)
+    assert len(pieces) > 1
+    assert all(piece.startswith("Part | Price\n") for piece in pieces)
+    # Every body row lands in exactly one piece; empty rows are dropped
+    body = [line for piece in pieces for line in piece.split("\n")[1:]]
+    assert body == ["bolt | 1", "nut | 2", "washer | 3", "screw | 4"]
+
+
+def test_split_table_keeps_an_oversized_row_with_the_header():
+    pieces = Chunker(LAYOUT, chunk_size=10, chunk_overlap=0)._split_table([["H"], ["a very long row"]])
+    assert pieces == ["H\na very long row"]
+
+
+def test_pack_sentences_trims_overlap_to_fit_the_next_sentence():
+    sentences = ["Short.", "A medium sentence here.", "Tiny.", "A much longer sentence that fills the chunk.",
+                 "Ok.", "Another fairly long sentence, nearly full.", "End."]
+    chunk_size = max(len(sentence) for sentence in sentences) + 2
+    chunks = pack_sentences(sentences, chunk_size=chunk_size, chunk_overlap=30)
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    # Every sentence is kept, in order
+    assert chunks[-1].endswith("End.")
+    assert all(any(sentence in chunk for chunk in chunks) for sentence in sentences)
@@ -0,0 +1,73 @@
+from langchain_core.documents import Document
+
+from utility.context_packing import ContextPacker, estimate_tokens
+
+
+def chunk(text, index=None, page=1, score=None, chunk_id=None):
+    metadata = {"pdf_name": "a.pdf", "page": page, "chunk_id": chunk_id or f"{page}-{index}-{text[:10]}"}
+    if index is not None:
+        metadata["chunk_index"] = index
+    if score is not None:
+        metadata["relevance_score"] = score
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_repeated_and_contained_chunks_are_dropped():
+    docs = [
+        chunk("The warranty covers parts and labour for two years.", chunk_id="a"),
+        chunk("The warranty covers parts and labour for two years.", chunk_id="a"),
+        chunk("parts and labour for two years", chunk_id="b"),
+        chunk("Returns are accepted within thirty days of purchase.", chunk_id="c"),
+    ]
+    packed = ContextPacker().pack(docs)
+    assert [doc.metadata["chunk_id"] for doc in packed.documents] == ["a", "c"]
+
+
+def test_near_duplicates_are_dropped():
+    base = "the pump must be primed with water before the first start of the season"
+    docs = [chunk(base, chunk_id="a"), chunk(base + " always", chunk_id="b")]
+    assert len(ContextPacker(similarity_threshold=0.9).pack(docs).documents) == 1
+    assert len(ContextPacker(similarity_threshold=1.1).pack(docs).documents) == 2
+
+
+def test_consecutive_chunks_of_a_page_merge_without_their_overlap():
+    overlap = "shared sentence between chunks. "
+    docs = [
+        chunk("First part of the page. " + overlap, index=0),
+        chunk(overlap + "Second part of the page.", index=1),
+        chunk("Another page entirely.", index=2, page=2),
+    ]
+    packed = ContextPacker().pack(docs)
+    merged = packed.documents[0]
+    assert merged.page_content == "First part of the page. " + overlap + "Second part of the page."
+    assert merged.metadata["merged_chunks"] == 2
+    assert packed.documents[1].page_content == "Another page entirely."
+
+
+def test_packs_most_relevant_first_within_budget():
+    docs = [
+        chunk("low " * 40, chunk_id="low", score=0.1),
+        chunk("high relevance text", chunk_id="high", score=0.9),
+        chunk("middle " * 10, chunk_id="mid", score=0.5),
+    ]
+    packed = ContextPacker().pack(docs, budget=30)
+    assert [doc.metadata["chunk_id"] for doc in packed.documents] == ["high", "mid"]
+    assert packed.tokens <= 30
+    assert packed.input_tokens == sum(estimate_tokens(doc.page_content) for doc in docs)
+    assert packed.text == "\n\n".join(doc.page_content for doc in packed.documents)
+
+
+def test_oversized_best_chunk_is_cut_to_fit():
+    packed = ContextPacker().pack([chunk("word " * 100, chunk_id="big")], budget=10)
+    assert len(packed.documents) == 1
+    assert packed.tokens <= 10
+    assert packed.text and not packed.text.endswith(" ")
+
+
+def test_budget_per_model():
+    class Model:
+        model_name = "deepseek-chat"
+
+    packer = ContextPacker(budgets={"deepseek-chat": 100}, default_budget=0)
+    assert packer.budget_for(Model()) == 100
+    assert packer.budget_for(object()) is None
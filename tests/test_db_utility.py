@@ -0,0 +1,45 @@
+import pytest
+
+from utility import db_utility
+from utility.db_utility import (
+    flush_asks, get_chunking, get_retrieval_mode, get_upload_hash, init_db, record_ask, store_pipeline_metadata,
+)
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utility, "DB_PATH", str(tmp_path / "pipelines.db"))
+    init_db()
+
+
+def test_reupload_without_settings_keeps_the_stored_ones():
+    store_pipeline_metadata("a.pdf", "uploads/a.pdf", "vs/a", retrieval_mode="hybrid",
+                            chunking='{"strategy": "sentence"}', upload_hash="h1")
+    store_pipeline_metadata("a.pdf", "uploads/a.pdf", "vs/a", upload_hash="h2")
+    assert get_retrieval_mode("a.pdf") == "hybrid"
+    assert get_chunking("a.pdf") == '{"strategy": "sentence"}'
+    assert get_upload_hash("a.pdf") == "h2"
+
+    store_pipeline_metadata("a.pdf", "uploads/a.pdf", "vs/a", retrieval_mode="vector", upload_hash="h3")
+    assert get_retrieval_mode("a.pdf") == "vector"
+
+
+def test_question_counts_are_written_in_batches():
+    store_pipeline_metadata("a.pdf", "uploads/a.pdf", "vs/a")
+    store_pipeline_metadata("b.pdf", "uploads/b.pdf", "vs/b")
+    for pdf_name in ("a.pdf", "a.pdf", "b.pdf"):
+        record_ask(pdf_name)
+    assert ask_counts() == {"a.pdf": 0, "b.pdf": 0}
+
+    assert flush_asks() == 2
+    assert ask_counts() == {"a.pdf": 2, "b.pdf": 1}
+    assert flush_asks() == 0
+
+    record_ask("a.pdf")
+    flush_asks()
+    assert ask_counts() == {"a.pdf": 3, "b.pdf": 1}
+
+
+def ask_counts():
+    with db_utility.get_store().connection() as conn:
+        return dict(conn.execute("SELECT pdf_name, ask_count FROM pipelines").fetchall())
@@ -0,0 +1,47 @@
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from utility.embedding_engine import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds a text as a few float64 values that float32 cannot represent exactly."""
+    model_name = "counting"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[len(text) / 3, 0.1, -1 / 7] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_second_embed_of_the_same_text_is_served_from_the_cache(tmp_path):
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, cache_path=str(tmp_path / "cache.db"))
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    second = cached.embed_documents(["beta", "alpha"])
+
+    # Duplicates within a call are embedded once, and nothing is embedded the second time
+    assert model.calls == [["beta", "alpha"]]
+    assert second == [first[1], first[0]]
+    assert cached.stats()["embedded"] == 2
+    assert cached.stats()["cache_hits"] == 2
+
+
+def test_vectors_round_trip_through_the_cache_as_float32(tmp_path):
+    path = str(tmp_path / "cache.db")
+    fresh = CachedEmbeddings(CountingEmbeddings(), cache_path=path).embed_documents(["gamma"])
+
+    # A new wrapper on the same file reads the vector back from disk
+    model = CountingEmbeddings()
+    stored = CachedEmbeddings(model, cache_path=path).embed_documents(["gamma"])
+
+    assert model.calls == []
+    assert stored == fresh
+    assert fresh[0] == array("f", [5 / 3, 0.1, -1 / 7]).tolist()
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from utility import generation_grader
+from utility.generation_grader import PARALLEL, agrade_generation
+
+
+@pytest.fixture
+def graders(monkeypatch):
+    """Replaces both graders with sleeps returning the configured (delay, score)."""
+    config = {"hallucination": (0.0, "yes"), "answer": (0.0, "yes")}
+
+    async def agrade_hallucination(llm, docs, generation):
+        delay, score = config["hallucination"]
+        await asyncio.sleep(delay)
+        return {"hallucination_grade": score}
+
+    async def agrade_answer(llm, question, generation):
+        delay, score = config["answer"]
+        await asyncio.sleep(delay)
+        return {"answer_grade": score}
+
+    monkeypatch.setattr(generation_grader, "agrade_hallucination", agrade_hallucination)
+    monkeypatch.setattr(generation_grader, "agrade_answer", agrade_answer)
+    return config
+
+
+def grade():
+    return asyncio.run(agrade_generation(None, "facts", "question", "answer", mode=PARALLEL))
+
+
+def test_early_negative_answer_grade_waits_for_the_grounding_check(graders):
+    graders["hallucination"] = (0.2, "no")
+    graders["answer"] = (0.05, "no")
+    grades = grade()
+    # Same verdict as grading in turn: ungrounded, so the answer grade is not what decides
+    assert grades["hallucination_grade"] == "no"
+    assert grades["answer_grade"] == "no"
+    assert grades["latency_saved"] < 0.05
+
+
+def test_grounded_unhelpful_answer_saves_the_answer_grading_time(graders):
+    graders["hallucination"] = (0.2, "yes")
+    graders["answer"] = (0.1, "no")
+    grades = grade()
+    assert grades["hallucination_grade"] == "yes"
+    assert grades["answer_grade"] == "no"
+    assert grades["seconds"] < 0.28
+    assert grades["latency_saved"] > 0.05
+
+
+def test_early_negative_grounding_cancels_the_answer_grader(graders):
+    graders["hallucination"] = (0.05, "no")
+    graders["answer"] = (0.2, "yes")
+    grades = grade()
+    assert grades["hallucination_grade"] == "no"
+    assert grades["answer_grade"] is None
+    assert grades["seconds"] < 0.15
+    assert grades["latency_saved"] < 0.02
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from GraphWorkflow import graph_workflow
+from GraphWorkflow.graph_workflow import NOT_SUPPORTED, NOT_USEFUL, UNVERIFIED, USEFUL, GraphWorkflow
+from utility.generation_grader import PARALLEL
+
+
+class KeepAll:
+    """Reranker keeping every retrieved document, so no LLM grades them."""
+    async def arerank(self, question, documents):
+        return documents
+
+
+@pytest.fixture
+def verdicts(monkeypatch):
+    """Replaces the LLM calls of the graph; generations are graded with the queued verdicts, in turn."""
+    queued = []
+
+    async def arun_rag_chain(llm, context, question):
+        # A nested runnable, like the real chain, runs inside the generate node
+        return await RunnableLambda(lambda q: f"answer to {q}").ainvoke(question)
+
+    async def arewrite_question(llm, question):
+        return question + "?"
+
+    async def agrade_generation(llm, docs, question, generation, mode=None):
+        grade = queued.pop(0) if len(queued) > 1 else queued[0]
+        hallucination_grade = "no" if grade == NOT_SUPPORTED else "yes"
+        answer_grade = "yes" if grade == USEFUL else "no"
+        return {"hallucination_grade": hallucination_grade, "answer_grade": answer_grade,
+                "seconds": 0.0, "latency_saved": 0.0}
+
+    monkeypatch.setattr(graph_workflow, "arun_rag_chain", arun_rag_chain)
+    monkeypatch.setattr(graph_workflow, "arewrite_question", arewrite_question)
+    monkeypatch.setattr(graph_workflow, "agrade_generation", agrade_generation)
+    return queued
+
+
+def run(max_generations, max_rewrites):
+    workflow = GraphWorkflow(None, None, reranker=KeepAll())
+    retriever = RunnableLambda(lambda question: [Document(page_content="The sky is blue.")])
+
+    async def collect():
+        return [event async for event in workflow.stream_events(
+            "What colour is the sky", retriever, max_generations=max_generations, max_rewrites=max_rewrites,
+        )]
+
+    return asyncio.run(collect())
+
+
+def final(events):
+    return next(data for name, data in events if name == "final")
+
+
+def test_generation_budget_caps_rewrites(verdicts):
+    # Worst case: every answer is grounded but unhelpful and rewrites are plentiful
+    verdicts.append(NOT_USEFUL)
+    result = final(run(max_generations=1, max_rewrites=10))
+    assert result["generations"] == 1
+    assert result["rewrites"] == 0
+    assert result["reason"] == "budget_exhausted"
+
+
+def test_mixed_verdicts_stop_at_generation_budget(verdicts):
+    verdicts.extend([NOT_SUPPORTED, NOT_USEFUL, NOT_SUPPORTED, NOT_USEFUL])
+    result = final(run(max_generations=3, max_rewrites=10))
+    assert result["generations"] == 3
+    assert result["grade"] == NOT_USEFUL
+
+
+def test_rewrite_budget_ends_unhelpful_answers(verdicts):
+    verdicts.append(NOT_USEFUL)
+    result = final(run(max_generations=10, max_rewrites=2))
+    assert result["generations"] == 3
+    assert result["rewrites"] == 2
+
+
+def test_one_attempt_event_per_generation(verdicts):
+    verdicts.extend([NOT_SUPPORTED, USEFUL])
+    events = run(max_generations=3, max_rewrites=2)
+    attempts = [data["attempt"] for name, data in events if name == "attempt"]
+    assert attempts == [1, 2]
+    assert final(events)["attempt"] == 2
+
+
+def test_unverified_generation_does_not_replace_grounded_best():
+    workflow = GraphWorkflow(None, None, reranker=KeepAll())
+    state = {"generation": "second", "generation_count": 2,
+             "best_generation": "first", "best_grade": NOT_USEFUL, "best_attempt": 1}
+    update = workflow._generation_graded(
+        state, {"hallucination_grade": None, "answer_grade": "no", "seconds": 0.0, "latency_saved": 0.0},
+    )
+    assert update["generation_grade"] == UNVERIFIED
+    assert "best_generation" not in update
+
+
+def test_parallel_grading_routes_like_sequential_grading(monkeypatch, verdicts):
+    """An ungrounded answer is regenerated even when its negative answer grade arrives first."""
+    from utility import generation_grader
+
+    grounding = ["no", "yes"]
+
+    async def agrade_hallucination(llm, docs, generation):
+        await asyncio.sleep(0.05)
+        return {"hallucination_grade": grounding.pop(0)}
+
+    async def agrade_answer(llm, question, generation):
+        return {"answer_grade": "no"}
+
+    monkeypatch.setattr(generation_grader, "agrade_hallucination", agrade_hallucination)
+    monkeypatch.setattr(generation_grader, "agrade_answer", agrade_answer)
+    monkeypatch.setattr(graph_workflow, "agrade_generation", generation_grader.agrade_generation)
+
+    workflow = GraphWorkflow(None, None, reranker=KeepAll(), generation_grading_mode=PARALLEL)
+    retriever = RunnableLambda(lambda question: [Document(page_content="The sky is blue.")])
+
+    async def collect():
+        return [event async for event in workflow.stream_events(
+            "What colour is the sky", retriever, max_generations=2, max_rewrites=2,
+        )]
+
+    result = final(asyncio.run(collect()))
+    # The first answer is regenerated (not rewritten); the second is grounded but unhelpful
+    assert result["generations"] == 2
+    assert result["rewrites"] == 0
+    assert result["grade"] == NOT_USEFUL
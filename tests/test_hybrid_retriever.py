@@ -0,0 +1,55 @@
+import pytest
+from langchain_core.documents import Document
+
+from utility.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+
+
+def chunk(name):
+    return Document(page_content=f"text of {name}", metadata={"chunk_id": name})
+
+
+def ids(fused):
+    return [doc.metadata["chunk_id"] for doc, _ in fused]
+
+
+def test_chunks_ranked_by_both_lists_rise_to_the_top():
+    dense = [chunk("a"), chunk("b"), chunk("c")]
+    lexical = [chunk("c"), chunk("d"), chunk("b")]
+    fused = reciprocal_rank_fusion([dense, lexical], rrf_k=60)
+
+    # b: 1/62 + 1/63, c: 1/63 + 1/61, a: 1/61, d: 1/62
+    assert ids(fused) == ["c", "b", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[2][1] == pytest.approx(1 / 61)
+
+
+def test_duplicates_are_merged_keeping_the_first_copy():
+    first = chunk("a")
+    fused = reciprocal_rank_fusion([[first], [chunk("a")]])
+    assert len(fused) == 1
+    assert fused[0][0] is first
+
+
+class FakeLexicalIndex:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def search(self, query, k):
+        return [(doc, 1.0) for doc in self.documents[:k]]
+
+
+class FakeVectorstore:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def similarity_search(self, query, k, **kwargs):
+        return self.documents[:k]
+
+
+def test_hybrid_retriever_returns_the_fused_top_k():
+    retriever = HybridRetriever(
+        vectorstore=FakeVectorstore([chunk("a"), chunk("b"), chunk("c")]),
+        lexical_index=FakeLexicalIndex([chunk("c"), chunk("d"), chunk("b")]),
+        k=2,
+    )
+    assert [doc.metadata["chunk_id"] for doc in retriever.invoke("question")] == ["c", "b"]
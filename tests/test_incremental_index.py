@@ -0,0 +1,96 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from DocumentProcessingPipeline.document_processing_pipeline import INDEX_SHARED, DocumentProcessingPipeline, IndexMissing
+from utility import db_utility
+from utility.db_utility import get_chunk_fingerprints, init_db, store_pipeline_metadata
+
+
+@pytest.fixture
+def open_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utility, "DB_PATH", str(tmp_path / "pipelines.db"))
+    init_db()
+    pdf_path = tmp_path / "report.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4\n")
+    store_pipeline_metadata("report.pdf", str(pdf_path), str(tmp_path / "vectorstores"))
+
+    def open_pipeline(base_path):
+        return DocumentProcessingPipeline(
+            pdf_path=str(pdf_path),
+            embedding_model=DeterministicFakeEmbedding(size=8),
+            vectorstore_base_path=str(tmp_path / base_path),
+            load_vectorstore=False,
+        )
+    return open_pipeline
+
+
+def chunks():
+    return [Document(page_content=f"Clause {i} of the supply contract.", metadata={"page": i}) for i in range(3)]
+
+
+def test_moved_index_is_rebuilt_in_full(open_pipeline):
+    open_pipeline("old").index_documents(documents=chunks(), file_hash="v1")
+    assert len(get_chunk_fingerprints("report.pdf")) == 3
+
+    # The index location changed; the recorded fingerprints describe the old store
+    vectorstore = open_pipeline("new").index_documents(documents=chunks(), file_hash="v1")
+
+    assert len(vectorstore.get(include=[])["ids"]) == 3
+    assert len(get_chunk_fingerprints("report.pdf")) == 3
+
+
+def test_switch_to_shared_index_reports_missing_then_indexes(open_pipeline, tmp_path):
+    open_pipeline("old").index_documents(documents=chunks(), file_hash="v1")
+
+    shared = DocumentProcessingPipeline(
+        pdf_path=str(tmp_path / "report.pdf"),
+        embedding_model=DeterministicFakeEmbedding(size=8),
+        load_vectorstore=False,
+        index_mode=INDEX_SHARED,
+        shared_vectorstore_path=str(tmp_path / "shared"),
+    )
+    # Answering never indexes inline
+    with pytest.raises(IndexMissing):
+        shared.load_index()
+
+    # The ingestion job then indexes every chunk into the shared collection
+    vectorstore = shared.index_documents(documents=chunks(), file_hash="v1")
+    assert len(vectorstore.get(where={"pdf_name": "report.pdf"}, include=[])["ids"]) == 3
+    shared.load_index()
+    assert shared.retriever is not None
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def test_inserted_page_only_embeds_its_own_chunks(open_pipeline):
+    pipeline = open_pipeline("vectorstores")
+    pipeline.embedding_model = CountingEmbedding(size=8, embedded=[])
+
+    def page(number, text, total_pages):
+        return Document(page_content=text, metadata={"page": number, "total_pages": total_pages})
+
+    pipeline.index_documents(
+        documents=[page(0, "Scope of the contract.", 2), page(1, "Payment terms.", 2)], file_hash="v1",
+    )
+    embedding = pipeline.embedding_model
+    embedding.embedded.clear()
+
+    # A cover page is inserted: every later page shifts by one
+    vectorstore = pipeline.index_documents(
+        documents=[page(0, "Cover page.", 3), page(1, "Scope of the contract.", 3), page(2, "Payment terms.", 3)],
+        file_hash="v2",
+    )
+
+    assert embedding.embedded == ["Cover page."]
+    stored = vectorstore.get(include=["documents", "metadatas"])
+    pages = {text: metadata for text, metadata in zip(stored["documents"], stored["metadatas"])}
+    assert len(pages) == 3
+    assert pages["Payment terms."]["page"] == 2
+    assert all(metadata["total_pages"] == 3 for metadata in pages.values())
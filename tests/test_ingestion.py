@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from utility import db_utility
+from utility.db_utility import JOB_FAILED, JOB_QUEUED, JOB_READY, get_ingestion_job, init_db
+from utility.ingestion import IngestionQueue
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utility, "DB_PATH", str(tmp_path / "pipelines.db"))
+    init_db()
+
+
+def test_stale_job_does_not_overwrite_newer_submission():
+    first_started = threading.Event()
+    finish_first = threading.Event()
+    second_started = threading.Event()
+    finish_second = threading.Event()
+    calls = []
+
+    def index_fn(pdf_name, set_status):
+        calls.append(pdf_name)
+        if len(calls) == 1:
+            first_started.set()
+            finish_first.wait(5)
+            set_status("embedding")
+        else:
+            second_started.set()
+            finish_second.wait(5)
+
+    ingestion = IngestionQueue(index_fn, num_workers=1)
+    ingestion.submit("a.pdf")
+    ingestion.start()
+    assert first_started.wait(5)
+
+    # Re-upload while the first job is still indexing the old file
+    ingestion.submit("a.pdf")
+    finish_first.set()
+    assert second_started.wait(5)
+    # The first job's "embedding" and "ready" reports were dropped
+    assert get_ingestion_job("a.pdf")["status"] == JOB_QUEUED
+
+    finish_second.set()
+    ingestion._queue.join()
+    assert calls == ["a.pdf", "a.pdf"]
+    assert get_ingestion_job("a.pdf")["status"] == JOB_READY
+
+
+def test_job_locks_are_dropped_when_jobs_finish():
+    ingestion = IngestionQueue(lambda pdf_name, set_status: None, num_workers=2)
+    ingestion.start()
+    for i in range(5):
+        ingestion.submit(f"{i}.pdf")
+    ingestion._queue.join()
+    assert ingestion._running == {}
+    assert ingestion._generations == {}
+
+
+def test_failed_job_is_logged_and_reported(caplog):
+    def index_fn(pdf_name, set_status):
+        raise RuntimeError("unreadable PDF")
+
+    ingestion = IngestionQueue(index_fn, num_workers=1)
+    ingestion.submit("broken.pdf")
+    with caplog.at_level("ERROR", logger="rag"):
+        ingestion.start()
+        for _ in range(100):
+            job = get_ingestion_job("broken.pdf")
+            if job["status"] == JOB_FAILED:
+                break
+            time.sleep(0.05)
+    assert job["status"] == JOB_FAILED
+    assert job["error"] == "unreadable PDF"
+    assert "Ingestion of broken.pdf failed" in caplog.text
+    assert "RuntimeError" in caplog.text
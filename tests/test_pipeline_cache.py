@@ -0,0 +1,66 @@
+import threading
+
+from utility.pipeline_cache import PipelineCache
+
+
+class Pipeline:
+    def __init__(self, name, size=0):
+        self.name = name
+        self.size = size
+
+
+def test_least_recently_used_pipeline_is_evicted():
+    cache = PipelineCache(max_entries=2)
+    cache.get_or_create("a.pdf", lambda: Pipeline("a"))
+    cache.get_or_create("b.pdf", lambda: Pipeline("b"))
+    cache.get("a.pdf")
+    cache.get_or_create("c.pdf", lambda: Pipeline("c"))
+
+    assert "b.pdf" not in cache
+    assert "a.pdf" in cache and "c.pdf" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_limit_evicts_but_keeps_the_newest_pipeline():
+    cache = PipelineCache(max_entries=10, max_memory_bytes=100, sizeof=lambda pipeline: pipeline.size)
+    cache.get_or_create("a.pdf", lambda: Pipeline("a", size=60))
+    cache.get_or_create("b.pdf", lambda: Pipeline("b", size=60))
+    cache.get_or_create("c.pdf", lambda: Pipeline("c", size=500))
+
+    assert len(cache) == 1 and "c.pdf" in cache
+    assert cache.stats()["memory_bytes"] == 500
+
+
+def test_invalidated_pipeline_stays_usable_by_the_request_holding_it():
+    cache = PipelineCache()
+    held = cache.get_or_create("a.pdf", lambda: Pipeline("old"))
+
+    assert cache.invalidate("a.pdf")
+
+    # The request keeps its pipeline; the next one opens the new version
+    assert held.name == "old"
+    assert cache.get_or_create("a.pdf", lambda: Pipeline("new")).name == "new"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_pipeline_built_across_an_invalidation_is_not_cached():
+    cache = PipelineCache()
+    building, invalidated = threading.Event(), threading.Event()
+    results = []
+
+    def slow_factory():
+        building.set()
+        invalidated.wait(5)
+        return Pipeline("stale")
+
+    thread = threading.Thread(target=lambda: results.append(cache.get_or_create("a.pdf", slow_factory)))
+    thread.start()
+    assert building.wait(5)
+    cache.invalidate("a.pdf")
+    invalidated.set()
+    thread.join(5)
+
+    # The request that built it still gets its pipeline, but it is not kept
+    assert [pipeline.name for pipeline in results] == ["stale"]
+    assert "a.pdf" not in cache
+    assert cache.get_or_create("a.pdf", lambda: Pipeline("fresh")).name == "fresh"
@@ -0,0 +1,31 @@
+import math
+
+from langchain_core.documents import Document
+
+from utility.reranker import Reranker
+
+
+class StubCrossEncoder:
+    """Scores a chunk with the logit written in its text."""
+    def score(self, pairs):
+        return [float(text) for _, text in pairs]
+
+
+def rerank(logits, threshold, top_n=4):
+    documents = [Document(page_content=str(logit)) for logit in logits]
+    return Reranker(StubCrossEncoder(), threshold=threshold, top_n=top_n).rerank("question", documents)
+
+
+def test_threshold_is_a_probability_over_sigmoid_scores():
+    kept = rerank([-3.0, 2.0, -1.0, 0.5], threshold=0.25)
+    # sigmoid(-1.0) = 0.27 passes, sigmoid(-3.0) = 0.05 does not
+    assert [doc.page_content for doc in kept] == ["2.0", "0.5", "-1.0"]
+    assert math.isclose(kept[0].metadata["relevance_score"], 1 / (1 + math.exp(-2.0)))
+    assert all(0.0 <= doc.metadata["relevance_score"] <= 1.0 for doc in kept)
+
+
+def test_top_n_keeps_the_best_chunks_and_extreme_logits_are_safe():
+    kept = rerank([-1000.0, 1000.0, 3.0, 4.0], threshold=0.0, top_n=2)
+    assert [doc.page_content for doc in kept] == ["1000.0", "4.0"]
+    assert rerank([-1000.0], threshold=0.0)[0].metadata["relevance_score"] == 0.0
+    assert rerank([], threshold=0.1) == []
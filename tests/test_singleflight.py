@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from utility.singleflight import FlightCancelled, SingleFlight
+
+
+def producer(items, gate, started):
+    """Returns a producer emitting `items`, one per token put on the `gate` queue."""
+    async def produce():
+        started.append(1)
+        for item in items:
+            await gate.get()
+            yield item
+    return produce
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_concurrent_requests_share_one_run_and_replay_earlier_items():
+    async def main():
+        flight = SingleFlight()
+        gate, started = asyncio.Queue(), []
+        produce = producer(["a", "b", "c"], gate, started)
+
+        first = flight.stream("key", produce)
+        gate.put_nowait(None)
+        assert await first.__anext__() == "a"
+        # A late subscriber gets the items already emitted, then the rest
+        late = asyncio.ensure_future(collect(flight.stream("key", produce)))
+        await asyncio.sleep(0)
+        gate.put_nowait(None)
+        gate.put_nowait(None)
+        rest = await collect(first)
+        return started, rest, await late, flight.stats()
+
+    started, rest, late, stats = run(main())
+    assert started == [1]
+    assert rest == ["b", "c"]
+    assert late == ["a", "b", "c"]
+    assert stats == {"in_flight": 0, "flights_started": 1, "requests_coalesced": 1}
+
+
+def test_producer_errors_reach_every_subscriber():
+    async def failing():
+        yield "a"
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(
+            *(collect(flight.stream("key", failing)) for _ in range(2)), return_exceptions=True,
+        )
+
+    assert all(isinstance(result, ValueError) for result in run(main()))
+
+
+def test_last_subscriber_leaving_cancels_the_run_and_forgets_the_key():
+    async def main():
+        flight = SingleFlight()
+        gate, started = asyncio.Queue(), []
+        stream = flight.stream("key", producer(["a", "b"], gate, started))
+        gate.put_nowait(None)
+        assert await stream.__anext__() == "a"
+        task = flight._flights["key"].task
+        await stream.aclose()
+        assert not flight.in_flight("key")
+        await asyncio.sleep(0)
+        assert task.done()
+
+        # The next request starts a new run
+        gate.put_nowait(None)
+        gate.put_nowait(None)
+        return await collect(flight.stream("key", producer(["a", "b"], gate, started))), started
+
+    items, started = run(main())
+    assert items == ["a", "b"]
+    assert started == [1, 1]
+
+
+def test_cancelled_run_is_reported_to_its_subscribers():
+    async def main():
+        flight = SingleFlight()
+        waiting = asyncio.ensure_future(collect(flight.stream("key", producer(["a"], asyncio.Queue(), []))))
+        await asyncio.sleep(0)
+        flight._flights["key"].task.cancel()
+        with pytest.raises(FlightCancelled):
+            await waiting
+        return flight.in_flight("key")
+
+    assert run(main()) is False
@@ -0,0 +1,42 @@
+from utility.telemetry import Gauge, Telemetry
+
+
+def rendered_lines(telemetry):
+    text = telemetry.render_prometheus()
+    assert text.endswith("\n")
+    return text.splitlines()
+
+
+def test_metrics_render_counters_gauges_and_histograms():
+    telemetry = Telemetry()
+    queue_depth = Gauge("rag_llm_queue_depth", "LLM calls waiting for a slot, by model.", ["model"])
+    queue_depth.set(3, "deepseek-chat")
+    telemetry.register(queue_depth)
+
+    trace = telemetry.start_trace(pdf_name="a.pdf")
+    trace.record_node("generate", 0.2)
+    trace.record_llm_call("deepseek-chat", 120, 30)
+    trace.finish("useful", generations=2, rewrites=1)
+    trace.finish("error")  # ignored
+
+    lines = rendered_lines(telemetry)
+    assert "# TYPE rag_requests_total counter" in lines
+    assert 'rag_requests_total{outcome="useful"} 1' in lines
+    assert 'rag_llm_tokens_total{model="deepseek-chat",kind="prompt"} 120' in lines
+    assert "# TYPE rag_llm_queue_depth gauge" in lines
+    assert 'rag_llm_queue_depth{model="deepseek-chat"} 3' in lines
+
+    assert "# TYPE rag_node_duration_seconds histogram" in lines
+    assert 'rag_node_duration_seconds_bucket{node="generate",le="0.1"} 0' in lines
+    assert 'rag_node_duration_seconds_bucket{node="generate",le="0.25"} 1' in lines
+    assert 'rag_node_duration_seconds_bucket{node="generate",le="+Inf"} 1' in lines
+    assert 'rag_node_duration_seconds_sum{node="generate"} 0.2' in lines
+    assert 'rag_node_duration_seconds_count{node="generate"} 1' in lines
+    assert 'rag_loop_iterations_bucket{kind="generation",le="1"} 0' in lines
+    assert 'rag_loop_iterations_bucket{kind="generation",le="2"} 1' in lines
+
+
+def test_label_values_are_escaped():
+    telemetry = Telemetry()
+    telemetry.start_trace().finish('bad "quote"\\\n')
+    assert 'rag_requests_total{outcome="bad \\"quote\\"\\\\\\n"} 1' in rendered_lines(telemetry)
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utility.uploads import FileLocks, InvalidUpload, UploadLimitMiddleware, UploadTooLarge, receive_upload
+
+CONTENT_TYPE = "multipart/form-data; boundary=b"
+
+
+def multipart_body(content, filename="a.pdf", **fields):
+    """A multipart/form-data body with boundary `b`, fields first, then the file."""
+    parts = [f'--b\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--b\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b"\r\n")
+    return b"".join(parts) + b"--b--\r\n"
+
+
+async def chunked(body, size=7):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def limited_app(max_bytes, tmp_dir):
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=max_bytes, error="Too big.")
+    parsed = []
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        received = await receive_upload(request.stream(), request.headers["content-type"], str(tmp_dir))
+        received.discard()
+        parsed.append(received.filename)
+        return {"size": received.size}
+
+    return app, parsed
+
+
+def test_upload_within_limit_reaches_the_handler(tmp_path):
+    app, parsed = limited_app(max_bytes=4096, tmp_dir=tmp_path)
+    response = TestClient(app).post("/upload", files={"file": ("a.pdf", b"x" * 100)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+    assert parsed == ["a.pdf"]
+
+
+def test_oversized_upload_is_refused_before_the_form_is_parsed(tmp_path):
+    app, parsed = limited_app(max_bytes=4096, tmp_dir=tmp_path)
+    response = TestClient(app).post("/upload", files={"file": ("a.pdf", b"x" * 10000)})
+    assert response.status_code == 413
+    assert response.json() == {"error": "Too big."}
+    assert parsed == []
+
+
+def test_oversized_chunked_upload_is_cut_off(tmp_path):
+    app, parsed = limited_app(max_bytes=4096, tmp_dir=tmp_path)
+
+    def body():
+        for _ in range(10):
+            yield b"x" * 1000
+
+    response = TestClient(app).post(
+        "/upload", content=body(), headers={"content-type": "multipart/form-data; boundary=b"},
+    )
+    assert response.status_code == 413
+    assert parsed == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_form_is_parsed_as_it_streams_and_the_file_written_to_disk(tmp_path):
+    content = b"%PDF-1.4 " * 100
+
+    async def main():
+        return await receive_upload(chunked(multipart_body(content, chunk_size="400")), CONTENT_TYPE, str(tmp_path))
+
+    received = run(main())
+    assert received.filename == "a.pdf"
+    assert received.fields == {"chunk_size": "400"}
+    assert (received.size, received.sha256) == (len(content), hashlib.sha256(content).hexdigest())
+    with open(received.tmp_path, "rb") as f:
+        assert f.read() == content
+    assert received.tmp_path.startswith(str(tmp_path))
+
+
+@pytest.mark.parametrize("body, max_bytes, error", [
+    (multipart_body(b"x" * 100), 50, UploadTooLarge),
+    (multipart_body(b"x" * 100)[:-20], None, InvalidUpload),
+    (b"--b\r\nContent-Disposition: form-data; name=\"other\"\r\n\r\nx\r\n--b--\r\n", None, InvalidUpload),
+])
+def test_rejected_upload_leaves_no_file_behind(tmp_path, body, max_bytes, error):
+    with pytest.raises(error):
+        run(receive_upload(chunked(body), CONTENT_TYPE, str(tmp_path), max_bytes=max_bytes))
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_uploads_record_the_checksum_of_the_file_on_disk(tmp_path):
+    dest = tmp_path / "a.pdf"
+    locks = FileLocks()
+    recorded = []
+
+    async def upload(content):
+        def on_saved(size, sha256):
+            recorded.append((dest.read_bytes(), sha256))
+
+        received = await receive_upload(chunked(multipart_body(content), size=1), CONTENT_TYPE, str(tmp_path))
+        await received.save(str(dest), lock=locks.hold("a.pdf"), on_saved=on_saved)
+
+    async def main():
+        await asyncio.gather(upload(b"first version"), upload(b"second"))
+
+    asyncio.run(main())
+    assert all(hashlib.sha256(content).hexdigest() == sha256 for content, sha256 in recorded)
+    assert locks._locks == {}
+
+
+def test_saved_callback_runs_off_the_event_loop(tmp_path):
+    threads = []
+
+    async def main():
+        received = await receive_upload(chunked(multipart_body(b"%PDF")), CONTENT_TYPE, str(tmp_path))
+        await received.save(str(tmp_path / "a.pdf"), on_saved=lambda size, sha256: threads.append(threading.get_ident()))
+        return threading.get_ident()
+
+    loop_thread = run(main())
+    assert len(threads) == 1 and threads[0] != loop_thread
@@ -0,0 +1,30 @@
+from utility.warmup import DONE, FAILED, PENDING, Warmup
+
+
+def fail():
+    raise RuntimeError("model download failed")
+
+
+def test_optional_step_failure_is_logged_and_does_not_block_readiness(caplog):
+    warmup = Warmup()
+    warmup.add_step("optional", fail, required=False)
+    warmup.add_step("required", lambda: None)
+    with caplog.at_level("ERROR", logger="rag"):
+        warmup.start()
+        assert warmup.wait(5)
+    steps = warmup.status()["steps"]
+    assert steps["optional"]["status"] == FAILED
+    assert steps["optional"]["error"] == "model download failed"
+    assert steps["required"]["status"] == DONE
+    assert "Warm-up step optional failed" in caplog.text
+
+
+def test_required_step_failure_leaves_the_process_unready():
+    warmup = Warmup()
+    warmup.add_step("required", fail)
+    warmup.add_step("later", lambda: None)
+    warmup.start()
+    warmup._thread.join(5)
+    assert warmup.failed
+    assert not warmup.ready
+    assert warmup.status()["steps"]["later"]["status"] == PENDING
@@ -0,0 +1,370 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from pydantic import Field
+
+from utility.telemetry import Counter, Gauge, Histogram, logger
+
+# Priorities of LLM calls; lower numbers are admitted first
+GENERATE = 0
+GRADE = 1
+PRIORITY_NAMES = {GENERATE: "generate", GRADE: "grade"}
+
+# Responses retried with backoff: rate limited, or the provider is briefly overloaded
+RETRY_STATUSES = (429, 503)
+
+_priority = contextvars.ContextVar("llm_priority", default=GRADE)
+
+
+@contextmanager
+def llm_priority(priority):
+    """Admits the LLM calls made inside the block (and the tasks it starts) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a model's wait queue is full."""
+    def __init__(self, model, retry_after):
+        super().__init__(f"{model} is overloaded; retry in {retry_after} seconds.")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def find_rejection(error):
+    """Returns the `AdmissionRejected` behind an error (searching its causes), or None."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, AdmissionRejected):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class ModelGate:
+    """
+    Limits the concurrent calls to one model, queueing the rest by priority.
+
+    Waiters are admitted by priority, then arrival order; a released slot is handed
+    directly to the next waiter. Runs on a single event loop; it is not thread-safe.
+    """
+    def __init__(self, model, max_concurrent, max_queue):
+        """
+        Args:
+            model (str): Name of the model.
+            max_concurrent (int): Calls allowed in flight at once.
+            max_queue (int): Calls allowed to wait; further calls are rejected.
+        """
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        # Moving average of how long a call holds its slot, for Retry-After estimates
+        self._call_seconds = 1.0
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    @property
+    def full(self):
+        """True when a new call would be rejected."""
+        return self.active >= self.max_concurrent and len(self._waiters) >= self.max_queue
+
+    def retry_after(self):
+        """Estimates the seconds until the queue has drained enough to admit a new call."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._call_seconds * backlog / self.max_concurrent))
+
+    async def acquire(self, priority=GRADE):
+        """
+        Waits for a slot.
+
+        Args:
+            priority (int): `GENERATE` or `GRADE`; lower is admitted first.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            AdmissionRejected: The wait queue is full.
+        """
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(self.model, self.retry_after())
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._order), future)
+        heapq.heappush(self._waiters, entry)
+        start = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller gave up; pass it on
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        return time.perf_counter() - start
+
+    def release(self, held_seconds=None):
+        """
+        Frees a slot, handing it to the next waiter if there is one.
+
+        Args:
+            held_seconds (float, optional): How long the call held the slot.
+        """
+        if held_seconds is not None:
+            self._call_seconds = 0.8 * self._call_seconds + 0.2 * held_seconds
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmittedChatModel(BaseChatModel):
+    """
+    Chat model base whose async calls are admitted through an `AdmissionController`.
+
+    Combine it with a concrete model class (see `admitted_model_class`). A call holds its
+    model's slot until its response has been read, streamed ones included, and calls
+    rejected by the provider's rate limit are retried while holding it. Sync calls are
+    not gated (the gates belong to the event loop) but are retried the same way, since
+    the client's own retries are turned off.
+    """
+    admission: Any = Field(default=None, exclude=True)
+
+    @property
+    def _admission_model(self):
+        return getattr(self, "model_name", None) or self._llm_type
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.admission is None or getattr(self, "streaming", False):
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        model = self._admission_model
+        attempt = 0
+        while True:
+            try:
+                return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                delay = self.admission.retry_delay(model, e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.admission is None:
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        model = self._admission_model
+        attempt = 0
+        while True:
+            stream = super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            try:
+                first = next(stream)
+            except StopIteration:
+                return
+            except Exception as e:
+                delay = self.admission.retry_delay(model, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            yield first
+            yield from stream
+            return
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # A streaming model generates through `_astream`, which is admitted itself
+        if self.admission is None or getattr(self, "streaming", False):
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        model = self._admission_model
+        async with self.admission.slot(model):
+            attempt = 0
+            while True:
+                try:
+                    return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                except Exception as e:
+                    delay = self.admission.retry_delay(model, e, attempt)
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.admission is None:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        model = self._admission_model
+        async with self.admission.slot(model):
+            attempt = 0
+            while True:
+                stream = super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+                # Rate limits are reported before the first chunk; only then is it safe to retry
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    delay = self.admission.retry_delay(model, e, attempt)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                yield first
+                async for chunk in stream:
+                    yield chunk
+                return
+
+
+@functools.lru_cache(maxsize=None)
+def admitted_model_class(model_class):
+    """Returns a subclass of the chat model class taking an `admission` controller."""
+    return type(f"Admitted{model_class.__name__}", (AdmittedChatModel, model_class), {"__module__": __name__})
+
+
+class AdmissionController:
+    """
+    Per-model concurrency limits, priority wait queues and rate-limit retries for LLM calls.
+
+    Chat models built from `admitted_model_class` with `admission=` set go through it; the
+    gates are created per model name on first use.
+    """
+    def __init__(self, limits=None, default_limit=8, max_queue=64, max_retries=4,
+                 backoff_base=0.5, backoff_max=20.0):
+        """
+        Args:
+            limits (dict, optional): Concurrent calls allowed per model name.
+            default_limit (int): Concurrent calls allowed for models not in `limits`.
+            max_queue (int): Calls allowed to wait per model before new ones are rejected.
+            max_retries (int): Retries of a rate-limited call.
+            backoff_base (float): Upper bound, in seconds, of the first retry's random delay.
+            backoff_max (float): Cap of the backoff delay.
+        """
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._gates = {}
+
+        self.queue_depth = Gauge("rag_llm_queue_depth", "LLM calls waiting for a slot, by model.", ["model"])
+        self.in_flight = Gauge("rag_llm_in_flight", "LLM calls holding a slot, by model.", ["model"])
+        self.wait_seconds = Histogram(
+            "rag_llm_queue_wait_seconds", "Time LLM calls waited for a slot.", ["model", "priority"]
+        )
+        self.rejected = Counter("rag_llm_rejected_total", "LLM calls rejected because the queue was full.", ["model"])
+        self.retries = Counter("rag_llm_retries_total", "LLM calls retried after a rate limit.", ["model", "status"])
+
+    def gate(self, model):
+        """Returns the gate of a model, creating it on first use."""
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = self._gates[model] = ModelGate(model, self.limits.get(model, self.default_limit), self.max_queue)
+        return gate
+
+    @asynccontextmanager
+    async def slot(self, model):
+        """
+        Holds a slot of `model` for the duration of the block, waiting for one at the
+        priority set by `llm_priority`.
+
+        Raises:
+            AdmissionRejected: The model's wait queue is full.
+        """
+        priority = _priority.get()
+        gate = self.gate(model)
+        try:
+            waited = await gate.acquire(priority)
+        except AdmissionRejected:
+            self.rejected.inc(model)
+            raise
+        finally:
+            self.update_gauges(gate)
+        self.wait_seconds.observe(waited, model, PRIORITY_NAMES.get(priority, str(priority)))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            gate.release(time.perf_counter() - start)
+            self.update_gauges(gate)
+
+    def retry_delay(self, model, error, attempt):
+        """
+        Returns the seconds to wait before retrying a failed call, or None if it should not
+        be retried: it was not rate limited, or its retries are spent.
+        """
+        status = getattr(error, "status_code", None)
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        self.retries.inc(model, str(status))
+        response = getattr(error, "response", None)
+        delay = self.backoff(attempt, response.headers.get("retry-after") if response is not None else None)
+        logger.debug("---%s %s: retry %d in %.2fs---", model, status, attempt + 1, delay)
+        return delay
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Returns the delay before a retry: full jitter over an exponentially growing window,
+        and never shorter than the provider's Retry-After.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        try:
+            delay = max(delay, min(self.backoff_max, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    def saturated(self):
+        """
+        Returns the Retry-After seconds if any model's queue is full, else None.
+
+        New questions are turned away at that point rather than failing halfway through.
+        """
+        full = [gate.retry_after() for gate in self._gates.values() if gate.full]
+        return max(full) if full else None
+
+    def update_gauges(self, gate):
+        self.queue_depth.set(gate.queue_depth, gate.model)
+        self.in_flight.set(gate.active, gate.model)
+
+    def metrics(self):
+        """Returns the metrics to expose, for `Telemetry.register`."""
+        return [self.queue_depth, self.in_flight, self.wait_seconds, self.rejected, self.retries]
+
+    def stats(self):
+        """
+        Returns the state of every gate.
+
+        Returns:
+            dict: Per model: concurrency limit, calls in flight and calls waiting.
+        """
+        return {
+            model: {"limit": gate.max_concurrent, "in_flight": gate.active, "queued": gate.queue_depth}
+            for model, gate in self._gates.items()
+        }
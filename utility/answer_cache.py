@@ -0,0 +1,165 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_question(question):
+    """Lower-cases a question and collapses whitespace and trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+def _normalize_vector(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class SemanticAnswerCache:
+    """
+    Bounded, TTL-expiring cache of final answers keyed on (document scope, question).
+
+    A question hits when its normalized text matches a cached question exactly, or when the
+    cosine similarity of its embedding to a cached question in the same scope reaches the
+    threshold. The scope identifies the document version, so answers about a replaced PDF
+    are never served.
+    """
+    def __init__(self, embedding_model, similarity_threshold=0.95, ttl_seconds=3600, max_entries=1000):
+        """
+        Initializes the cache.
+
+        Args:
+            embedding_model (Embeddings): Model used to embed questions.
+            similarity_threshold (float): Minimum cosine similarity for a near-duplicate hit.
+            ttl_seconds (float): Lifetime of a cached answer.
+            max_entries (int): Maximum number of cached answers; least recently used go first.
+        """
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def embed(self, question):
+        """Embeds a question and normalizes it to unit length."""
+        return _normalize_vector(self.embedding_model.embed_query(question))
+
+    def get_exact(self, scope, question):
+        """
+        Returns the cached answer for an identical (normalized) question, or None.
+
+        Cheap enough to run before embedding the question.
+        """
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self.exact_hits += 1
+            return entry["answer"]
+
+    def get_similar(self, scope, question_embedding):
+        """
+        Returns the answer of the most similar cached question in `scope`, if it is similar enough.
+
+        Args:
+            scope (tuple): The document scope.
+            question_embedding (list): Unit-length embedding from `embed`.
+
+        Returns:
+            str or None: The cached answer.
+        """
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key in list(self._scopes.get(scope, ())):
+                entry = self._live_entry(key, touch=False)
+                if entry is None:
+                    continue
+                score = sum(a * b for a, b in zip(question_embedding, entry["embedding"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self._entries[best_key]["answer"]
+
+    def put(self, scope, question, answer, question_embedding):
+        """
+        Caches the final answer to a question.
+
+        Args:
+            scope (tuple): The document scope.
+            question (str): The question as asked.
+            answer (str): The accepted answer.
+            question_embedding (list): Unit-length embedding from `embed`.
+        """
+        key = (scope, normalize_question(question))
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": question_embedding,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._entries.move_to_end(key)
+            self._scopes.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._discard_scope_key(oldest)
+                self.evictions += 1
+
+    def invalidate(self, pdf_name):
+        """Drops every cached answer whose scope involves `pdf_name`."""
+        with self._lock:
+            for scope in [scope for scope in self._scopes if scope[0] == pdf_name]:
+                for key in self._scopes.pop(scope):
+                    self._entries.pop(key, None)
+
+    def _live_entry(self, key, touch=True):
+        """Returns the entry for `key` unless it expired, dropping it if so. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            del self._entries[key]
+            self._discard_scope_key(key)
+            return None
+        if touch:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _discard_scope_key(self, key):
+        keys = self._scopes.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[key[0]]
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Entry count and exact/semantic hit and miss counters.
+        """
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
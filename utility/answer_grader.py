@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 
+from utility.chains import cached_chain
+
 
 class GradeAnswer(BaseModel):
     """Binary score to assess whether the answer addresses the question."""
@@ -10,18 +12,8 @@ class GradeAnswer(BaseModel):
     )
 
 
-def grade_answer(llm_chat, question, generation):
-    """
-    Grades whether an LLM-generated answer addresses the user's question.
-
-    Args:
-        llm_chat: The LLM instance with structured output capabilities.
-        question (str): The user's question.
-        generation (str): The LLM's generated answer.
-
-    Returns:
-        dict: A dictionary containing the question, generation, and its grade ('yes' or 'no').
-    """
+def build_answer_grader(llm_chat):
+    """Builds the answer grading chain: prompt → structured LLM grader."""
     # Define the structured LLM grader
     structured_llm_grader = llm_chat.with_structured_output(GradeAnswer)
 
@@ -37,7 +29,22 @@ def grade_answer(llm_chat, question, generation):
     )
 
     # Combine the prompt and the structured LLM grader
-    answer_grader = answer_prompt | structured_llm_grader
+    return answer_prompt | structured_llm_grader
+
+
+def grade_answer(llm_chat, question, generation):
+    """
+    Grades whether an LLM-generated answer addresses the user's question.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        question (str): The user's question.
+        generation (str): The LLM's generated answer.
+
+    Returns:
+        dict: A dictionary containing the question, generation, and its grade ('yes' or 'no').
+    """
+    answer_grader = cached_chain("answer_grader", llm_chat, build_answer_grader)
 
     # Invoke the answer grader
     grading_result = answer_grader.invoke({"question": question, "generation": generation})
@@ -49,6 +56,28 @@ def grade_answer(llm_chat, question, generation):
     }
 
 
+async def agrade_answer(llm_chat, question, generation):
+    """
+    Async variant of `grade_answer`.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        question (str): The user's question.
+        generation (str): The LLM's generated answer.
+
+    Returns:
+        dict: A dictionary containing the question, generation, and its grade ('yes' or 'no').
+    """
+    answer_grader = cached_chain("answer_grader", llm_chat, build_answer_grader)
+    grading_result = await answer_grader.ainvoke({"question": question, "generation": generation})
+
+    return {
+        "question": question,
+        "generation": generation,
+        "answer_grade": grading_result.binary_score
+    }
+
+
 # Usage Example:
 # graded_result = grade_answer(llm_chat, "What is AI?", "AI is artificial intelligence.")
 # print(graded_result)
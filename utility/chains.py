@@ -0,0 +1,61 @@
+import threading
+
+_chains = {}
+_lock = threading.Lock()
+
+
+def cached_chain(name, llm, builder):
+    """
+    Returns the chain `name` built for `llm`, building it on first use.
+
+    Chains are immutable runnables, so one instance per (chain, model) is shared by every
+    call and every concurrent request.
+
+    Args:
+        name (str): Name of the chain in the registry.
+        llm: The model the chain is bound to.
+        builder (callable): Builds the chain from the model.
+
+    Returns:
+        Runnable: The prebuilt chain.
+    """
+    key = (name, id(llm))
+    entry = _chains.get(key)
+    # The entry holds the model itself, so a reused id() cannot alias another model
+    if entry is None or entry[0] is not llm:
+        with _lock:
+            entry = _chains.get(key)
+            if entry is None or entry[0] is not llm:
+                entry = (llm, builder(llm))
+                _chains[key] = entry
+    return entry[1]
+
+
+def warm_chains(llm_chat, llm_resoner):
+    """
+    Builds every chain the workflow uses, so no request pays for chain setup.
+
+    Args:
+        llm_chat: The chat model used for grading.
+        llm_resoner: The reasoning model used for generation and query rewriting.
+    """
+    from utility.answer_grader import build_answer_grader
+    from utility.document_grader import build_batch_retrieval_grader, build_retrieval_grader
+    from utility.generate import build_rag_chain
+    from utility.generation_grader import build_generation_grader
+    from utility.grade_hallucinations import build_hallucination_grader
+    from utility.rewrite_questions import build_question_rewriter
+
+    cached_chain("answer_grader", llm_chat, build_answer_grader)
+    cached_chain("retrieval_grader", llm_chat, build_retrieval_grader)
+    cached_chain("batch_retrieval_grader", llm_chat, build_batch_retrieval_grader)
+    cached_chain("generation_grader", llm_chat, build_generation_grader)
+    cached_chain("hallucination_grader", llm_chat, build_hallucination_grader)
+    cached_chain("rag_chain", llm_resoner, build_rag_chain)
+    cached_chain("question_rewriter", llm_resoner, build_question_rewriter)
+
+
+def clear_chains():
+    """Drops every prebuilt chain."""
+    with _lock:
+        _chains.clear()
@@ -0,0 +1,226 @@
+import json
+import re
+
+import pdfplumber
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Chunking strategies
+CHARACTER = "character"
+TOKEN = "token"
+SENTENCE = "sentence"
+LAYOUT = "layout"
+CHUNKING_STRATEGIES = (CHARACTER, TOKEN, SENTENCE, LAYOUT)
+
+# Default (chunk_size, chunk_overlap) per strategy; sizes are tokens for "token", characters otherwise
+DEFAULT_SIZES = {
+    CHARACTER: (500, 0),
+    TOKEN: (256, 32),
+    SENTENCE: (1000, 150),
+    LAYOUT: (1000, 150),
+}
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def pdf_page_metadata(pdf_path, doc, page):
+    """
+    Builds the metadata `PDFPlumberLoader` attaches to a page.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        doc (pdfplumber.PDF): The open PDF.
+        page (pdfplumber.page.Page): The page.
+
+    Returns:
+        dict: Source, page number, page count and the PDF's own string/int metadata.
+    """
+    source = str(pdf_path)
+    doc_metadata = {k: doc.metadata[k] for k in doc.metadata if type(doc.metadata[k]) in [str, int]}
+    return dict(
+        {
+            "source": source,
+            "file_path": source,
+            "page": page.page_number - 1,
+            "total_pages": len(doc.pages),
+        },
+        **doc_metadata,
+    )
+
+
+def split_sentences(text):
+    """Splits text into sentences on terminal punctuation followed by a capital or digit."""
+    sentences = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = " ".join(paragraph.split())
+        if paragraph:
+            sentences.extend(sentence for sentence in _SENTENCE_END_RE.split(paragraph) if sentence)
+    return sentences
+
+
+def pack_sentences(sentences, chunk_size, chunk_overlap):
+    """
+    Packs whole sentences into chunks of at most `chunk_size` characters.
+
+    Each chunk repeats the trailing sentences of the previous one, up to `chunk_overlap`
+    characters and as far as the next sentence leaves room. A single sentence longer than
+    `chunk_size` becomes a chunk of its own.
+
+    Args:
+        sentences (list): The sentences, in order.
+        chunk_size (int): Maximum chunk length in characters.
+        chunk_overlap (int): Maximum overlap between consecutive chunks in characters.
+
+    Returns:
+        list: The chunk texts.
+    """
+    chunks = []
+    current, length = [], 0
+    for sentence in sentences:
+        if current and length + 1 + len(sentence) > chunk_size:
+            chunks.append(" ".join(current))
+            overlap, overlap_length = [], 0
+            for previous in reversed(current):
+                if overlap_length + len(previous) + 1 > chunk_overlap:
+                    break
+                overlap.insert(0, previous)
+                overlap_length += len(previous) + 1
+            # Drop the oldest repeated sentences until the next one fits
+            while overlap and overlap_length + len(sentence) > chunk_size:
+                overlap_length -= len(overlap.pop(0)) + 1
+            current, length = overlap, max(0, overlap_length - 1)
+        current.append(sentence)
+        length += len(sentence) + (1 if len(current) > 1 else 0)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class Chunker:
+    """
+    Splits a PDF into the chunks that get embedded, one page at a time.
+
+    Chunks never cross a page boundary. `iter_chunks` is a generator, so indexing can
+    embed the first chunks while later pages are still being parsed and split. Every
+    chunk records its strategy and its position on the page in its metadata.
+    """
+    def __init__(self, strategy=CHARACTER, chunk_size=None, chunk_overlap=None):
+        """
+        Initializes the chunker.
+
+        Args:
+            strategy (str): "character", "token", "sentence" or "layout".
+            chunk_size (int, optional): Chunk size; tokens for "token", characters otherwise.
+            chunk_overlap (int, optional): Overlap between consecutive chunks, in the same unit.
+        """
+        if strategy not in CHUNKING_STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy {strategy!r}; expected one of {', '.join(CHUNKING_STRATEGIES)}.")
+        default_size, default_overlap = DEFAULT_SIZES[strategy]
+        self.strategy = strategy
+        self.chunk_size = chunk_size or default_size
+        self.chunk_overlap = default_overlap if chunk_overlap is None else chunk_overlap
+
+        if strategy == TOKEN:
+            self._splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                encoding_name="cl100k_base", chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+            )
+        else:
+            self._splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a chunker from the dict returned by `config`."""
+        return cls(**config)
+
+    @property
+    def config(self):
+        """The settings of this chunker, as recorded with the index."""
+        return {"strategy": self.strategy, "chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+
+    def config_json(self):
+        """The settings serialized for storage, with a stable key order."""
+        return json.dumps(self.config, sort_keys=True)
+
+    @property
+    def reads_pdf(self):
+        """True if the strategy needs the PDF's layout rather than the extracted page text."""
+        return self.strategy == LAYOUT
+
+    def split_text(self, text):
+        """
+        Splits the text of one page.
+
+        Args:
+            text (str): The page text.
+
+        Returns:
+            list: The chunk texts.
+        """
+        if self.strategy in (SENTENCE, LAYOUT):
+            return pack_sentences(split_sentences(text), self.chunk_size, self.chunk_overlap)
+        return self._splitter.split_text(text)
+
+    def iter_chunks(self, pages):
+        """
+        Splits page Documents into chunks, lazily.
+
+        Args:
+            pages (iterable): One Document per page, e.g. from `DocumentProcessingPipeline.iter_pages`.
+
+        Yields:
+            Document: The next chunk, with the page's metadata.
+        """
+        for page in pages:
+            for index, text in enumerate(self.split_text(page.page_content)):
+                yield self._chunk(text, page.metadata, index)
+
+    def iter_pdf_chunks(self, pdf_path):
+        """
+        Splits a PDF into chunks straight from its layout.
+
+        Tables found by pdfplumber become chunks of their own, rendered row by row; when a
+        table is too long it is split between rows and every piece repeats the header row.
+        The text around the tables is packed sentence by sentence. Pages are read one at a
+        time in this process, so the pipeline's `parse_workers` do not apply.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Yields:
+            Document: The next chunk.
+        """
+        with pdfplumber.open(pdf_path) as doc:
+            for page in doc.pages:
+                metadata = pdf_page_metadata(pdf_path, doc, page)
+                tables = page.find_tables()
+                text_page = page
+                for table in tables:
+                    text_page = text_page.outside_bbox(table.bbox, strict=False)
+
+                index = 0
+                for text in self.split_text(text_page.extract_text() or ""):
+                    yield self._chunk(text, metadata, index)
+                    index += 1
+                for table in tables:
+                    for text in self._split_table(table.extract()):
+                        yield self._chunk(text, dict(metadata, content_type="table"), index)
+                        index += 1
+                page.close()
+
+    def _split_table(self, rows):
+        lines = [" | ".join((cell or "").strip() for cell in row) for row in rows if any(row)]
+        if not lines:
+            return []
+        header, body = lines[0], lines[1:]
+        pieces, current = [], [header]
+        for line in body:
+            if len(current) > 1 and len("\n".join(current)) + 1 + len(line) > self.chunk_size:
+                pieces.append("\n".join(current))
+                current = [header]
+            current.append(line)
+        pieces.append("\n".join(current))
+        return pieces
+
+    def _chunk(self, text, metadata, index):
+        return Document(page_content=text, metadata=dict(metadata, chunk_index=index, chunk_strategy=self.strategy))
@@ -0,0 +1,182 @@
+import re
+
+from utility.documents import chunk_id_of
+
+_WORD_RE = re.compile(r"\w+")
+
+# Shortest run of text treated as the overlap between two adjacent chunks
+_MIN_OVERLAP_CHARS = 20
+
+
+def estimate_tokens(text):
+    """Estimates the token count of English text, at roughly four characters per token."""
+    return (len(text) + 3) // 4
+
+
+def _shingles(text, size=3):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _join_overlapping(left, right):
+    """Joins two consecutive chunks, dropping the text the splitter repeated between them."""
+    longest = min(len(left), len(right))
+    for size in range(longest, _MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+class PackedContext:
+    """The context assembled for one prompt."""
+    def __init__(self, text, documents, tokens, input_tokens):
+        """
+        Args:
+            text (str): The context, ready to go into the prompt.
+            documents (list): The (possibly merged) chunks it is made of, most relevant first.
+            tokens (int): Estimated tokens of `text`.
+            input_tokens (int): Estimated tokens of the chunks before packing.
+        """
+        self.text = text
+        self.documents = documents
+        self.tokens = tokens
+        self.input_tokens = input_tokens
+
+
+class ContextPacker:
+    """
+    Assembles the retrieved chunks into a prompt context within a token budget.
+
+    Repeated and near-duplicate chunks are dropped, consecutive chunks of the same page
+    are merged (removing the text the splitter repeated between them), and the result
+    is packed most relevant first until the budget of the model it is sent to is spent.
+    Relevance is the reranker's `relevance_score` when present, else retrieval order.
+    """
+    def __init__(self, budgets=None, default_budget=None, similarity_threshold=0.9, token_counter=estimate_tokens):
+        """
+        Initializes the packer.
+
+        Args:
+            budgets (dict, optional): Context token budget per model name.
+            default_budget (int, optional): Budget of models not in `budgets`; None means no limit.
+            similarity_threshold (float): Shingle overlap above which a chunk counts as a near duplicate.
+            token_counter (callable): Estimates the tokens of a string.
+        """
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
+        self.similarity_threshold = similarity_threshold
+        self.token_counter = token_counter
+
+    def budget_for(self, llm):
+        """Returns the context budget of a chat model, or None for no limit."""
+        model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+        return self.budgets.get(model_name, self.default_budget) or None
+
+    def _rank(self, documents):
+        ranked = []
+        for position, doc in enumerate(documents):
+            score = doc.metadata.get("relevance_score")
+            ranked.append((doc, -position if score is None else score, position))
+        ranked.sort(key=lambda item: (-item[1], item[2]))
+        return ranked
+
+    def _deduplicate(self, ranked):
+        kept = []
+        seen_ids = set()
+        kept_shingles = []
+        for doc, score, position in ranked:
+            chunk_id = chunk_id_of(doc)
+            if chunk_id in seen_ids:
+                continue
+            shingles = _shingles(doc.page_content)
+            duplicate = False
+            for other_doc, other in zip((item[0] for item in kept), kept_shingles):
+                if doc.page_content in other_doc.page_content:
+                    duplicate = True
+                    break
+                overlap = len(shingles & other) / (min(len(shingles), len(other)) or 1)
+                if overlap >= self.similarity_threshold:
+                    duplicate = True
+                    break
+            if duplicate:
+                continue
+            seen_ids.add(chunk_id)
+            kept.append((doc, score, position))
+            kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def _merge_adjacent(ranked):
+        def place(doc):
+            metadata = doc.metadata
+            return metadata.get("pdf_name", metadata.get("source")), metadata.get("page"), metadata.get("chunk_index")
+
+        # Runs of consecutive chunks of the same page become one unit, as relevant as its best chunk
+        by_place = sorted(
+            (item for item in ranked if place(item[0])[2] is not None),
+            key=lambda item: (str(place(item[0])[0]), str(place(item[0])[1]), place(item[0])[2]),
+        )
+        units = [(doc, score, position) for doc, score, position in ranked if place(doc)[2] is None]
+        run = []
+        for item in by_place:
+            if run:
+                document, page, index = place(run[-1][0])
+                if (document, page) != place(item[0])[:2] or place(item[0])[2] != index + 1:
+                    units.append(ContextPacker._merged(run))
+                    run = []
+            run.append(item)
+        if run:
+            units.append(ContextPacker._merged(run))
+        units.sort(key=lambda item: (-item[1], item[2]))
+        return units
+
+    @staticmethod
+    def _merged(run):
+        if len(run) == 1:
+            return run[0]
+        text = run[0][0].page_content
+        for doc, _, _ in run[1:]:
+            text = _join_overlapping(text, doc.page_content)
+        first = run[0][0]
+        merged = first.model_copy(update={
+            "page_content": text,
+            "metadata": dict(first.metadata, merged_chunks=len(run)),
+        })
+        return merged, max(item[1] for item in run), min(item[2] for item in run)
+
+    def pack(self, documents, budget=None):
+        """
+        Packs chunks into a context.
+
+        Args:
+            documents (list): The relevant chunks, in retrieval order.
+            budget (int, optional): Token budget of the context; None means no limit.
+
+        Returns:
+            PackedContext: The context. When even the most relevant chunk is over budget,
+                it is cut down to fit rather than leaving the context empty.
+        """
+        input_tokens = sum(self.token_counter(doc.page_content) for doc in documents)
+        units = self._merge_adjacent(self._deduplicate(self._rank(documents)))
+
+        selected = []
+        used = 0
+        separator = self.token_counter("\n\n")
+        for doc, _, _ in units:
+            tokens = self.token_counter(doc.page_content)
+            cost = tokens + (separator if selected else 0)
+            if budget is not None and used + cost > budget:
+                continue
+            selected.append(doc)
+            used += cost
+        if not selected and units:
+            # Keep the start of the best chunk, cut at a word boundary
+            doc = units[0][0]
+            text = doc.page_content[:max(0, budget) * 4].rsplit(" ", 1)[0]
+            selected.append(doc.model_copy(update={"page_content": text}))
+            used = self.token_counter(text)
+
+        text = "\n\n".join(doc.page_content for doc in selected)
+        return PackedContext(text, selected, used, input_tokens)
@@ -1,12 +1,47 @@
-import sqlite3
+import threading
+import time
+
+from utility.metadata_store import MetadataStore
+from utility.telemetry import logger
 
 # Constants
 DB_PATH = "pipelines.db"
 
+# Ingestion job states
+JOB_QUEUED = "queued"
+JOB_PARSING = "parsing"
+JOB_EMBEDDING = "embedding"
+JOB_READY = "ready"
+JOB_FAILED = "failed"
+PENDING_JOB_STATES = (JOB_QUEUED, JOB_PARSING, JOB_EMBEDDING)
+
+_store = None
+_store_lock = threading.Lock()
+
+# Questions per PDF not yet written: pdf_name -> (count, time of the latest)
+_pending_asks = {}
+_asks_lock = threading.Lock()
+
 # Database helper functions
+def get_store():
+    """Return the shared metadata store of DB_PATH, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.db_path != DB_PATH:
+            if _store is not None:
+                _store.close()
+            _store = MetadataStore(DB_PATH)
+        return _store
+
+def _ensure_column(cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table if an older database lacks it."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
 def init_db():
-    """Initialize the SQLite database."""
-    with sqlite3.connect(DB_PATH) as conn:
+    """Initialize the SQLite database, switching it to WAL journaling."""
+    with get_store().transaction() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS pipelines (
@@ -15,23 +50,232 @@ def init_db():
                 pdf_path TEXT
             )
         """)
-        conn.commit()
+        # Fingerprint of the file contents the vectorstore was last built from
+        _ensure_column(cursor, "pipelines", "file_hash", "TEXT")
+        # "vector" or "hybrid" retrieval for questions about the PDF
+        _ensure_column(cursor, "pipelines", "retrieval_mode", "TEXT")
+        # Chunking settings (JSON) requested for the PDF, and those its index was built with
+        _ensure_column(cursor, "pipelines", "chunking", "TEXT")
+        _ensure_column(cursor, "pipelines", "indexed_chunking", "TEXT")
+        # SHA-256 computed while the latest upload streamed to disk
+        _ensure_column(cursor, "pipelines", "upload_hash", "TEXT")
+        # Stats of the current index
+        _ensure_column(cursor, "pipelines", "chunk_count", "INTEGER")
+        _ensure_column(cursor, "pipelines", "page_count", "INTEGER")
+        _ensure_column(cursor, "pipelines", "indexed_at", "REAL")
+        # Questions asked about the PDF, used to pre-open popular pipelines at startup
+        _ensure_column(cursor, "pipelines", "ask_count", "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cursor, "pipelines", "last_asked_at", "REAL")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_fingerprints (
+                pdf_name TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (pdf_name, chunk_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                pdf_name TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ingestion_jobs_status ON ingestion_jobs (status, created_at)")
+    get_store().invalidate()
 
-def store_pipeline_metadata(pdf_name: str, pdf_path: str, vectorstore_path: str):
-    """Store pipeline metadata in SQLite database."""
-    with sqlite3.connect(DB_PATH) as conn:
+def store_pipeline_metadata(pdf_name: str, pdf_path: str, vectorstore_path: str, retrieval_mode: str = None,
+                            chunking: str = None, upload_hash: str = None):
+    """Store pipeline metadata in SQLite database; a None retrieval mode or chunking keeps the stored one."""
+    with get_store().transaction() as conn:
         cursor = conn.cursor()
+        # Keep the fingerprint of the indexed version so a re-upload can be diffed against it,
+        # and the settings chosen earlier when a re-upload does not choose them again
         cursor.execute("""
-            INSERT OR REPLACE INTO pipelines (pdf_name, pdf_path, vectorstore_path)
-            VALUES (?, ?, ?)
-        """, (pdf_name, pdf_path, vectorstore_path))
-        conn.commit()
+            INSERT INTO pipelines (pdf_name, pdf_path, vectorstore_path, retrieval_mode, chunking, upload_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(pdf_name) DO UPDATE SET
+                pdf_path = excluded.pdf_path, vectorstore_path = excluded.vectorstore_path,
+                retrieval_mode = COALESCE(excluded.retrieval_mode, pipelines.retrieval_mode),
+                chunking = COALESCE(excluded.chunking, pipelines.chunking),
+                upload_hash = excluded.upload_hash
+        """, (pdf_name, pdf_path, vectorstore_path, retrieval_mode, chunking, upload_hash))
+    get_store().invalidate(pdf_name)
+
+def _pipeline_field(pdf_name: str, column: str):
+    row = get_store().pipeline(pdf_name)
+    return row[column] if row else None
 
 def get_pipeline_metadata(pdf_name: str):
-    """Retrieve pipeline metadata from SQLite database."""
-    with sqlite3.connect(DB_PATH) as conn:
+    """Retrieve the (pdf_path, vectorstore_path) of a PDF, or None; served from the in-memory cache."""
+    row = get_store().pipeline(pdf_name)
+    return (row["pdf_path"], row["vectorstore_path"]) if row else None
+
+def get_index_stats(pdf_name: str):
+    """Retrieve the chunk count, page count and build time of the PDF's index, or None."""
+    row = get_store().pipeline(pdf_name)
+    if row is None:
+        return None
+    return {"chunk_count": row["chunk_count"], "page_count": row["page_count"], "indexed_at": row["indexed_at"]}
+
+def list_pipelines():
+    """List the (pdf_name, pdf_path, vectorstore_path) of every uploaded PDF."""
+    with get_store().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT pdf_name, pdf_path, vectorstore_path FROM pipelines ORDER BY pdf_name
+        """)
+        return [tuple(row) for row in cursor.fetchall()]
+
+def list_frequent_pipelines(limit: int):
+    """List the (pdf_name, pdf_path, vectorstore_path) of the most-asked indexed PDFs, most asked first."""
+    with get_store().connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT pdf_path, vectorstore_path FROM pipelines WHERE pdf_name = ?
+            SELECT p.pdf_name, p.pdf_path, p.vectorstore_path FROM pipelines p
+            JOIN ingestion_jobs j ON j.pdf_name = p.pdf_name
+            WHERE j.status = ? AND p.ask_count > 0
+            ORDER BY p.ask_count DESC, p.last_asked_at DESC
+            LIMIT ?
+        """, (JOB_READY, limit))
+        return [tuple(row) for row in cursor.fetchall()]
+
+def record_ask(pdf_name: str):
+    """Count a question about a PDF in memory; `flush_asks` writes the counts to the database."""
+    with _asks_lock:
+        count, _ = _pending_asks.get(pdf_name, (0, None))
+        _pending_asks[pdf_name] = (count + 1, time.time())
+
+def flush_asks():
+    """Write the question counts recorded since the last flush, in one transaction; returns the PDFs updated."""
+    global _pending_asks
+    with _asks_lock:
+        pending, _pending_asks = _pending_asks, {}
+    if not pending:
+        return 0
+    try:
+        # Only startup ordering reads the count, so the cached rows are left as is
+        with get_store().transaction() as conn:
+            conn.executemany("""
+                UPDATE pipelines SET ask_count = ask_count + ?, last_asked_at = ? WHERE pdf_name = ?
+            """, [(count, asked_at, pdf_name) for pdf_name, (count, asked_at) in pending.items()])
+    except Exception:
+        # Keep the counts for the next flush
+        with _asks_lock:
+            for pdf_name, (count, asked_at) in pending.items():
+                newer_count, newer_at = _pending_asks.get(pdf_name, (0, asked_at))
+                _pending_asks[pdf_name] = (count + newer_count, max(asked_at, newer_at))
+        raise
+    return len(pending)
+
+def start_ask_flusher(interval: float):
+    """Start a daemon thread running `flush_asks` every `interval` seconds."""
+    def flush_periodically():
+        while True:
+            time.sleep(interval)
+            try:
+                flush_asks()
+            except Exception as e:
+                logger.warning("Writing the question counts failed: %s", e)
+
+    thread = threading.Thread(target=flush_periodically, name="ask-count-flusher", daemon=True)
+    thread.start()
+    return thread
+
+def get_indexed_file_hash(pdf_name: str):
+    """Retrieve the fingerprint of the file the vectorstore was built from, or None."""
+    return _pipeline_field(pdf_name, "file_hash")
+
+def get_upload_hash(pdf_name: str):
+    """Retrieve the checksum of the latest upload of a PDF, or None."""
+    return _pipeline_field(pdf_name, "upload_hash")
+
+def get_retrieval_mode(pdf_name: str):
+    """Retrieve the retrieval mode chosen for a PDF, or None for the server default."""
+    return _pipeline_field(pdf_name, "retrieval_mode")
+
+def get_chunking(pdf_name: str):
+    """Retrieve the chunking settings (JSON) chosen for a PDF, or None for the server default."""
+    return _pipeline_field(pdf_name, "chunking")
+
+def get_indexed_chunking(pdf_name: str):
+    """Retrieve the chunking settings (JSON) the vectorstore was built with, or None."""
+    return _pipeline_field(pdf_name, "indexed_chunking")
+
+def get_chunk_fingerprints(pdf_name: str):
+    """Retrieve the set of chunk ids currently indexed for a PDF."""
+    with get_store().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT chunk_id FROM chunk_fingerprints WHERE pdf_name = ?
+        """, (pdf_name,))
+        return {row[0] for row in cursor.fetchall()}
+
+def clear_index_fingerprints(pdf_name: str):
+    """Forget the chunk ids and file fingerprint of an index that no longer holds the PDF's chunks."""
+    with get_store().transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM chunk_fingerprints WHERE pdf_name = ?", (pdf_name,))
+        cursor.execute("UPDATE pipelines SET file_hash = NULL WHERE pdf_name = ?", (pdf_name,))
+    get_store().invalidate(pdf_name)
+
+def store_index_fingerprints(pdf_name: str, file_hash: str, chunk_ids, chunking: str = None,
+                             page_count: int = None):
+    """Record the file fingerprint, chunking settings, chunk ids and stats of a freshly (re)built index."""
+    chunk_ids = set(chunk_ids)
+    with get_store().transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM chunk_fingerprints WHERE pdf_name = ?", (pdf_name,))
+        cursor.executemany("""
+            INSERT OR IGNORE INTO chunk_fingerprints (pdf_name, chunk_id) VALUES (?, ?)
+        """, [(pdf_name, chunk_id) for chunk_id in chunk_ids])
+        cursor.execute("""
+            UPDATE pipelines SET file_hash = ?, indexed_chunking = ?, chunk_count = ?, page_count = ?, indexed_at = ?
+            WHERE pdf_name = ?
+        """, (file_hash, chunking, len(chunk_ids), page_count, time.time(), pdf_name))
+    get_store().invalidate(pdf_name)
+
+def enqueue_ingestion_job(pdf_name: str):
+    """Create or reset the ingestion job of a PDF to the queued state."""
+    now = time.time()
+    with get_store().transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO ingestion_jobs (pdf_name, status, error, created_at, updated_at)
+            VALUES (?, ?, NULL, ?, ?)
+            ON CONFLICT(pdf_name) DO UPDATE SET
+                status = excluded.status, error = NULL,
+                created_at = excluded.created_at, updated_at = excluded.updated_at
+        """, (pdf_name, JOB_QUEUED, now, now))
+
+def update_ingestion_status(pdf_name: str, status: str, error: str = None):
+    """Update the state (and error message) of an ingestion job."""
+    with get_store().transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE ingestion_jobs SET status = ?, error = ?, updated_at = ? WHERE pdf_name = ?
+        """, (status, error, time.time(), pdf_name))
+
+def get_ingestion_job(pdf_name: str):
+    """Retrieve the ingestion job of a PDF as a dict, or None."""
+    with get_store().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT pdf_name, status, error, created_at, updated_at FROM ingestion_jobs WHERE pdf_name = ?
         """, (pdf_name,))
-        return cursor.fetchone()
\ No newline at end of file
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(("pdf_name", "status", "error", "created_at", "updated_at"), row))
+
+def list_pending_ingestion_jobs():
+    """List the PDF names of jobs that were queued or running, oldest first."""
+    with get_store().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT pdf_name FROM ingestion_jobs
+            WHERE status IN ({",".join("?" * len(PENDING_JOB_STATES))})
+            ORDER BY created_at
+        """, PENDING_JOB_STATES)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,6 +1,17 @@
+import asyncio
+from typing import List
+
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
+from utility.chains import cached_chain
+from utility.documents import chunk_id_of
+from utility.telemetry import logger
+
+# Grading modes
+PER_DOCUMENT = "per_document"
+SINGLE_CALL = "single_call"
+
 
 class GradeDocuments(BaseModel):
     """Binary score for relevance check on retrieved documents."""
@@ -10,47 +21,131 @@ class GradeDocuments(BaseModel):
     )
 
 
-def grade_document_relevance(llm_chat, retriever, question):
-    """
-    Grades the relevance of a retrieved document to a user question using a structured LLM.
+class GradeDocumentsBatch(BaseModel):
+    """Binary scores for relevance check on a numbered list of retrieved documents."""
 
-    Args:
-        llm_chat: The LLM instance with structured output capabilities.
-        retriever: The document retriever.
-        question (str): The user's query.
+    binary_scores: List[str] = Field(
+        description="One score per document, in the order given: 'yes' if relevant to the question, 'no' otherwise"
+    )
+
+
+# Define the system prompt for grading
+SYSTEM_PROMPT = """You are a grader assessing relevance of a retrieved document to a user question. \n 
+    It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+    If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
+    Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
+
+BATCH_SYSTEM_PROMPT = """You are a grader assessing relevance of retrieved documents to a user question. \n 
+    It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+    If a document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
+    Give one binary score 'yes' or 'no' per document, in the same order as the documents are numbered."""
 
-    Returns:
-        dict: A dictionary with the document content and its binary relevance score.
-    """
-    # Define the structured LLM grader
-    structured_llm_grader = llm_chat.with_structured_output(GradeDocuments)
 
-    # Define the system prompt for grading
-    system = """You are a grader assessing relevance of a retrieved document to a user question. \n 
-        It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
-        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
-        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
+def build_retrieval_grader(llm_chat):
+    """Builds the per-document grading chain: prompt → structured LLM grader."""
+    structured_llm_grader = llm_chat.with_structured_output(GradeDocuments)
     grade_prompt = ChatPromptTemplate.from_messages(
         [
-            ("system", system),
+            ("system", SYSTEM_PROMPT),
             ("human", "Retrieved document: \n\n {document} \n\n User question: {question}"),
         ]
     )
+    return grade_prompt | structured_llm_grader
 
-    # Combine the prompt and the structured LLM grader
-    retrieval_grader = grade_prompt | structured_llm_grader
 
-    # Retrieve documents
-    docs = retriever.get_relevant_documents(question)
+def build_batch_retrieval_grader(llm_chat):
+    """Builds the single-call grading chain that scores every document in one response."""
+    structured_llm_grader = llm_chat.with_structured_output(GradeDocumentsBatch)
+    grade_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", BATCH_SYSTEM_PROMPT),
+            ("human", "Retrieved documents: \n\n {documents} \n\n User question: {question}"),
+        ]
+    )
+    return grade_prompt | structured_llm_grader
+
+
+def grade_document_relevance(llm_chat, documents, question):
+    """
+    Grades the relevance of retrieved documents to a user question using a structured LLM.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        documents (list): The documents already retrieved for the question.
+        question (str): The user's query.
+
+    Returns:
+        list: Dictionaries with the chunk id, document content and binary relevance score.
+    """
+    # Combine the prompt and the structured LLM grader
+    retrieval_grader = cached_chain("retrieval_grader", llm_chat, build_retrieval_grader)
 
     # Grade each document
     graded_results = []
-    for doc in docs:
-        document_text = doc.page_content
-        grading_result = retrieval_grader.invoke({"question": question, "document": document_text})
-        graded_results.append({
-            "document": document_text,
-            "relevance_score": grading_result.binary_score
-        })
-
-    return graded_results
\ No newline at end of file
+    for doc in documents:
+        grading_result = retrieval_grader.invoke({"question": question, "document": doc.page_content})
+        graded_results.append(_graded(doc, grading_result.binary_score))
+
+    return graded_results
+
+
+async def agrade_document_relevance(llm_chat, documents, question, mode=PER_DOCUMENT, max_concurrency=4):
+    """
+    Grades the retrieved documents concurrently instead of one LLM call after another.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        documents (list): The documents already retrieved for the question.
+        question (str): The user's query.
+        mode (str): "per_document" grades each document in its own call, at most
+            `max_concurrency` at a time; "single_call" grades all of them in one response.
+        max_concurrency (int): Upper bound on in-flight grading calls in per-document mode.
+
+    Returns:
+        list: Dictionaries with the chunk id, document content and binary relevance score.
+    """
+    if not documents:
+        return []
+
+    if mode == SINGLE_CALL:
+        batch_grader = cached_chain("batch_retrieval_grader", llm_chat, build_batch_retrieval_grader)
+        numbered = "\n\n".join(f"Document {i + 1}:\n{doc.page_content}" for i, doc in enumerate(documents))
+        grading_result = await batch_grader.ainvoke({"question": question, "documents": numbered})
+        scores = grading_result.binary_scores
+        if len(scores) == len(documents):
+            return [_graded(doc, score) for doc, score in zip(documents, scores)]
+        # The model lost count; grade the documents individually instead
+        logger.warning("---GRADE DOCUMENTS: expected %d scores, got %d; grading per document---", len(documents), len(scores))
+
+    retrieval_grader = cached_chain("retrieval_grader", llm_chat, build_retrieval_grader)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def grade(doc):
+        async with semaphore:
+            grading_result = await retrieval_grader.ainvoke({"question": question, "document": doc.page_content})
+        return _graded(doc, grading_result.binary_score)
+
+    return list(await asyncio.gather(*(grade(doc) for doc in documents)))
+
+
+def relevant_documents(documents, graded_results):
+    """
+    Keeps the documents graded as relevant, matching them by chunk id.
+
+    Args:
+        documents (list): The graded documents.
+        graded_results (list): The output of `grade_document_relevance`.
+
+    Returns:
+        list: The relevant documents, in their original order.
+    """
+    relevant_ids = {res["chunk_id"] for res in graded_results if res["relevance_score"] == "yes"}
+    return [doc for doc in documents if chunk_id_of(doc) in relevant_ids]
+
+
+def _graded(doc, score):
+    return {
+        "chunk_id": chunk_id_of(doc),
+        "document": doc.page_content,
+        "relevance_score": score.strip().lower(),
+    }
@@ -0,0 +1,21 @@
+import hashlib
+
+
+def chunk_id_of(doc):
+    """
+    Returns a stable identifier for a retrieved chunk.
+
+    Chunks indexed by `DocumentProcessingPipeline` carry their content fingerprint in
+    `metadata["chunk_id"]`; older indexes fall back to the vectorstore id, then to a hash
+    of the page and text.
+
+    Args:
+        doc (Document): The chunk.
+
+    Returns:
+        str: The chunk id.
+    """
+    chunk_id = doc.metadata.get("chunk_id") or getattr(doc, "id", None)
+    if chunk_id:
+        return chunk_id
+    return hashlib.sha256(f"{doc.metadata.get('page')}\0{doc.page_content}".encode("utf-8")).hexdigest()
@@ -0,0 +1,128 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that batches document embedding and caches vectors on disk.
+
+    Vectors are keyed by a hash of the model name and the chunk text, so re-indexing an
+    unchanged or lightly edited PDF only embeds chunks that were never seen before.
+    Identical chunks within a call are embedded once, and misses are embedded in
+    length-sorted batches to keep padding to a minimum.
+    """
+    def __init__(self, embeddings, cache_path="embeddings_cache.db", batch_size=32, model_name=None):
+        """
+        Initializes the wrapper.
+
+        Args:
+            embeddings (Embeddings): The underlying embedding model.
+            cache_path (str): Path of the SQLite file holding cached vectors.
+            batch_size (int): Number of texts sent to the model per call.
+            model_name (str, optional): Name used in the cache key; defaults to the model's `model_name`.
+        """
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.model_name = model_name or getattr(embeddings, "model_name", type(embeddings).__name__)
+
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        self.requested = 0
+        self.cache_hits = 0
+        self.embedded = 0
+        self.embed_seconds = 0.0
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def _store(self, vectors):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in vectors.items()],
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts):
+        """
+        Embeds a list of texts, serving previously seen texts from the cache.
+
+        Args:
+            texts (list): The texts to embed.
+
+        Returns:
+            list: One vector per input text, in input order.
+        """
+        keys = [self._key(text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors = self._lookup(list(unique))
+
+        misses = sorted((key for key in unique if key not in vectors), key=lambda key: len(unique[key]))
+        start = time.perf_counter()
+        for i in range(0, len(misses), self.batch_size):
+            batch = misses[i:i + self.batch_size]
+            embedded = self.embeddings.embed_documents([unique[key] for key in batch])
+            # Round through float32 so fresh and cached vectors are identical
+            fresh = {key: array("f", vector).tolist() for key, vector in zip(batch, embedded)}
+            self._store(fresh)
+            vectors.update(fresh)
+        elapsed = time.perf_counter() - start
+
+        missed = set(misses)
+        with self._lock:
+            self.requested += len(texts)
+            self.cache_hits += sum(1 for key in keys if key not in missed)
+            self.embedded += len(misses)
+            self.embed_seconds += elapsed
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        """Embeds a query; queries are not cached."""
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        """
+        Returns the cache and throughput counters.
+
+        Returns:
+            dict: Texts requested, cache hits, texts embedded, hit rate and embeddings/sec.
+        """
+        with self._lock:
+            return {
+                "requested": self.requested,
+                "cache_hits": self.cache_hits,
+                "embedded": self.embedded,
+                "hit_rate": self.cache_hits / self.requested if self.requested else 0.0,
+                "embed_seconds": self.embed_seconds,
+                "embeddings_per_second": self.embedded / self.embed_seconds if self.embed_seconds else 0.0,
+            }
@@ -1,6 +1,20 @@
-from langchain import hub
 from langchain_core.output_parsers import StrOutputParser
 
+from utility.chains import cached_chain
+from utility.prompts import RAG_PROMPT
+
+
+def format_docs(docs):
+    """Post-processing: joins the documents' text into the context string."""
+    if isinstance(docs, str):
+        return docs
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def build_rag_chain(llm_resoner):
+    """Builds the RAG chain: Prompt → LLM Resoner → Output Parser."""
+    return RAG_PROMPT | llm_resoner | StrOutputParser()
+
 
 def run_rag_chain(llm_resoner, docs, question):
     """
@@ -8,26 +22,31 @@ def run_rag_chain(llm_resoner, docs, question):
 
     Args:
         llm_resoner: The LLM reasoning component.
-        docs (list): A list of documents retrieved as context.
+        docs (list | str): The documents retrieved as context, or the context already packed.
         question (str): The user question to generate a response for.
 
     Returns:
         str: The generated response from the RAG chain.
     """
-    # Pull the prompt from LangChain hub
-    prompt = hub.pull("rlm/rag-prompt")
+    rag_chain = cached_chain("rag_chain", llm_resoner, build_rag_chain)
 
-    # Post-processing: Format the documents
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # Run the chain with the context and question
+    generation = rag_chain.invoke({"context": format_docs(docs), "question": question})
 
-    # Format documents for the chain input
-    formatted_context = format_docs(docs)
+    return generation
 
-    # Chain: Prompt → LLM Resoner → Output Parser
-    rag_chain = prompt | llm_resoner | StrOutputParser()
 
-    # Run the chain with the context and question
-    generation = rag_chain.invoke({"context": formatted_context, "question": question})
+async def arun_rag_chain(llm_resoner, docs, question):
+    """
+    Async variant of `run_rag_chain`.
 
-    return generation
\ No newline at end of file
+    Args:
+        llm_resoner: The LLM reasoning component.
+        docs (list | str): The documents retrieved as context, or the context already packed.
+        question (str): The user question to generate a response for.
+
+    Returns:
+        str: The generated response from the RAG chain.
+    """
+    rag_chain = cached_chain("rag_chain", llm_resoner, build_rag_chain)
+    return await rag_chain.ainvoke({"context": format_docs(docs), "question": question})
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+from utility.answer_grader import agrade_answer, grade_answer
+from utility.chains import cached_chain
+from utility.grade_hallucinations import _format_facts, agrade_hallucination, grade_hallucination
+
+# Generation grading modes
+SEQUENTIAL = "sequential"
+PARALLEL = "parallel"
+COMBINED = "combined"
+
+
+class GradeGeneration(BaseModel):
+    """Binary scores for grounding and usefulness of a generated answer."""
+
+    grounded: str = Field(
+        description="Answer is grounded in the facts, 'yes' or 'no'"
+    )
+    addresses_question: str = Field(
+        description="Answer addresses the question, 'yes' or 'no'"
+    )
+
+
+def build_generation_grader(llm_chat):
+    """Builds the combined grading chain that scores grounding and usefulness in one response."""
+    structured_llm_grader = llm_chat.with_structured_output(GradeGeneration)
+
+    system = """You are a grader assessing an LLM generation against a set of retrieved facts and a user question. \n
+        Give two binary scores 'yes' or 'no'. \n
+        'grounded': 'yes' means that the answer is grounded in / supported by the set of facts. \n
+        'addresses_question': 'yes' means that the answer resolves the question."""
+
+    generation_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system),
+            ("human", "Set of facts: \n\n {documents} \n\n User question: {question} \n\n LLM generation: {generation}"),
+        ]
+    )
+
+    return generation_prompt | structured_llm_grader
+
+
+def _score(value):
+    return value.strip().lower() if value is not None else None
+
+
+def _grades(hallucination_grade, answer_grade, seconds, latency_saved=0.0):
+    return {
+        "hallucination_grade": _score(hallucination_grade),
+        "answer_grade": _score(answer_grade),
+        "seconds": seconds,
+        "latency_saved": latency_saved,
+    }
+
+
+def grade_generation(llm_chat, docs, question, generation, mode=SEQUENTIAL):
+    """
+    Grades whether a generation is grounded in the facts and addresses the question.
+
+    Sync runs have no event loop to overlap the two graders on, so "parallel" grades
+    sequentially here.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        docs (str or list): The set of facts (documents) as context.
+        question (str): The user's question.
+        generation (str): The answer generated by the LLM.
+        mode (str): "sequential", "parallel" or "combined".
+
+    Returns:
+        dict: The hallucination and answer grades ('yes', 'no', or None when not graded)
+            and the seconds spent grading.
+    """
+    start = time.perf_counter()
+    if mode == COMBINED:
+        grading_result = cached_chain("generation_grader", llm_chat, build_generation_grader).invoke(
+            {"documents": _format_facts(docs), "question": question, "generation": generation}
+        )
+        return _grades(grading_result.grounded, grading_result.addresses_question, time.perf_counter() - start)
+
+    hallucination_grade = grade_hallucination(llm_chat, docs, generation)["hallucination_grade"]
+    answer_grade = None
+    if _score(hallucination_grade) == "yes":
+        answer_grade = grade_answer(llm_chat, question, generation)["answer_grade"]
+    return _grades(hallucination_grade, answer_grade, time.perf_counter() - start)
+
+
+async def agrade_generation(llm_chat, docs, question, generation, mode=SEQUENTIAL):
+    """
+    Async variant of `grade_generation`.
+
+    In "parallel" mode both graders start at once. A failing grounding check settles the
+    verdict and cancels the answer grader, which sequential grading would not have run.
+    A failing answer grade waits for the grounding check, since an ungrounded generation
+    is regenerated rather than rewritten; the verdict therefore always matches sequential
+    grading, only sooner.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        docs (str or list): The set of facts (documents) as context.
+        question (str): The user's question.
+        generation (str): The answer generated by the LLM.
+        mode (str): "sequential", "parallel" or "combined".
+
+    Returns:
+        dict: The hallucination and answer grades ('yes', 'no', or None when not graded),
+            the seconds spent grading and, in parallel mode, the seconds saved over grading
+            the two in turn.
+    """
+    start = time.perf_counter()
+    if mode == COMBINED:
+        grading_result = await cached_chain("generation_grader", llm_chat, build_generation_grader).ainvoke(
+            {"documents": _format_facts(docs), "question": question, "generation": generation}
+        )
+        return _grades(grading_result.grounded, grading_result.addresses_question, time.perf_counter() - start)
+
+    if mode != PARALLEL:
+        hallucination_grade = (await agrade_hallucination(llm_chat, docs, generation))["hallucination_grade"]
+        answer_grade = None
+        if _score(hallucination_grade) == "yes":
+            answer_grade = (await agrade_answer(llm_chat, question, generation))["answer_grade"]
+        return _grades(hallucination_grade, answer_grade, time.perf_counter() - start)
+
+    durations = {}
+
+    async def timed(name, coro):
+        began = time.perf_counter()
+        result = await coro
+        durations[name] = time.perf_counter() - began
+        return result
+
+    hallucination_task = asyncio.ensure_future(
+        timed("hallucination", agrade_hallucination(llm_chat, docs, generation))
+    )
+    answer_task = asyncio.ensure_future(
+        timed("answer", agrade_answer(llm_chat, question, generation))
+    )
+    grade_keys = {hallucination_task: "hallucination_grade", answer_task: "answer_grade"}
+    grades = {hallucination_task: None, answer_task: None}
+    pending = set(grades)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                grades[task] = _score(task.result()[grade_keys[task]])
+            if grades[hallucination_task] == "no":
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    hallucination_grade = grades[hallucination_task]
+    answer_grade = grades[answer_task]
+    # Grading in turn would have run the answer grader only after a grounded verdict
+    sequential = durations.get("hallucination", 0.0)
+    if hallucination_grade == "yes":
+        sequential += durations.get("answer", 0.0)
+    return _grades(hallucination_grade, answer_grade, elapsed, max(0.0, sequential - elapsed))
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 
+from utility.chains import cached_chain
+
 
 class GradeHallucinations(BaseModel):
     """Binary score for hallucination present in generation answer."""
@@ -10,18 +12,8 @@ class GradeHallucinations(BaseModel):
     )
 
 
-def grade_hallucination(llm_chat, docs, generation):
-    """
-    Grades whether an LLM-generated answer is grounded in the provided set of facts.
-
-    Args:
-        llm_chat: The LLM instance with structured output capabilities.
-        docs (str or list): The set of facts (documents) as context.
-        generation (str): The answer generated by the LLM.
-
-    Returns:
-        dict: A dictionary containing the generation and its hallucination grade ('yes' or 'no').
-    """
+def build_hallucination_grader(llm_chat):
+    """Builds the hallucination grading chain: prompt → structured LLM grader."""
     # Define the structured LLM grader
     structured_llm_grader = llm_chat.with_structured_output(GradeHallucinations)
 
@@ -37,14 +29,53 @@ def grade_hallucination(llm_chat, docs, generation):
     )
 
     # Combine the prompt and the structured LLM grader
-    hallucination_grader = hallucination_prompt | structured_llm_grader
+    return hallucination_prompt | structured_llm_grader
+
 
+def _format_facts(docs):
     # Convert documents to a string if they are in list format
     if isinstance(docs, list):
         docs = "\n\n".join(doc.page_content for doc in docs)
+    return docs
+
+
+def grade_hallucination(llm_chat, docs, generation):
+    """
+    Grades whether an LLM-generated answer is grounded in the provided set of facts.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        docs (str or list): The set of facts (documents) as context.
+        generation (str): The answer generated by the LLM.
+
+    Returns:
+        dict: A dictionary containing the generation and its hallucination grade ('yes' or 'no').
+    """
+    hallucination_grader = cached_chain("hallucination_grader", llm_chat, build_hallucination_grader)
 
     # Invoke the hallucination grader
-    grading_result = hallucination_grader.invoke({"documents": docs, "generation": generation})
+    grading_result = hallucination_grader.invoke({"documents": _format_facts(docs), "generation": generation})
+
+    return {
+        "generation": generation,
+        "hallucination_grade": grading_result.binary_score
+    }
+
+
+async def agrade_hallucination(llm_chat, docs, generation):
+    """
+    Async variant of `grade_hallucination`.
+
+    Args:
+        llm_chat: The LLM instance with structured output capabilities.
+        docs (str or list): The set of facts (documents) as context.
+        generation (str): The answer generated by the LLM.
+
+    Returns:
+        dict: A dictionary containing the generation and its hallucination grade ('yes' or 'no').
+    """
+    hallucination_grader = cached_chain("hallucination_grader", llm_chat, build_hallucination_grader)
+    grading_result = await hallucination_grader.ainvoke({"documents": _format_facts(docs), "generation": generation})
 
     return {
         "generation": generation,
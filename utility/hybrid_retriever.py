@@ -0,0 +1,68 @@
+from typing import Any, List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utility.documents import chunk_id_of
+
+# Retrieval modes
+VECTOR = "vector"
+HYBRID = "hybrid"
+RETRIEVAL_MODES = (VECTOR, HYBRID)
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """
+    Merges ranked lists of documents with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (rrf_k + rank)) over the lists it appears in, so chunks
+    ranked well by both retrievers rise to the top without comparing raw scores.
+
+    Args:
+        rankings (list): Lists of Documents, best first.
+        rrf_k (int): Rank offset damping the weight of the top positions.
+
+    Returns:
+        list: (Document, fused score) pairs, best first.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            chunk_id = chunk_id_of(doc)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(chunk_id, doc)
+    return [(documents[chunk_id], score) for chunk_id, score in sorted(scores.items(), key=lambda item: -item[1])]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing dense vector search with BM25 keyword search.
+
+    Both searches over-fetch `fetch_k` candidates and the fused top `k` are returned.
+    """
+
+    vectorstore: Any
+    """The Chroma vectorstore of the document."""
+    lexical_index: Any
+    """The `LexicalIndex` built from the same chunks."""
+    search_kwargs: dict = {}
+    """Extra arguments of the dense search, such as a metadata filter."""
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _fuse(self, query, dense):
+        lexical = [doc for doc, _ in self.lexical_index.search(query, k=self.fetch_k)]
+        return [doc for doc, _ in reciprocal_rank_fusion([dense, lexical], rrf_k=self.rrf_k)[:self.k]]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k, **self.search_kwargs)
+        return self._fuse(query, dense)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = await self.vectorstore.asimilarity_search(query, k=self.fetch_k, **self.search_kwargs)
+        return self._fuse(query, dense)
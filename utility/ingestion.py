@@ -0,0 +1,131 @@
+import queue
+import threading
+
+from utility.db_utility import (
+    JOB_FAILED,
+    JOB_READY,
+    enqueue_ingestion_job,
+    list_pending_ingestion_jobs,
+    update_ingestion_status,
+)
+from utility.telemetry import logger
+
+
+class IngestionQueue:
+    """
+    Background worker pool that indexes uploaded PDFs outside the request path.
+
+    Jobs are persisted in the `ingestion_jobs` table, so anything that was queued or
+    running when the process stopped is picked up again by `start()`.
+    """
+    def __init__(self, index_fn, num_workers=2, on_ready=None):
+        """
+        Initializes the queue.
+
+        Args:
+            index_fn (callable): `index_fn(pdf_name, set_status)` builds the index of a PDF,
+                reporting intermediate states through `set_status(status)`.
+            num_workers (int): Number of worker threads.
+            on_ready (callable, optional): Called with the PDF name after a successful job.
+        """
+        self.index_fn = index_fn
+        self.num_workers = num_workers
+        self.on_ready = on_ready
+
+        self._queue = queue.Queue()
+        self._queued = set()
+        # Submissions per PDF; a job only reports status while it is the latest submission
+        self._generations = {}
+        # Per-PDF lock and the number of jobs holding or waiting on it
+        self._running = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        """Starts the worker threads and re-queues jobs left unfinished by a previous run."""
+        for pdf_name in list_pending_ingestion_jobs():
+            self.submit(pdf_name)
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._work, name=f"ingestion-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, pdf_name):
+        """
+        Queues a PDF for indexing. A PDF already waiting in the queue is not queued twice.
+
+        A job still running for an earlier upload of the PDF stops reporting its status, so
+        the `queued` state of the new submission is not overwritten.
+
+        Args:
+            pdf_name (str): Name of the uploaded PDF.
+        """
+        with self._lock:
+            self._generations[pdf_name] = self._generations.get(pdf_name, 0) + 1
+            enqueue_ingestion_job(pdf_name)
+            if pdf_name in self._queued:
+                return
+            self._queued.add(pdf_name)
+        self._queue.put(pdf_name)
+
+    def qsize(self):
+        """Returns the number of jobs waiting for a worker."""
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            pdf_name = self._queue.get()
+            with self._lock:
+                self._queued.discard(pdf_name)
+                generation = self._generations.get(pdf_name, 0)
+                # A re-upload may re-queue a PDF that is still being indexed; run them one at a time.
+                job_lock, users = self._running.get(pdf_name, (threading.Lock(), 0))
+                self._running[pdf_name] = (job_lock, users + 1)
+            try:
+                with job_lock:
+                    self._run_job(pdf_name, generation)
+            finally:
+                with self._lock:
+                    job_lock, users = self._running[pdf_name]
+                    if users == 1:
+                        del self._running[pdf_name]
+                    else:
+                        self._running[pdf_name] = (job_lock, users - 1)
+                self._queue.task_done()
+
+    def _is_current(self, pdf_name, generation):
+        # Called with self._lock held
+        return self._generations.get(pdf_name, 0) == generation
+
+    def _report(self, pdf_name, generation, status, error=None):
+        """Writes the job status unless a newer submission has replaced the job; returns whether it did."""
+        with self._lock:
+            if not self._is_current(pdf_name, generation):
+                return False
+            update_ingestion_status(pdf_name, status, error=error)
+            if status in (JOB_READY, JOB_FAILED):
+                del self._generations[pdf_name]
+            return True
+
+    def _run_job(self, pdf_name, generation):
+        with self._lock:
+            # A newer upload is already queued; its own job will index the current file
+            if not self._is_current(pdf_name, generation):
+                return
+
+        def set_status(status):
+            self._report(pdf_name, generation, status)
+
+        error = None
+        try:
+            self.index_fn(pdf_name, set_status)
+        except Exception as e:
+            logger.exception("Ingestion of %s failed", pdf_name)
+            error = str(e)
+
+        # A newer upload arrived while indexing; leave its job queued rather than report on a stale file.
+        if error is not None:
+            self._report(pdf_name, generation, JOB_FAILED, error=error)
+            return
+        if self._report(pdf_name, generation, JOB_READY) and self.on_ready is not None:
+            self.on_ready(pdf_name)
@@ -0,0 +1,165 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from utility.documents import chunk_id_of
+
+LEXICAL_INDEX_FILE = "lexical_index.json"
+
+# Words, plus identifiers joined by - _ . / such as "AB-1234", "4.2.1" or "BRK.B"
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*")
+
+
+def tokenize(text):
+    """
+    Splits text into lower-cased search terms.
+
+    Compound identifiers are kept whole and also split into their parts, so "AB-1234"
+    matches a query for "AB-1234" as well as one for "1234".
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The terms, in order.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-_./]", token) if part)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks of one document.
+
+    Built at ingest time from the same chunks as the vectorstore and persisted next to it
+    as JSON, so keyword queries (part numbers, clause ids, tickers) can be matched exactly.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        Initializes an empty index.
+
+        Args:
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 document-length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}
+        self.postings = {}
+        self.lengths = {}
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs):
+        """
+        Builds an index over chunks.
+
+        Args:
+            documents (list): The chunks; repeated chunk ids are indexed once.
+
+        Returns:
+            LexicalIndex: The index.
+        """
+        index = cls(**kwargs)
+        for doc in documents:
+            chunk_id = chunk_id_of(doc)
+            if chunk_id in index.chunks:
+                continue
+            terms = Counter(tokenize(doc.page_content))
+            index.chunks[chunk_id] = {"text": doc.page_content, "metadata": doc.metadata}
+            index.lengths[chunk_id] = sum(terms.values())
+            for term, count in terms.items():
+                index.postings.setdefault(term, {})[chunk_id] = count
+        return index
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, where=None, **kwargs):
+        """Builds an index from the chunks stored in a Chroma vectorstore, optionally filtered by `where`."""
+        stored = vectorstore.get(where=where, include=["documents", "metadatas"])
+        documents = [
+            Document(page_content=text or "", metadata=dict(metadata or {}, chunk_id=(metadata or {}).get("chunk_id", chunk_id)))
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        ]
+        return cls.from_documents(documents, **kwargs)
+
+    @staticmethod
+    def path_for(vectorstore_path):
+        """Returns where the lexical index of a vectorstore is persisted."""
+        return os.path.join(vectorstore_path, LEXICAL_INDEX_FILE)
+
+    def save(self, vectorstore_path):
+        """
+        Persists the index next to the vectorstore, replacing any previous version atomically.
+
+        Args:
+            vectorstore_path (str): The vectorstore directory.
+        """
+        os.makedirs(vectorstore_path, exist_ok=True)
+        path = self.path_for(vectorstore_path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "chunks": self.chunks, "postings": self.postings,
+                       "lengths": self.lengths}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, vectorstore_path):
+        """
+        Loads the persisted index of a vectorstore.
+
+        Args:
+            vectorstore_path (str): The vectorstore directory.
+
+        Returns:
+            LexicalIndex or None: The index, or None if none was persisted.
+        """
+        path = cls.path_for(vectorstore_path)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.chunks = data["chunks"]
+        index.postings = data["postings"]
+        index.lengths = data["lengths"]
+        return index
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, k=4):
+        """
+        Ranks chunks against a query with BM25.
+
+        Args:
+            query (str): The query.
+            k (int): Number of chunks to return.
+
+        Returns:
+            list: (Document, score) pairs, best first; chunks matching no term are left out.
+        """
+        if not self.chunks:
+            return []
+        total = len(self.chunks)
+        avg_length = sum(self.lengths.values()) / total or 1.0
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, count in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * count * (self.k1 + 1) / (count + norm)
+        return [
+            (Document(page_content=self.chunks[chunk_id]["text"], metadata=dict(self.chunks[chunk_id]["metadata"])), score)
+            for chunk_id, score in scores.most_common(k)
+        ]
@@ -0,0 +1,133 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class MetadataStore:
+    """
+    Pooled access to the SQLite metadata database.
+
+    Connections are opened once and reused, so each keeps its prepared statements
+    cached between calls. The database runs in WAL mode: readers never wait for the
+    writer, and writers wait up to `busy_timeout_ms` for each other instead of failing
+    with "database is locked". Writes from this process are serialized by a lock.
+
+    Rows of the `pipelines` table are cached in memory on first read and dropped
+    whenever this store writes to them. Writes made by another process are not seen
+    until the entry is invalidated, so run a single API process per database.
+    """
+    def __init__(self, db_path, pool_size=4, busy_timeout_ms=5000, cached_statements=64):
+        """
+        Initializes the store. Connections are opened lazily, up to `pool_size`.
+
+        Args:
+            db_path (str): The SQLite database file.
+            pool_size (int): Maximum number of idle connections kept open.
+            busy_timeout_ms (int): How long a statement waits for a lock before failing.
+            cached_statements (int): Prepared statements cached per connection.
+        """
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._write_lock = threading.Lock()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        # Bumped on every invalidation, so a read that raced a write is not cached
+        self._generation = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a pooled connection for reading.
+
+        Yields:
+            sqlite3.Connection: The connection; returned to the pool afterwards.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Borrows a pooled connection for writing, inside a transaction.
+
+        The transaction is committed when the block exits and rolled back if it raises.
+
+        Yields:
+            sqlite3.Connection: The connection.
+        """
+        with self._write_lock, self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def pipeline(self, pdf_name):
+        """
+        Reads the `pipelines` row of a PDF, through the in-memory cache.
+
+        Args:
+            pdf_name (str): Name of the uploaded PDF.
+
+        Returns:
+            dict or None: The row, or None if the PDF was never uploaded.
+        """
+        with self._cache_lock:
+            if pdf_name in self._cache:
+                return self._cache[pdf_name]
+            generation = self._generation
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM pipelines WHERE pdf_name = ?", (pdf_name,)).fetchone()
+        row = dict(row) if row is not None else None
+        # Unknown names are not cached, so a PDF uploaded by another process shows up
+        if row is not None:
+            with self._cache_lock:
+                if generation == self._generation:
+                    self._cache[pdf_name] = row
+        return row
+
+    def invalidate(self, pdf_name=None):
+        """Drops the cached row of a PDF, or every cached row if `pdf_name` is None."""
+        with self._cache_lock:
+            self._generation += 1
+            if pdf_name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(pdf_name, None)
+
+    def close(self):
+        """Closes the idle connections and clears the cache."""
+        self.invalidate()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict
+
+
+class PipelineCache:
+    """
+    Bounded, thread-safe LRU registry of opened document pipelines keyed by PDF name.
+
+    Entries are evicted least-recently-used first whenever either the entry count or the
+    estimated memory footprint exceeds its limit. Builds for the same key are serialized so
+    that concurrent misses open the vectorstore only once.
+    """
+    def __init__(self, max_entries=32, max_memory_bytes=None, sizeof=None):
+        """
+        Initializes the cache.
+
+        Args:
+            max_entries (int): Maximum number of pipelines kept open.
+            max_memory_bytes (int, optional): Upper bound on the summed size estimates.
+            sizeof (callable, optional): Returns the estimated size in bytes of a cached value.
+        """
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._generations = {}
+        self._build_locks = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Returns the cached value for `key` and marks it as recently used, or None.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def get_or_create(self, key, factory):
+        """
+        Returns the cached value for `key`, building it with `factory()` on a miss.
+
+        Args:
+            key (str): The cache key (the PDF name).
+            factory (callable): Builds the value when it is not cached.
+
+        Returns:
+            The cached or freshly built value.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # Another thread may have finished building while we waited.
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+                generation = self._generations.get(key, 0)
+
+            value = factory()
+            size = self.sizeof(value)
+
+            with self._lock:
+                self._build_locks.pop(key, None)
+                # An invalidation raced with the build; hand out the value but don't keep it.
+                if self._generations.get(key, 0) != generation:
+                    return value
+                self._entries[key] = value
+                self._sizes[key] = size
+                self._evict()
+            return value
+
+    def invalidate(self, key):
+        """
+        Drops the cached value for `key`, e.g. after its PDF has been replaced.
+
+        Returns:
+            bool: True if an entry was removed.
+        """
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            removed = self._entries.pop(key, None) is not None
+            self._sizes.pop(key, None)
+            if removed:
+                self.invalidations += 1
+            return removed
+
+    def clear(self):
+        """Drops every cached value."""
+        with self._lock:
+            for key in self._entries:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+            self._sizes.clear()
+
+    def _evict(self):
+        """Evicts least-recently-used entries until both limits are satisfied. Caller holds the lock."""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_memory_bytes is not None and sum(self._sizes.values()) > self.max_memory_bytes)
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self._sizes.pop(key, None)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Entry count, estimated memory and hit/miss/eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_bytes": sum(self._sizes.values()),
+                "max_memory_bytes": self.max_memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
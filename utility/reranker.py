@@ -0,0 +1,68 @@
+import asyncio
+import math
+
+# Relevance filtering modes
+LLM = "llm"
+RERANK = "rerank"
+
+
+def _sigmoid(logit):
+    # Written to avoid overflowing math.exp for large negative logits
+    if logit >= 0:
+        return 1.0 / (1.0 + math.exp(-logit))
+    z = math.exp(logit)
+    return z / (1.0 + z)
+
+
+class Reranker:
+    """
+    Local cross-encoder relevance filter for retrieved chunks.
+
+    Scores every (question, chunk) pair in one batched forward pass on the CPU, keeps the
+    chunks scoring at least `threshold` and returns the best `top_n` of them. Replaces the
+    per-chunk LLM grading call with no remote calls at all.
+
+    The cross-encoder must return raw logits; the reranker turns them into relevance
+    probabilities in [0, 1] with a sigmoid, so `threshold` is a probability whatever
+    activation the model's own config would apply.
+    """
+    def __init__(self, cross_encoder, threshold=0.1, top_n=4):
+        """
+        Initializes the reranker.
+
+        Args:
+            cross_encoder (BaseCrossEncoder): The loaded cross-encoder model, shared by all requests;
+                its scores are raw logits.
+            threshold (float): Minimum relevance probability for a chunk to be kept.
+            top_n (int): Maximum number of chunks returned.
+        """
+        self.cross_encoder = cross_encoder
+        self.threshold = threshold
+        self.top_n = top_n
+
+    def rerank(self, question, documents):
+        """
+        Reranks retrieved chunks against a question.
+
+        Args:
+            question (str): The user's question.
+            documents (list): The retrieved chunks.
+
+        Returns:
+            list: The relevant chunks, best first, each with its relevance probability in
+                `metadata["relevance_score"]`.
+        """
+        if not documents:
+            return []
+        scores = self.cross_encoder.score([(question, doc.page_content) for doc in documents])
+        ranked = sorted(zip(documents, (_sigmoid(float(score)) for score in scores)), key=lambda pair: -pair[1])
+        relevant = []
+        for doc, score in ranked[:self.top_n]:
+            if score < self.threshold:
+                break
+            relevant.append(doc.model_copy(update={"metadata": dict(doc.metadata, relevance_score=score)}))
+        return relevant
+
+    async def arerank(self, question, documents):
+        """Async variant of `rerank`; runs the forward pass off the event loop."""
+        return await asyncio.to_thread(self.rerank, question, documents)
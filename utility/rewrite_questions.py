@@ -1,18 +1,11 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from utility.chains import cached_chain
 
-def rewrite_question(llm_resoner, question):
-    """
-    Rewrites a given question to optimize it for vectorstore retrieval.
 
-    Args:
-        llm_resoner: The LLM reasoning component.
-        question (str): The initial user question.
-
-    Returns:
-        str: The improved version of the question.
-    """
+def build_question_rewriter(llm_resoner):
+    """Builds the question re-writing chain: prompt → LLM reasoner → output parser."""
     # Define the system prompt for question re-writing
     system = """You are a question re-writer that converts an input question to a better version that is optimized 
         for vectorstore retrieval. Look at the input and try to reason about the underlying semantic intent / meaning."""
@@ -30,7 +23,21 @@ def rewrite_question(llm_resoner, question):
     )
 
     # Combine the re-write prompt with the LLM reasoner and output parser
-    question_rewriter = re_write_prompt | llm_resoner | StrOutputParser()
+    return re_write_prompt | llm_resoner | StrOutputParser()
+
+
+def rewrite_question(llm_resoner, question):
+    """
+    Rewrites a given question to optimize it for vectorstore retrieval.
+
+    Args:
+        llm_resoner: The LLM reasoning component.
+        question (str): The initial user question.
+
+    Returns:
+        str: The improved version of the question.
+    """
+    question_rewriter = cached_chain("question_rewriter", llm_resoner, build_question_rewriter)
 
     # Invoke the re-writer with the input question
     improved_question = question_rewriter.invoke({"question": question})
@@ -38,6 +45,21 @@ def rewrite_question(llm_resoner, question):
     return improved_question
 
 
+async def arewrite_question(llm_resoner, question):
+    """
+    Async variant of `rewrite_question`.
+
+    Args:
+        llm_resoner: The LLM reasoning component.
+        question (str): The initial user question.
+
+    Returns:
+        str: The improved version of the question.
+    """
+    question_rewriter = cached_chain("question_rewriter", llm_resoner, build_question_rewriter)
+    return await question_rewriter.ainvoke({"question": question})
+
+
 # Usage Example:
 # improved = rewrite_question(llm_resoner, "What is the best way to learn machine learning?")
 # print(improved)
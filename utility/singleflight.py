@@ -0,0 +1,123 @@
+import asyncio
+
+
+class FlightCancelled(Exception):
+    """Raised to subscribers of a run that was cancelled before it finished."""
+
+
+class _Flight:
+    """One producer run and the items it has emitted so far."""
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        # Replaced after every item, so a subscriber waits on the event current when it looked
+        self.wakeup = asyncio.Event()
+
+    def publish(self):
+        wakeup, self.wakeup = self.wakeup, asyncio.Event()
+        wakeup.set()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent streams onto one producer.
+
+    The first request for a key starts the producer on its own task; requests for the same
+    key that arrive while it runs attach to it, replaying the items already emitted and
+    then receiving new ones as they come. The producer keeps running when any one
+    subscriber goes away and is cancelled only once none is left. The key is forgotten
+    when the producer finishes or is cancelled, so later requests start a new run.
+
+    Runs on a single event loop; it is not thread-safe.
+    """
+    def __init__(self):
+        self._flights = {}
+        self.flights_started = 0
+        self.requests_coalesced = 0
+
+    def in_flight(self, key):
+        """Returns True if a stream for `key` is running, so a request for it would attach."""
+        return key in self._flights
+
+    async def stream(self, key, produce):
+        """
+        Streams the items of the run for `key`, starting it if none is in flight.
+
+        Args:
+            key (hashable): Identifies requests that can share a run.
+            produce (callable): Returns the async iterator to run; only called when no run
+                for `key` is in flight.
+
+        Yields:
+            The items of the shared run, from its first one.
+
+        Raises:
+            Exception: The producer's error, or `FlightCancelled` if its run was cancelled;
+                either way after the items emitted before it.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            self.flights_started += 1
+            flight.task = asyncio.create_task(self._run(flight, produce()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight, task))
+        else:
+            self.requests_coalesced += 1
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                wakeup = flight.wakeup
+                while index < len(flight.items):
+                    yield flight.items[index]
+                    index += 1
+                if flight.done:
+                    break
+                await wakeup.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more; stop paying for the run, and let the next
+                # request for the key start afresh rather than attach to a dying run
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    @staticmethod
+    async def _run(flight, iterator):
+        async for item in iterator:
+            flight.items.append(item)
+            flight.publish()
+
+    def _finish(self, key, flight, task):
+        # Called however the task ends, including when it is cancelled before it starts
+        if task.cancelled():
+            flight.error = FlightCancelled("The shared run was cancelled before it finished.")
+        else:
+            flight.error = task.exception()
+        flight.done = True
+        self._forget(key, flight)
+        flight.publish()
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self):
+        """
+        Returns the coalescing counters.
+
+        Returns:
+            dict: Runs in flight, runs started and requests served by a run already in flight.
+        """
+        return {
+            "in_flight": len(self._flights),
+            "flights_started": self.flights_started,
+            "requests_coalesced": self.requests_coalesced,
+        }
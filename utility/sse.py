@@ -0,0 +1,15 @@
+import json
+
+
+def format_sse(event, data):
+    """
+    Frames one Server-Sent Event.
+
+    Args:
+        event (str): The event name.
+        data (dict): The JSON-serializable payload.
+
+    Returns:
+        str: The event, terminated by a blank line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
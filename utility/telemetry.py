@@ -0,0 +1,324 @@
+import json
+import logging
+import threading
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Stage lines of the workflow; formatting is skipped entirely unless DEBUG is enabled for "rag"
+logger = logging.getLogger("rag")
+# One JSON line per finished request, when enabled
+trace_logger = logging.getLogger("rag.trace")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+ITERATION_BUCKETS = (0, 1, 2, 3, 4, 5, 7, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Prometheus counter with optional labels."""
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Prometheus gauge with optional labels."""
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram with optional labels."""
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler feeding a `RequestTrace` from a LangGraph run.
+
+    Times the graph's nodes (the direct children of the root run) and the routing edges
+    named in `edges`, the retriever runs, and every chat model call: its model, token
+    usage and, for the generating node, the first streamed token.
+    """
+    # Called on the event loop thread; every hook is a few dict operations
+    run_inline = True
+
+    def __init__(self, trace, edges=(), generating_node="generate"):
+        self.trace = trace
+        self.edges = set(edges)
+        self.generating_node = generating_node
+        self._root = None
+        self._starts = {}
+        self._models = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        if parent_run_id is None:
+            self._root = run_id
+            return
+        name = kwargs.get("name")
+        if parent_run_id == self._root or name in self.edges:
+            self._starts[run_id] = (name, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            self.trace.record_node(started[0], time.perf_counter() - started[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._starts[run_id] = ("retriever", time.perf_counter())
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            self.trace.record_vector_search(time.perf_counter() - started[1])
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (serialized or {}).get("kwargs", {}).get("model") or "unknown"
+        self._models[run_id] = (model, metadata.get("langgraph_node") == self.generating_node)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        model = self._models.get(run_id)
+        if token and model is not None and model[1]:
+            self.trace.record_first_token()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model, _ = self._models.pop(run_id, ("unknown", False))
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        self.trace.record_llm_call(model, prompt_tokens, completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        model, _ = self._models.pop(run_id, ("unknown", False))
+        self.trace.record_llm_call(model, 0, 0)
+
+
+class RequestTrace:
+    """
+    Timings and usage of one /ask request.
+
+    Filled in by `TraceCallbackHandler` while the graph runs and reported to its
+    `Telemetry` once, by the first call to `finish`.
+    """
+    def __init__(self, telemetry=None, **labels):
+        """
+        Starts the trace.
+
+        Args:
+            telemetry (Telemetry, optional): Where the finished trace is reported.
+            **labels: Request details logged with the trace, such as the PDF name.
+        """
+        self.telemetry = telemetry
+        self.labels = labels
+        self.request_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.node_seconds = {}
+        self.node_runs = []
+        self.llm = {}
+        self.vector_searches = []
+        self.time_to_first_token = None
+        self.outcome = None
+        self.generations = 0
+        self.rewrites = 0
+        self.total_seconds = None
+
+    def callbacks(self, edges=()):
+        """Returns the callback handlers to pass in the run config."""
+        return [TraceCallbackHandler(self, edges=edges)]
+
+    def record_node(self, node, seconds):
+        self.node_seconds[node] = self.node_seconds.get(node, 0.0) + seconds
+        self.node_runs.append((node, seconds))
+
+    def record_vector_search(self, seconds):
+        self.vector_searches.append(seconds)
+
+    def record_llm_call(self, model, prompt_tokens, completion_tokens):
+        usage = self.llm.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+
+    def record_first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+    def finish(self, outcome, generations=0, rewrites=0):
+        """
+        Closes the trace and reports it; later calls are ignored.
+
+        Args:
+            outcome (str): How the request ended, e.g. the "final" event's reason or "error".
+            generations (int): Answer generations run.
+            rewrites (int): Query rewrites run.
+        """
+        if self.outcome is not None:
+            return
+        self.outcome = outcome
+        self.generations = generations
+        self.rewrites = rewrites
+        self.total_seconds = time.perf_counter() - self.started
+        if self.telemetry is not None:
+            self.telemetry.record(self)
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            **self.labels,
+            "outcome": self.outcome,
+            "total_seconds": self.total_seconds,
+            "time_to_first_token": self.time_to_first_token,
+            "generations": self.generations,
+            "rewrites": self.rewrites,
+            "node_seconds": self.node_seconds,
+            "node_runs": len(self.node_runs),
+            "vector_search_seconds": sum(self.vector_searches),
+            "vector_searches": len(self.vector_searches),
+            "llm": self.llm,
+        }
+
+
+class Telemetry:
+    """
+    Process-wide request metrics, rendered in the Prometheus text format.
+
+    Each finished `RequestTrace` is folded into the counters and histograms and, with
+    `json_log`, written as one JSON line to the "rag.trace" logger.
+    """
+    def __init__(self, json_log=False):
+        """
+        Args:
+            json_log (bool): Log every finished trace as a JSON line.
+        """
+        self.json_log = json_log
+        self.requests = Counter("rag_requests_total", "Questions answered, by outcome.", ["outcome"])
+        self.request_seconds = Histogram("rag_request_duration_seconds", "Wall time per question.")
+        self.node_seconds = Histogram("rag_node_duration_seconds", "Wall time per graph node run.", ["node"])
+        self.iterations = Histogram(
+            "rag_loop_iterations", "Generations and query rewrites per question.", ["kind"], buckets=ITERATION_BUCKETS
+        )
+        self.llm_calls = Counter("rag_llm_calls_total", "Chat model calls, by model.", ["model"])
+        self.llm_tokens = Counter("rag_llm_tokens_total", "Chat model tokens, by model and direction.", ["model", "kind"])
+        self.first_token_seconds = Histogram(
+            "rag_time_to_first_token_seconds", "Time from the question to the first streamed answer token."
+        )
+        self.vector_search_seconds = Histogram("rag_vector_search_duration_seconds", "Wall time per retriever call.")
+        self._metrics = [
+            self.requests, self.request_seconds, self.node_seconds, self.iterations, self.llm_calls,
+            self.llm_tokens, self.first_token_seconds, self.vector_search_seconds,
+        ]
+
+    def register(self, *metrics):
+        """Adds metrics kept by other components to the exposition."""
+        self._metrics.extend(metrics)
+
+    def start_trace(self, **labels):
+        """Starts the trace of a request; see `RequestTrace`."""
+        return RequestTrace(self, **labels)
+
+    def record(self, trace):
+        """Folds a finished trace into the metrics."""
+        self.requests.inc(trace.outcome)
+        self.request_seconds.observe(trace.total_seconds)
+        for node, seconds in trace.node_runs:
+            self.node_seconds.observe(seconds, node)
+        self.iterations.observe(trace.generations, "generation")
+        self.iterations.observe(trace.rewrites, "rewrite")
+        for model, usage in trace.llm.items():
+            self.llm_calls.inc(model, amount=usage["calls"])
+            self.llm_tokens.inc(model, "prompt", amount=usage["prompt_tokens"])
+            self.llm_tokens.inc(model, "completion", amount=usage["completion_tokens"])
+        if trace.time_to_first_token is not None:
+            self.first_token_seconds.observe(trace.time_to_first_token)
+        for seconds in trace.vector_searches:
+            self.vector_search_seconds.observe(seconds)
+        if self.json_log:
+            trace_logger.info(json.dumps(trace.to_dict(), default=str))
+
+    def render_prometheus(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+@asynccontextmanager
+async def _no_lock():
+    yield
+
+
+def safe_filename(filename):
+    """
+    Strips any directory components from a client-supplied file name.
+
+    Args:
+        filename (str): The name sent by the client.
+
+    Returns:
+        str: The bare file name, safe to join to the upload folder.
+    """
+    return os.path.basename((filename or "").replace("\\", "/"))
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware capping the request body of upload routes.
+
+    The limit is enforced as the body arrives, before the handler parses it: a declared Content-Length over the limit is refused outright, and a
+    body that grows past it (chunked or understated) is cut off there. Either way the
+    client gets a 413 with a JSON `error`.
+    """
+    def __init__(self, app, max_bytes, paths=("/upload",), error="Upload too large."):
+        """
+        Args:
+            app: The ASGI app to wrap.
+            max_bytes (int): Largest request body accepted, form fields included.
+            paths (tuple): Paths whose POST bodies are capped.
+            error (str): Message of the 413 response.
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+        self.error = error
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        responded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit.")
+            return message
+
+        async def guarded_send(message):
+            nonlocal responded
+            # Whatever the app makes of a body cut short, the client is told it was too large
+            if exceeded and not responded:
+                return
+            responded = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not responded:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"error": self.error}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class FileLocks:
+    """Per-file asyncio locks, forgotten once no upload holds or waits on them."""
+    def __init__(self):
+        # name -> (lock, holders and waiters)
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, name):
+        """Holds the lock of `name` for the duration of the block."""
+        lock, users = self._locks.get(name) or (asyncio.Lock(), 0)
+        self._locks[name] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[name]
+            if users == 1:
+                del self._locks[name]
+            else:
+                self._locks[name] = (lock, users - 1)
+
+
+class InvalidUpload(Exception):
+    """Raised when an upload body is not a well-formed multipart form with a file."""
+
+
+class ReceivedUpload:
+    """
+    A multipart upload received to a temporary file, waiting to be moved into place.
+
+    Attributes:
+        filename (str): The file name sent by the client, unsanitized.
+        fields (dict): The other form fields, by name, as strings.
+        size (int): Size of the file in bytes.
+        sha256 (str): Hex SHA-256 of the file contents.
+        tmp_path (str): The temporary file holding the contents.
+    """
+    def __init__(self):
+        self.filename = None
+        self.fields = {}
+        self.size = 0
+        self.sha256 = None
+        self.tmp_path = None
+
+    async def save(self, dest_path, lock=None, on_saved=None):
+        """
+        Renames the received file into place.
+
+        Args:
+            dest_path (str): Where the file ends up; on the same filesystem as the
+                temporary file.
+            lock (optional): Async context manager held while the file is renamed into place
+                and `on_saved` runs, e.g. `FileLocks.hold(name)`; concurrent uploads of the same
+                file then record the checksum of the version that ends up on disk.
+            on_saved (callable, optional): Called with (size, sha256) once the file is in place,
+                on a worker thread so it may block (e.g. on SQLite).
+
+        Returns:
+            tuple: (size in bytes, hex SHA-256 of the contents).
+        """
+        try:
+            async with lock or _no_lock():
+                await asyncio.to_thread(os.replace, self.tmp_path, dest_path)
+                if on_saved is not None:
+                    await asyncio.to_thread(on_saved, self.size, self.sha256)
+        except BaseException:
+            self.discard()
+            raise
+        return self.size, self.sha256
+
+    def discard(self):
+        """Removes the temporary file, if it is still there."""
+        if self.tmp_path is not None:
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+
+async def receive_upload(stream, content_type, tmp_dir, file_field="file", max_bytes=None):
+    """
+    Parses a multipart/form-data body as it arrives, writing its file straight to disk.
+
+    The body is fed to python-multipart's streaming parser a chunk at a time, so the file
+    is never held in memory nor spooled and copied a second time: each chunk of file data
+    is written to a temporary file in `tmp_dir` (off the event loop) and hashed as it
+    arrives. Other form fields are collected as strings.
+
+    Args:
+        stream: Async iterator over the raw request body, e.g. `request.stream()`.
+        content_type (str): The request's Content-Type header, with the boundary.
+        tmp_dir (str): Folder of the temporary file; use the destination folder so the
+            final rename is atomic.
+        file_field (str): Name of the form field carrying the file.
+        max_bytes (int, optional): Size limit of the file; exceeding it aborts the upload.
+
+    Returns:
+        ReceivedUpload: The received file and form fields; call `save` or `discard`.
+
+    Raises:
+        InvalidUpload: If the body is not a complete multipart form with one file in
+            `file_field`.
+        UploadTooLarge: If the file is larger than `max_bytes`.
+    """
+    mimetype, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if mimetype != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected a multipart/form-data body.")
+
+    upload = ReceivedUpload()
+    digest = hashlib.sha256()
+    file = None
+    # State of the part being parsed
+    headers, header_field, header_value = {}, bytearray(), bytearray()
+    part = {"name": None, "is_file": False, "value": bytearray()}
+    file_data = []
+    ended = False
+
+    def on_part_begin():
+        headers.clear()
+        part.update(name=None, is_file=False, value=bytearray())
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        nonlocal file
+        _, disposition = parse_options_header(headers.get(b"content-disposition"))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        part["name"] = name
+        if name != file_field:
+            return
+        if file is not None:
+            raise InvalidUpload("Only one file may be uploaded.")
+        part["is_file"] = True
+        upload.filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+        fd, upload.tmp_path = tempfile.mkstemp(dir=tmp_dir or ".", suffix=".part")
+        file = os.fdopen(fd, "wb")
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            file_data.append(data[start:end])
+        else:
+            part["value"].extend(data[start:end])
+
+    def on_part_end():
+        if not part["is_file"] and part["name"]:
+            upload.fields[part["name"]] = part["value"].decode("utf-8", "replace")
+
+    def on_end():
+        nonlocal ended
+        ended = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished, "on_part_data": on_part_data,
+        "on_part_end": on_part_end, "on_end": on_end,
+    })
+    try:
+        async for chunk in stream:
+            try:
+                parser.write(chunk)
+            except FormParserError as e:
+                raise InvalidUpload(f"Malformed multipart body: {e}") from e
+            if file_data:
+                data = b"".join(file_data)
+                file_data.clear()
+                upload.size += len(data)
+                if max_bytes is not None and upload.size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit.")
+                digest.update(data)
+                await asyncio.to_thread(file.write, data)
+        if not ended:
+            raise InvalidUpload("The upload body was cut short.")
+        if file is None:
+            raise InvalidUpload(f"No file was uploaded in the '{file_field}' field.")
+        await asyncio.to_thread(os.fsync, file.fileno())
+        file.close()
+    except BaseException:
+        if file is not None:
+            file.close()
+        upload.discard()
+        raise
+    upload.sha256 = digest.hexdigest()
+    return upload
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from utility.telemetry import logger
+
+# Step states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Warmup:
+    """
+    Startup work run on a background thread, so the server accepts connections at once.
+
+    Steps run in the order they were added, and the process is ready once all of them
+    have run. A failed required step stops the sequence and leaves it unready; optional
+    steps (such as pre-opening pipelines) only record their failure.
+    """
+    def __init__(self):
+        self._steps = []
+        self._status = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._failed = False
+        self._started = None
+        self._thread = None
+
+    def add_step(self, name, fn, required=True):
+        """
+        Adds a step.
+
+        Args:
+            name (str): Name reported by `status`.
+            fn (callable): Called with no arguments on the warm-up thread.
+            required (bool): Whether the process is unready until the step succeeds.
+        """
+        self._steps.append((name, fn, required))
+        self._status[name] = {"status": PENDING, "required": required, "seconds": None, "error": None}
+
+    def start(self):
+        """Runs the steps on a daemon thread."""
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for name, fn, required in self._steps:
+            self._set(name, status=RUNNING)
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                logger.exception("Warm-up step %s failed", name)
+                self._set(name, status=FAILED, seconds=time.perf_counter() - start, error=str(e))
+                if required:
+                    self._failed = True
+                    return
+                continue
+            self._set(name, status=DONE, seconds=time.perf_counter() - start)
+        self._ready.set()
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    @property
+    def ready(self):
+        """True once every step has run and the required ones succeeded."""
+        return self._ready.is_set()
+
+    @property
+    def failed(self):
+        """True if a required step failed; the process will not become ready."""
+        return self._failed
+
+    def wait(self, timeout=None):
+        """Blocks until ready or `timeout` seconds pass; returns whether it is ready."""
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """
+        Returns the warm-up progress.
+
+        Returns:
+            dict: Readiness, failure, seconds since start and the state of every step.
+        """
+        with self._lock:
+            steps = {name: dict(step) for name, step in self._status.items()}
+        return {
+            "ready": self.ready,
+            "failed": self.failed,
+            "elapsed_seconds": time.monotonic() - self._started if self._started is not None else None,
+            "steps": steps,
+        }